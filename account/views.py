@@ -9,6 +9,7 @@ from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
 
 from helpers import functions as helpers
+from core import conditional
 from account import models, permissions, serializers
 from account import custom_functions as c_func
 
@@ -142,10 +143,16 @@ class UserProfileDetailView(generics.RetrieveUpdateAPIView):
         """returns user profile data with matching user id"""
         user = get_object_or_404(get_user_model(), pk=kwargs["id"])
         self.check_object_permissions(request, user)
+        validators = conditional.get_detail_validators(request, self.get_queryset(), kwargs["id"])
+        not_modified = conditional.get_not_modified_response(request, *validators)
+        if not_modified:
+            return not_modified
+
         user_profile = self.get_queryset().filter(user=kwargs["id"]).first()
         if user_profile:
             response_data = serializers.UserProfileReadOnlySerializer(user_profile).data
-            return Response(response_data, status=status.HTTP_200_OK)
+            response = Response(response_data, status=status.HTTP_200_OK)
+            return conditional.add_validators(response, *validators)
         else:
             return Response("{}", status=status.HTTP_200_OK)
 
@@ -309,10 +316,16 @@ class BusinessStaffProfileDetailView(generics.RetrieveUpdateAPIView):
         user = get_object_or_404(get_user_model(), pk=kwargs["staff_id"])
         self.check_object_permissions(request, user)
         queryset = self.get_queryset()
+        validators = conditional.get_detail_validators(request, queryset, kwargs["staff_id"])
+        not_modified = conditional.get_not_modified_response(request, *validators)
+        if not_modified:
+            return not_modified
+
         user_profile = queryset.filter(user=kwargs["staff_id"]).first()
         if user_profile:
             response_data = serializers.UserProfileReadOnlySerializer(user_profile).data
-            return Response(response_data, status=status.HTTP_200_OK)
+            response = Response(response_data, status=status.HTTP_200_OK)
+            return conditional.add_validators(response, *validators)
         else:
             return Response("{}", status=status.HTTP_200_OK)
 
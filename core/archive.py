@@ -0,0 +1,117 @@
+from datetime import timedelta
+
+from django.db import models, transaction
+from django.utils import timezone
+
+from helpers import functions as f
+
+
+def copy_rows(queryset, target_model, **extra_values):
+    """copies rows of the queryset into the table of target model with a bulk insert
+        Args: queryset, target_model, extra_values (column values added to every row)
+    """
+    field_names = [field.attname for field in target_model._meta.concrete_fields
+                   if field.attname not in extra_values]
+    rows = [target_model(**row, **extra_values) for row in queryset.values(*field_names)]
+    target_model.objects.bulk_create(rows)
+    return len(rows)
+
+
+def exclude_linked_rows(queryset, model, children=()):
+    """excludes rows which rows of other hot tables link to with nullable foreign keys
+        Deleting them would set those links to null, and a restore would not bring them back.
+    """
+    child_models = {child_model for child_model, _, _ in children}
+    for relation in model._meta.related_objects:
+        if relation.on_delete is not models.SET_NULL or relation.related_model in child_models:
+            continue
+        linked_ids = relation.related_model._base_manager\
+            .filter(**{f"{relation.field.attname}__isnull": False})\
+            .values(relation.field.attname)
+        queryset = queryset.exclude(id__in=linked_ids)
+    return queryset
+
+
+def clear_missing_links(rows, model):
+    """sets nullable foreign keys of archived rows to null where the linked row is not in
+        hot tables, it may have been archived since, so the rows can be inserted
+    """
+    for field in model._meta.concrete_fields:
+        if field.is_relation and field.null:
+            present_ids = field.related_model._base_manager.values(field.target_field.attname)
+            rows.filter(**{f"{field.attname}__isnull": False})\
+                .exclude(**{f"{field.attname}__in": present_ids})\
+                .update(**{field.attname: None})
+
+
+def archive_batch(model, archive_model, ids, children=()):
+    """moves rows with ids and their remaining child rows into archive tables
+        Args: model, archive_model, ids, children (list of (model, archive_model, fk name))
+    """
+    now = f.get_current_time()
+    with transaction.atomic():
+        for child_model, child_archive_model, fk_name in children:
+            child_rows = child_model._base_manager.filter(**{f"{fk_name}__in": ids})
+            copy_rows(child_rows, child_archive_model, archived_on=now)
+            child_rows.delete()
+
+        rows = model._base_manager.filter(id__in=ids)
+        archived = copy_rows(rows, archive_model, archived_on=now)
+        rows.delete()
+    return archived
+
+
+def archive_deleted_rows(model, archive_model, days, batch_size=500, children=()):
+    """archives rows soft deleted more than given days ago in batches of batch_size
+        Args: model, archive_model, days, batch_size=500, children=()
+    """
+    cutoff = timezone.now() - timedelta(days=days)
+    queryset = model._base_manager.filter(is_deleted=True, updated_on__lt=cutoff)
+    # rows still linked from other tables stay hot until the linking rows are archived
+    queryset = exclude_linked_rows(queryset, model, children)\
+        .order_by()\
+        .values_list("id", flat=True)
+    archived = 0
+    while True:
+        ids = list(queryset[:batch_size])
+        if not ids:
+            break
+        archived += archive_batch(model, archive_model, ids, children)
+    return archived
+
+
+def restore_rows(model, archive_model, ids, children=(), post_restored=None):
+    """moves archived rows with ids and their archived live child rows back to hot tables
+        Rows are restored only when their parent rows are present in hot tables.
+        Restored rows are live again, post_restored is called with their ids in the same
+        transaction to post them to paid amounts, balances, revenue and stock, which are
+        maintained by incremental writes. The restore is rolled back if it raises.
+        Args: model, archive_model, ids, children (list of (model, archive_model, fk name)),
+              post_restored=None
+    """
+    rows = archive_model.objects.filter(id__in=ids)
+    for field in model._meta.concrete_fields:
+        if field.is_relation and not field.null:
+            parents = field.related_model._base_manager.values("id")
+            rows = rows.filter(**{f"{field.attname}__in": parents})
+
+    with transaction.atomic():
+        restored_ids = list(rows.values_list("id", flat=True))
+        rows = archive_model.objects.filter(id__in=restored_ids)
+        clear_missing_links(rows, model)
+        copy_rows(rows, model)
+        model._base_manager.filter(id__in=restored_ids).update(is_deleted=False,
+                                                               updated_on=f.get_current_time())
+        rows.delete()
+
+        for child_model, child_archive_model, fk_name in children:
+            child_rows = child_archive_model.objects.filter(**{f"{fk_name}__in": restored_ids})
+            if hasattr(child_archive_model, "is_deleted"):
+                child_rows = child_rows.filter(is_deleted=False)
+            clear_missing_links(child_rows, child_model)
+            copy_rows(child_rows, child_model)
+            child_rows.delete()
+
+        if post_restored is not None and restored_ids:
+            post_restored(restored_ids)
+    return len(restored_ids)
@@ -0,0 +1,74 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+
+from rest_framework.response import Response
+from rest_framework import status
+
+
+def get_etag(request, *parts):
+    """returns a strong etag of the request path and validator parts"""
+    value = ":".join(str(part) for part in (request.get_full_path(), *parts))
+    return quote_etag(hashlib.sha1(value.encode("utf-8")).hexdigest())
+
+
+def get_detail_validators(request, queryset, pk, *extra_columns):
+    """returns etag and last modified time of a single row without loading the row
+        Args: request, queryset, pk, extra_columns (columns or annotations added to the etag)
+    """
+    row = queryset.filter(pk=pk).values("pk", "updated_on", *extra_columns).first()
+    if row is None:
+        return None, None
+    etag = get_etag(request, queryset.model._meta.label, *row.values())
+    return etag, row["updated_on"]
+
+
+def get_list_validators(request, queryset, *related_querysets):
+    """returns etag and last modified time of a list from max(updated_on) and count
+        Args: request, queryset, related_querysets (rows of other tables shown in the list)
+    """
+    parts = []
+    last_modified = None
+    for rows in (queryset, *related_querysets):
+        validators = rows.order_by().aggregate(last_updated_on=Max("updated_on"),
+                                               count=Count("pk"))
+        parts += [rows.model._meta.label, validators["count"], validators["last_updated_on"]]
+        if last_modified is None or (validators["last_updated_on"] and
+                                     validators["last_updated_on"] > last_modified):
+            last_modified = validators["last_updated_on"]
+    return get_etag(request, *parts), last_modified
+
+
+def add_validators(response, etag, last_modified):
+    """adds etag, last modified and cache headers to the response"""
+    if etag:
+        response["ETag"] = etag
+    if last_modified:
+        response["Last-Modified"] = http_date(last_modified.timestamp())
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ("Authorization",))
+    return response
+
+
+def get_not_modified_response(request, etag, last_modified):
+    """returns 304 response if the client copy is fresh or None
+        If-None-Match takes precedence over If-Modified-Since.
+    """
+    if etag is None:
+        return None
+
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match:
+        etags = [value.replace("W/", "", 1) for value in parse_etags(if_none_match)]
+        if "*" not in etags and etag not in etags:
+            return None
+    else:
+        if_modified_since = parse_http_date_safe(request.headers.get("If-Modified-Since"))
+        if if_modified_since is None or last_modified is None or \
+                int(last_modified.timestamp()) > if_modified_since:
+            return None
+
+    response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    return add_validators(response, etag, last_modified)
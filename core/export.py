@@ -0,0 +1,112 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from django.utils.dateparse import parse_date
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.views import APIView
+
+from helpers import functions as f
+
+FILE_TYPES = {
+    "csv": ("text/csv", "csv"),
+    "jsonl": ("application/x-ndjson", "jsonl"),
+}
+
+
+class Echo:
+    """file like object which returns written value instead of storing it"""
+
+    def write(self, value):
+        """returns the written value"""
+        return value
+
+
+def iterate_rows(queryset, columns, chunk_size=2000):
+    """yields values rows of queryset in id order, one keyset page at a time
+        Keyset pages keep memory flat even where the db driver buffers whole result sets.
+    """
+    queryset = queryset.order_by("id").values_list("id", *columns)
+    last_id = 0
+    while True:
+        rows = list(queryset.filter(id__gt=last_id)[:chunk_size])
+        if not rows:
+            break
+        for row in rows:
+            yield row[1:]
+        last_id = rows[-1][0]
+
+
+def stream_csv(rows, columns):
+    """yields csv lines of the rows with a header line"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream_json_lines(rows, columns):
+    """yields a json object line for every row"""
+    for row in rows:
+        yield json.dumps(dict(zip(columns, row)), cls=DjangoJSONEncoder) + "\n"
+
+
+class ExportView(APIView):
+    """streams rows of the tenant as csv or json lines
+        Query params: file_type (csv or jsonl), from and to (YYYY-MM-DD, inclusive)
+    """
+    permission_classes = (IsAuthenticated,)
+    model = None
+    columns = ()
+    date_field = "created_on"
+    tenant_lookup = ""
+    chunk_size = 2000
+
+    def get_queryset(self):
+        """returns queryset of rows which belong to the tenant of request user"""
+        user_ids = f.get_tenant_user_ids(self.request.user)
+        return self.model.objects.filter(
+            Q(**{f"{self.tenant_lookup}created_by__in": user_ids}) |
+            Q(**{f"{self.tenant_lookup}updated_by__in": user_ids})
+        )
+
+    def filter_dates(self, queryset):
+        """filters queryset with from and to query params"""
+        for param, lookup in (("from", "gte"), ("to", "lte")):
+            value = self.request.query_params.get(param)
+            if not value:
+                continue
+            date = parse_date(value)
+            if date is None:
+                error = {
+                    "message": f"Invalid {param} date. Expected format is YYYY-MM-DD"
+                }
+                raise ValidationError(error, code="validation")
+            queryset = queryset.filter(**{f"{self.date_field}__date__{lookup}": date})
+        return queryset
+
+    def get(self, request, *args, **kwargs):
+        """returns streaming response of exported rows"""
+        file_type = request.query_params.get("file_type", "csv")
+        if file_type not in FILE_TYPES:
+            error = {
+                "message": f"Invalid file_type. Allowed types are {', '.join(FILE_TYPES)}"
+            }
+            raise ValidationError(error, code="validation")
+
+        queryset = self.filter_dates(self.get_queryset())
+        rows = iterate_rows(queryset, self.columns, self.chunk_size)
+        if file_type == "csv":
+            content = stream_csv(rows, self.columns)
+        else:
+            content = stream_json_lines(rows, self.columns)
+
+        content_type, extension = FILE_TYPES[file_type]
+        response = StreamingHttpResponse(content, content_type=content_type)
+        filename = f"{self.model._meta.model_name}-{f.get_current_time()[:10]}.{extension}"
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
@@ -0,0 +1,109 @@
+from datetime import timedelta
+from functools import wraps
+import hashlib
+import json
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework import status
+
+from core.models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+
+
+def get_hash(value):
+    """returns sha256 hex digest of the value"""
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+def get_key_hash(request, key):
+    """returns hash of idempotency key scoped to the user and path"""
+    return get_hash(f"{request.user.id}:{request.method}:{request.path}:{key}")
+
+
+def get_request_hash(request):
+    """returns hash of the request payload"""
+    return get_hash(json.dumps(request.data, sort_keys=True, default=str))
+
+
+def reserve_key(key_hash, request_hash):
+    """inserts a pending key row and returns (key row, True), or (existing key row, False)
+        Pending rows expire after IDEMPOTENCY_PENDING_TIMEOUT_SECONDS, far longer than the
+        worker timeout, so a key left behind by a killed worker is taken over by a later
+        retry instead of blocking it until the key ttl, while a running request is never
+        taken over. Completed rows expire after IDEMPOTENCY_KEY_TTL_HOURS.
+    """
+    now = timezone.now()
+    expires_on = now + timedelta(seconds=settings.IDEMPOTENCY_PENDING_TIMEOUT_SECONDS)
+    try:
+        with transaction.atomic():
+            idempotency_key = IdempotencyKey.objects.create(
+                key_hash=key_hash, request_hash=request_hash, expires_on=expires_on)
+        return idempotency_key, True
+    except IntegrityError:
+        existing_key = IdempotencyKey.objects.filter(key_hash=key_hash).first()
+
+    if existing_key is None or existing_key.expires_on <= now:
+        # concurrent retries may both delete, only one of them inserts the new row
+        IdempotencyKey.objects.filter(key_hash=key_hash, expires_on__lte=now).delete()
+        return reserve_key(key_hash, request_hash)
+    return existing_key, False
+
+
+def replay_response(idempotency_key, request_hash):
+    """returns the stored response of a repeated request"""
+    if idempotency_key.request_hash != request_hash:
+        error = {
+            "message": f"{IDEMPOTENCY_HEADER} is already used with a different payload"
+        }
+        return Response(error, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    if idempotency_key.status_code is None:
+        error = {
+            "message": f"A request with this {IDEMPOTENCY_HEADER} is in progress"
+        }
+        return Response(error, status=status.HTTP_409_CONFLICT)
+
+    response = Response(json.loads(idempotency_key.response_body),
+                        status=idempotency_key.status_code)
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
+def idempotent(create):
+    """decorator for create views which replays responses of repeated Idempotency-Key requests"""
+    @wraps(create)
+    def wrapper(view, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return create(view, request, *args, **kwargs)
+
+        key_hash = get_key_hash(request, key)
+        request_hash = get_request_hash(request)
+        idempotency_key, reserved = reserve_key(key_hash, request_hash)
+        if not reserved:
+            return replay_response(idempotency_key, request_hash)
+
+        # the row is addressed by id, a row of a retry which took the key over is left alone
+        try:
+            response = create(view, request, *args, **kwargs)
+        except Exception:
+            IdempotencyKey.objects.filter(id=idempotency_key.id).delete()
+            raise
+
+        if status.is_success(response.status_code):
+            expires_on = timezone.now() + timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS)
+            IdempotencyKey.objects.filter(id=idempotency_key.id).update(
+                status_code=response.status_code,
+                response_body=json.dumps(response.data, cls=JSONEncoder),
+                expires_on=expires_on
+            )
+        else:
+            IdempotencyKey.objects.filter(id=idempotency_key.id).delete()
+        return response
+    return wrapper
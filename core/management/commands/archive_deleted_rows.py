@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from core import archive
+from order.models import Order, OrderItem, OrderArchive, OrderItemArchive
+from payments.models import Payment, PaymentArchive
+from products.models import Product, ProductDesignImage, ProductArchive, \
+    ProductDesignImageArchive
+
+
+# child tables are archived before parents so that cascades never reach live rows
+ARCHIVE_MODELS = {
+    "order_item": (OrderItem, OrderItemArchive, ()),
+    "payment": (Payment, PaymentArchive, ()),
+    "order": (Order, OrderArchive, (
+        (OrderItem, OrderItemArchive, "order_id"),
+        (Payment, PaymentArchive, "order_id"),
+    )),
+    "product": (Product, ProductArchive, (
+        (ProductDesignImage, ProductDesignImageArchive, "product_id"),
+    )),
+}
+
+
+class Command(BaseCommand):
+    """moves rows soft deleted more than N days ago into archive tables"""
+    help = "Moves rows soft deleted more than N days ago into *_archive tables"
+
+    def add_arguments(self, parser):
+        """adds command arguments"""
+        parser.add_argument("--days", type=int, default=90)
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        """archives soft deleted rows of every archived model"""
+        for name, (model, archive_model, children) in ARCHIVE_MODELS.items():
+            archived = archive.archive_deleted_rows(model, archive_model, options["days"],
+                                                    options["batch_size"], children)
+            self.stdout.write(f"{name}: archived {archived} rows")
@@ -0,0 +1,81 @@
+from datetime import timedelta
+from decimal import Decimal
+from timeit import timeit
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from order.models import Order
+from order.serializers import OrderSerializer, OrderReadSerializer
+from payments.models import Payment
+from payments.serializers import PaymentSerializer, PaymentReadSerializer
+from products.models import Product
+from products.serializers import ProductSerializer, ProductReadSerializer
+
+
+def get_orders(count):
+    """returns unsaved order objects"""
+    now = timezone.now()
+    return [Order(id=i, customer_id=i, total_amount=Decimal("1200.00"),
+                  net_amount=Decimal("1100.00"), paid_amount=Decimal("500.00"),
+                  discount=Decimal("5.0"), delivery_date=now + timedelta(days=7),
+                  comments="Two shirts and a trouser", created_on=now, updated_on=now,
+                  created_by="1", updated_by="1")
+            for i in range(1, count + 1)]
+
+
+def get_payments(count):
+    """returns unsaved payment objects"""
+    now = timezone.now()
+    return [Payment(id=i, order_id=i, paid_amount=Decimal("500.00"), payment_date=now,
+                    mode_of_payment="upi", created_on=now, updated_on=now,
+                    created_by="1", updated_by="1")
+            for i in range(1, count + 1)]
+
+
+def get_products(count):
+    """returns unsaved product objects"""
+    now = timezone.now()
+    return [Product(id=i, seller_id=1, name=f"Design {i}", description="x" * 500,
+                    category="blouse", price=Decimal("899.00"), cost=Decimal("450.00"),
+                    product_code=f"D-{i}", created_on=now, updated_on=now,
+                    created_by="1", updated_by="1")
+            for i in range(1, count + 1)]
+
+
+def get_rows(objects):
+    """returns objects as rows returned by queryset.values() of the list querysets"""
+    fields = objects[0]._meta.concrete_fields
+    rows = [{field.attname: getattr(obj, field.attname) for field in fields} for obj in objects]
+    if isinstance(objects[0], Product):
+        for row in rows:
+            row["main_image"] = f"product-images/{row['id']}.jpg"
+    return rows
+
+
+class Command(BaseCommand):
+    """compares list serialization time of model and read only serializers"""
+    help = "Prints serialization time per 1,000 rows of list serializers"
+
+    def add_arguments(self, parser):
+        """adds command arguments"""
+        parser.add_argument("--rows", type=int, default=1000)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        """runs the benchmark without touching the db"""
+        count = options["rows"]
+        repeat = options["repeat"]
+        benchmarks = (
+            ("order", get_orders, OrderSerializer, OrderReadSerializer),
+            ("payment", get_payments, PaymentSerializer, PaymentReadSerializer),
+            ("product", get_products, ProductSerializer, ProductReadSerializer),
+        )
+        for name, get_objects, model_serializer, read_serializer in benchmarks:
+            objects = get_objects(count)
+            rows = get_rows(objects)
+            before = timeit(lambda: model_serializer(objects, many=True).data, number=repeat)
+            after = timeit(lambda: read_serializer(rows).data, number=repeat)
+            before_ms = before / repeat / count * 1000 * 1000
+            after_ms = after / repeat / count * 1000 * 1000
+            self.stdout.write(f"{name}: {before_ms:.1f} ms -> {after_ms:.1f} ms per 1,000 rows")
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    """deletes expired idempotency keys"""
+    help = "Deletes expired idempotency keys in batches"
+
+    def add_arguments(self, parser):
+        """adds command arguments"""
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        """deletes expired keys in batches"""
+        queryset = IdempotencyKey.objects\
+            .filter(expires_on__lte=timezone.now())\
+            .values_list("id", flat=True)
+        deleted = 0
+        while True:
+            ids = list(queryset[:options["batch_size"]])
+            if not ids:
+                break
+            IdempotencyKey.objects.filter(id__in=ids).delete()
+            deleted += len(ids)
+        self.stdout.write(f"deleted {deleted} expired idempotency keys")
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import UploadSession
+from core.uploads import delete_upload_file
+
+
+class Command(BaseCommand):
+    """deletes expired resumable uploads and their partial files"""
+    help = "Deletes expired upload sessions and their partial files in batches"
+
+    def add_arguments(self, parser):
+        """adds command arguments"""
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        """deletes expired sessions in batches"""
+        queryset = UploadSession.objects\
+            .filter(expires_on__lte=timezone.now())\
+            .values_list("id", flat=True)
+        deleted = 0
+        while True:
+            ids = list(queryset[:options["batch_size"]])
+            if not ids:
+                break
+            for upload_id in ids:
+                delete_upload_file(upload_id)
+            UploadSession.objects.filter(id__in=ids).delete()
+            deleted += len(ids)
+        self.stdout.write(f"deleted {deleted} expired upload sessions")
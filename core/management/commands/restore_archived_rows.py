@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from core import archive
+from core.management.commands.archive_deleted_rows import ARCHIVE_MODELS
+from order.serializers import post_restored_order_items, post_restored_orders
+from payments.serializers import post_restored_payments
+from products.stock import InsufficientStock
+
+# restored rows are live again, so they are posted to the rollups kept by incremental writes.
+# products are archived only when no order item links to them, so they hold no stock
+RESTORE_POSTINGS = {
+    "order_item": post_restored_order_items,
+    "payment": post_restored_payments,
+    "order": post_restored_orders,
+}
+
+
+class Command(BaseCommand):
+    """moves archived rows back to hot tables"""
+    help = "Restores archived rows with given ids and marks them as not deleted"
+
+    def add_arguments(self, parser):
+        """adds command arguments"""
+        parser.add_argument("model", choices=ARCHIVE_MODELS.keys())
+        parser.add_argument("ids", nargs="+", type=int)
+
+    def handle(self, *args, **options):
+        """restores archived rows"""
+        model, archive_model, children = ARCHIVE_MODELS[options["model"]]
+        try:
+            restored = archive.restore_rows(model, archive_model, options["ids"], children,
+                                            RESTORE_POSTINGS.get(options["model"]))
+        except (InsufficientStock, IntegrityError) as e:
+            raise CommandError(f"No archived rows are restored. {e}")
+        if restored == 0:
+            raise CommandError("No archived rows are restored")
+        self.stdout.write(f"{options['model']}: restored {restored} rows")
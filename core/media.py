@@ -0,0 +1,133 @@
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import logging
+import os
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+
+from core.models import MediaBlob
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def get_executor():
+    """returns the shared worker pool of file deletions"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.MEDIA_DELETE_WORKERS,
+                                       thread_name_prefix="media-delete")
+    return _executor
+
+
+def delete_files(paths, storage=default_storage):
+    """deletes stored files, logging the ones which cannot be deleted"""
+    for path in paths:
+        try:
+            storage.delete(path)
+        except Exception:
+            logger.exception("Unable to delete media file %s", path)
+
+
+def get_content_hash(file):
+    """returns sha256 of the file, computed while streaming when the upload handler did it"""
+    content_hash = getattr(file, "content_hash", None)
+    if content_hash:
+        return content_hash
+
+    hasher = hashlib.sha256()
+    file.seek(0)
+    for chunk in file.chunks():
+        hasher.update(chunk)
+    file.seek(0)
+    return hasher.hexdigest()
+
+
+def get_blob_path(directory, content_hash, filename):
+    """returns content addressed storage path of a file"""
+    extension = os.path.splitext(filename or "")[1].lower()
+    return os.path.join(directory, content_hash[:2], f"{content_hash}{extension}")
+
+
+def add_blob_reference(content_hash, path, size):
+    """returns the blob of the content, creating it or counting another reference to it
+        The blob row is locked, so a released file queued for deletion is either taken
+        over before its deletion runs or deleted along with its row before this insert.
+    """
+    with transaction.atomic():
+        blob = MediaBlob.objects.select_for_update().filter(content_hash=content_hash).first()
+        if blob is None:
+            try:
+                with transaction.atomic():
+                    return MediaBlob.objects.create(content_hash=content_hash, path=path,
+                                                    size=size)
+            except IntegrityError:
+                # a concurrent upload of the same content inserted the row first
+                return add_blob_reference(content_hash, path, size)
+        MediaBlob.objects.filter(id=blob.id).update(ref_count=F("ref_count") + 1)
+    return blob
+
+
+def save_blob(file, directory, storage=default_storage):
+    """stores the file once per content and returns its path, counting a reference to it"""
+    content_hash = get_content_hash(file)
+    with transaction.atomic():
+        blob = add_blob_reference(content_hash,
+                                  get_blob_path(directory, content_hash, file.name),
+                                  file.size)
+        # the file of an existing blob may have been removed as an orphan or by its release
+        if not storage.exists(blob.path):
+            storage.save(blob.path, file)
+    return blob.path
+
+
+def delete_blob_files(path, derived_paths=(), storage=default_storage):
+    """deletes the file of a released blob and the files derived from it
+        The blob row is locked and checked again, nothing is deleted if the content was
+        stored again after its release. Files stored before content addressing have no
+        blob row and are deleted unless a blob took over the path.
+    """
+    with transaction.atomic():
+        blob = MediaBlob.objects.select_for_update().filter(path=path).first()
+        if blob is not None and blob.ref_count > 0:
+            return False
+        delete_files([path, *derived_paths], storage)
+        if blob is not None:
+            blob.delete()
+    return True
+
+
+def run_blob_deletion(path, derived_paths, storage):
+    """runs a blob deletion in a worker thread and closes its db connection"""
+    try:
+        delete_blob_files(path, derived_paths, storage)
+    except Exception:
+        logger.exception("Unable to delete media file %s", path)
+    finally:
+        connection.close()
+
+
+def release_blob(path, storage=default_storage, derived_paths=()):
+    """removes a reference to the stored file and deletes the file with its last reference
+        Returns True if the file is queued for deletion along with the derived paths. The
+        blob row stays with no references until the deletion runs, see delete_blob_files.
+    """
+    if not path:
+        return False
+
+    with transaction.atomic():
+        blob = MediaBlob.objects.select_for_update().filter(path=path).first()
+        if blob is not None and blob.ref_count > 1:
+            MediaBlob.objects.filter(id=blob.id).update(ref_count=F("ref_count") - 1)
+            return False
+        if blob is not None:
+            MediaBlob.objects.filter(id=blob.id).update(ref_count=0)
+        derived_paths = [derived_path for derived_path in derived_paths if derived_path]
+        # the file is kept if the transaction which releases it rolls back
+        transaction.on_commit(lambda: get_executor().submit(run_blob_deletion, path,
+                                                            derived_paths, storage))
+    return True
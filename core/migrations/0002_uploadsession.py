@@ -0,0 +1,29 @@
+# Generated by Django 4.0 on 2026-10-19 13:42
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=255)),
+                ('size', models.BigIntegerField()),
+                ('received_size', models.BigIntegerField(default=0)),
+                ('created_by', models.CharField(max_length=255)),
+                ('created_on', models.DateTimeField()),
+                ('expires_on', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'db_table': 't_upload_session',
+            },
+        ),
+    ]
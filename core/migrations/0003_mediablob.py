@@ -0,0 +1,27 @@
+# Generated by Django 4.0 on 2026-10-19 13:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_uploadsession'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64, unique=True)),
+                ('path', models.CharField(max_length=255, unique=True)),
+                ('size', models.BigIntegerField(default=0)),
+                ('ref_count', models.IntegerField(default=1)),
+                ('created_on', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 't_media_blob',
+            },
+        ),
+    ]
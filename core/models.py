@@ -1,6 +1,16 @@
+import uuid
+
 from django.db import models
 
 
+class SoftDeleteManager(models.Manager):
+    """Manager which excludes soft deleted rows"""
+
+    def get_queryset(self):
+        """returns queryset of rows which are not soft deleted"""
+        return super().get_queryset().filter(is_deleted=False)
+
+
 class CustomBaseClass(models.Model):
     """Base class to add created_on and updated_on fields"""
     created_on = models.DateTimeField(null=True, blank=True)
@@ -10,3 +20,67 @@ class CustomBaseClass(models.Model):
 
     class Meta:
         abstract = True
+
+
+class ArchiveBaseClass(CustomBaseClass):
+    """Base class for archive tables of soft deleted rows"""
+    id = models.BigIntegerField(primary_key=True)
+    archived_on = models.DateTimeField()
+
+    class Meta:
+        abstract = True
+
+
+class IdempotencyKey(models.Model):
+    """stores responses of create requests sent with an Idempotency-Key header"""
+    key_hash = models.CharField(max_length=64, unique=True)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.TextField(default="", blank=True)
+    expires_on = models.DateTimeField(db_index=True)
+
+    class Meta:
+        db_table = "t_idempotency_key"
+
+    def __str__(self):
+        """returns string representation of idempotency key"""
+        return f"{self.key_hash}"
+
+
+class UploadSession(models.Model):
+    """resumable upload of a large file sent in chunks"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    received_size = models.BigIntegerField(default=0)
+    created_by = models.CharField(max_length=255)
+    created_on = models.DateTimeField()
+    expires_on = models.DateTimeField(db_index=True)
+
+    class Meta:
+        db_table = "t_upload_session"
+
+    def __str__(self):
+        """returns string representation of upload session"""
+        return f"{self.filename} - {self.received_size}/{self.size}"
+
+    @property
+    def is_complete(self):
+        """returns True if every byte of the file is received"""
+        return self.received_size == self.size
+
+
+class MediaBlob(models.Model):
+    """stored file addressed by the sha256 of its content, shared by every row which uses it"""
+    content_hash = models.CharField(max_length=64, unique=True)
+    path = models.CharField(max_length=255, unique=True)
+    size = models.BigIntegerField(default=0)
+    ref_count = models.IntegerField(default=1)
+    created_on = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "t_media_blob"
+
+    def __str__(self):
+        """returns string representation of media blob"""
+        return f"{self.path} - {self.ref_count}"
@@ -1,6 +1,12 @@
+from django.conf import settings
 from django.contrib.auth import authenticate
+from django.db.models import QuerySet
+from django.utils import timezone
 
-from rest_framework import serializers
+from rest_framework import serializers, ISO_8601
+from rest_framework.settings import api_settings
+
+from core.models import UploadSession
 
 
 class AuthTokenSerializer(serializers.Serializer):
@@ -39,3 +45,147 @@ class AuthTokenSerializer(serializers.Serializer):
 
         attrs["user"] = user
         return attrs
+
+
+class ValuesReadSerializer:
+    """Read only serializer for list endpoints
+        Rows are read with queryset.values() and converted with the fields of the
+        mirrored model serializer, skipping model instances and validation machinery.
+        Serializer method fields are read from get_<field>(row) of this class.
+    """
+    serializer_class = None
+    default_fields = None
+    method_field_sources = {}
+
+    def __init__(self, rows, fields=None, context=None):
+        self.rows = rows
+        self.context = context or {}
+        serializer_fields = self.serializer_class(context=self.context).fields
+        model = self.serializer_class.Meta.model
+        field_names = fields or self.default_fields or self.get_readable_fields()
+        self.columns = []
+        self.converters = []
+        for name in field_names:
+            field = serializer_fields[name]
+            if isinstance(field, serializers.SerializerMethodField):
+                self.columns.extend(self.method_field_sources.get(name, ()))
+                self.converters.append((name, None, getattr(self, f"get_{name}")))
+                continue
+
+            model_field = model._meta.get_field(field.source)
+            self.columns.append(model_field.attname)
+            self.converters.append((name, model_field.attname,
+                                    self.get_converter(field, model_field)))
+
+    @classmethod
+    def get_readable_fields(cls):
+        """returns names of all readable fields of the mirrored serializer"""
+        return [name for name, field in cls.serializer_class().fields.items()
+                if not field.write_only]
+
+    @classmethod
+    def get_requested_fields(cls, request):
+        """returns field names requested with ?fields= or None"""
+        fields_param = request.query_params.get("fields")
+        if not fields_param:
+            return None
+
+        fields = [name.strip() for name in fields_param.split(",") if name.strip()]
+        invalid_fields = set(fields) - set(cls.get_readable_fields())
+        if invalid_fields:
+            error = {
+                "message": f"Invalid fields: {', '.join(sorted(invalid_fields))}"
+            }
+            raise serializers.ValidationError(error, code="validation")
+        return fields
+
+    @staticmethod
+    def get_converter(field, model_field):
+        """returns function which converts a column value to its representation
+            Datetime and decimal conversions resolve settings once instead of per value.
+        """
+        if isinstance(field, serializers.RelatedField):
+            return None
+
+        if isinstance(field, serializers.FileField):
+            def convert_file(name):
+                return field.to_representation(model_field.attr_class(None, model_field, name))
+            return convert_file
+
+        if isinstance(field, serializers.DateTimeField):
+            output_format = getattr(field, "format", api_settings.DATETIME_FORMAT)
+            field_timezone = getattr(field, "timezone", field.default_timezone())
+            if output_format is None or output_format.lower() != ISO_8601 or \
+                    field_timezone is None:
+                return field.to_representation
+
+            def convert_datetime(value):
+                if isinstance(value, str):
+                    return value
+                if timezone.is_aware(value):
+                    value = value.astimezone(field_timezone)
+                else:
+                    value = timezone.make_aware(value, field_timezone)
+                value = value.isoformat()
+                if value.endswith("+00:00"):
+                    value = value[:-6] + "Z"
+                return value
+            return convert_datetime
+
+        coerce_to_string = getattr(field, "coerce_to_string", api_settings.COERCE_DECIMAL_TO_STRING)
+        if isinstance(field, serializers.DecimalField) and coerce_to_string and \
+                field.decimal_places is not None and not field.localize:
+            decimal_format = f"{{:.{field.decimal_places}f}}"
+
+            def convert_decimal(value):
+                return decimal_format.format(value)
+            return convert_decimal
+
+        return field.to_representation
+
+    def to_representation(self, row):
+        """returns serialized data of a single values row"""
+        data = {}
+        for name, column, convert in self.converters:
+            if column is None:
+                data[name] = convert(row)
+                continue
+
+            value = row[column]
+            data[name] = value if convert is None or value is None else convert(value)
+        return data
+
+    @property
+    def data(self):
+        """returns list of serialized rows"""
+        rows = self.rows
+        if isinstance(rows, QuerySet):
+            rows = rows.values(*dict.fromkeys(self.columns))
+        return [self.to_representation(row) for row in rows]
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    """serializes resumable upload sessions"""
+    chunk_size = serializers.SerializerMethodField(read_only=True)
+
+    class Meta:
+        model = UploadSession
+        fields = ("id", "filename", "size", "received_size", "chunk_size", "expires_on")
+        read_only_fields = ("id", "received_size", "expires_on")
+
+    def get_chunk_size(self, instance):
+        """returns largest chunk accepted in one request"""
+        return settings.UPLOAD_CHUNK_MAX_SIZE
+
+    def validate_size(self, size):
+        """returns size if it is within the upload size cap"""
+        if size <= 0 or size > settings.MAX_UPLOAD_SIZE:
+            raise serializers.ValidationError(
+                f"Size must be between 1 and {settings.MAX_UPLOAD_SIZE} bytes")
+        return size
+
+    def create(self, validated_data):
+        """creates a new upload session"""
+        request_user = validated_data.pop("request_user")
+        validated_data["created_by"] = request_user.id
+        return UploadSession.objects.create(**validated_data)
@@ -0,0 +1,163 @@
+import mimetypes
+import os
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from django.views.decorators.http import require_safe
+
+# content addressed files and their variants, <sha256>.<ext> or <sha256>_<size>.<ext>
+HASHED_NAME_PATTERN = re.compile(r"^([0-9a-f]{64}(?:_[a-z]+)?)\.[a-z0-9]+$")
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+class FileRange:
+    """file object limited to a byte range
+        The file number stays reachable so wsgi servers can still send the range with sendfile.
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        """reads at most size bytes without passing the end of the range"""
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def get_media_etag(name, stat_result):
+    """returns etag of a media file
+        Content addressed names carry their hash, other files use modified time and size.
+    """
+    match = HASHED_NAME_PATTERN.match(name)
+    if match:
+        return quote_etag(match.group(1))
+    return quote_etag(f"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}")
+
+
+def parse_range(value, size):
+    """returns (start, end) of a single byte range header, None to send the whole file
+        or False if the range cannot be satisfied. Multiple ranges are answered in full.
+    """
+    match = RANGE_PATTERN.match((value or "").replace(" ", ""))
+    if not match or match.groups() == ("", ""):
+        return None
+
+    start, end = match.groups()
+    if start == "":
+        # suffix range, the last n bytes
+        length = int(end)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def is_range_fresh(request, etag, last_modified):
+    """returns True if the If-Range validator of the request matches the file"""
+    if_range = request.headers.get("If-Range")
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def add_media_headers(response, name, etag, last_modified):
+    """adds validators and cache headers, hashed files are cached for a year"""
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    response["Accept-Ranges"] = "bytes"
+    if HASHED_NAME_PATTERN.match(name):
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=settings.MEDIA_CACHE_SECONDS)
+    return response
+
+
+def get_offload_response(path, full_path, content_type):
+    """returns empty response which tells the web server in front to send the file"""
+    response = HttpResponse(content_type=content_type)
+    if settings.MEDIA_SERVE_MODE == "x-accel-redirect":
+        response["X-Accel-Redirect"] = settings.MEDIA_ACCEL_REDIRECT_LOCATION + quote(path)
+    else:
+        response["X-Sendfile"] = os.path.abspath(full_path)
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    """serves an uploaded media file
+        In x-accel-redirect and x-sendfile modes the web server sends the bytes, ranges
+        included, and the app worker only checks the file and sets headers. Otherwise
+        the file is streamed with wsgi.file_wrapper, which gunicorn sends with sendfile.
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        stat_result = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError, ValueError):
+        raise Http404("File is not found")
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise Http404("File is not found")
+
+    name = os.path.basename(full_path)
+    size = stat_result.st_size
+    last_modified = int(stat_result.st_mtime)
+    etag = get_media_etag(name, stat_result)
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return add_media_headers(not_modified, name, etag, last_modified)
+
+    content_type, encoding = mimetypes.guess_type(name)
+    content_type = content_type if content_type and not encoding else "application/octet-stream"
+    if settings.MEDIA_SERVE_MODE in ("x-accel-redirect", "x-sendfile"):
+        response = get_offload_response(path, full_path, content_type)
+        return add_media_headers(response, name, etag, last_modified)
+
+    byte_range = None
+    if size and is_range_fresh(request, etag, last_modified):
+        byte_range = parse_range(request.headers.get("Range"), size)
+    if byte_range is False:
+        response = HttpResponse(status=416, content_type=content_type)
+        response["Content-Range"] = f"bytes */{size}"
+        return add_media_headers(response, name, etag, last_modified)
+
+    if request.method == "HEAD":
+        response = HttpResponse(content_type=content_type)
+    elif byte_range:
+        start, end = byte_range
+        response = FileResponse(FileRange(open(full_path, "rb"), start, end - start + 1),
+                                content_type=content_type)
+    else:
+        response = FileResponse(open(full_path, "rb"), content_type=content_type)
+
+    if byte_range:
+        start, end = byte_range
+        response.status_code = 206
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Length"] = end - start + 1
+    else:
+        response["Content-Length"] = size
+    return add_media_headers(response, name, etag, last_modified)
@@ -0,0 +1,347 @@
+import base64
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+import hashlib
+import hmac
+import io
+import random
+import time
+from urllib.error import HTTPError
+from urllib.parse import quote, urljoin, urlsplit
+from urllib.request import Request, urlopen
+from xml.etree import ElementTree
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.base import File
+from django.core.files.storage import FileSystemStorage, Storage
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+DIRECT_UPLOAD_SALT = "core.storage.direct-upload"
+S3_NAMESPACE = "{http://s3.amazonaws.com/doc/2006-03-01/}"
+UNSIGNED_PAYLOAD = "UNSIGNED-PAYLOAD"
+# throttled and failed requests are sent again, other errors are final
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+RETRY_ERROR_CODES = ("SlowDown", "RequestTimeout", "InternalError", "ServiceUnavailable")
+MAX_RETRY_DELAY_SECONDS = 20
+
+
+class S3Error(Exception):
+    """error response of the object store"""
+
+    def __init__(self, status_code, code="", message=""):
+        self.status_code = status_code
+        self.code = code
+        super().__init__(f"Object store responded with {status_code} {code} {message}".strip())
+
+    @property
+    def is_retryable(self):
+        """returns True if the same request may succeed when it is sent again"""
+        return self.status_code in RETRY_STATUS_CODES or self.code in RETRY_ERROR_CODES
+
+
+def get_s3_error(error):
+    """returns S3Error of an http error with the code and message of its xml body"""
+    code = message = ""
+    try:
+        body = error.read()
+        if body:
+            root = ElementTree.fromstring(body)
+            code = root.findtext("Code") or ""
+            message = root.findtext("Message") or ""
+    except (OSError, ElementTree.ParseError):
+        pass
+    finally:
+        error.close()
+    return S3Error(error.code, code, message)
+
+
+def get_retry_delay(attempt):
+    """returns seconds to wait before a retry, exponential backoff with full jitter"""
+    return random.uniform(0, min(settings.S3_RETRY_BASE_SECONDS * 2 ** attempt,
+                                 MAX_RETRY_DELAY_SECONDS))
+
+
+def get_canonical_query(query):
+    """returns sorted and quoted query string of aws signature v4"""
+    return "&".join(f"{quote(key, safe='-_.~')}={quote(str(value), safe='-_.~')}"
+                    for key, value in sorted(query.items()))
+
+
+def get_checksum_header(content_hash):
+    """returns base64 sha256 sent in x-amz-checksum-sha256 from a hex content hash"""
+    return base64.b64encode(bytes.fromhex(content_hash)).decode("ascii")
+
+
+@deconstructible
+class MediaFileSystemStorage(FileSystemStorage):
+    """filesystem storage which accepts direct uploads to a signed app url
+        Stands in for an object store in development and single server setups.
+    """
+
+    def get_upload_url(self, name, size, content_hash, expires_in):
+        """returns url, method and headers of an upload of the file straight to its path"""
+        token = signing.dumps({"name": name, "size": size, "hash": content_hash},
+                              salt=DIRECT_UPLOAD_SALT)
+        return {
+            "url": reverse("direct_upload", kwargs={"token": token}),
+            "method": "PUT",
+            "headers": {"Content-Length": str(size)},
+        }
+
+    @staticmethod
+    def load_upload_token(token, expires_in):
+        """returns name, size and content hash of a signed direct upload or None"""
+        try:
+            upload = signing.loads(token, salt=DIRECT_UPLOAD_SALT, max_age=expires_in)
+        except signing.BadSignature:
+            return None
+        return upload["name"], upload["size"], upload["hash"]
+
+
+class S3RangeReader(io.RawIOBase):
+    """reads an object with ranged GET requests, so only the bytes read are downloaded"""
+
+    def __init__(self, storage, name, size):
+        self.storage = storage
+        self.name = name
+        self.size = size
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self.position = max(offset, 0)
+        return self.position
+
+    def readinto(self, buffer):
+        if self.position >= self.size or not len(buffer):
+            return 0
+        end = min(self.position + len(buffer), self.size) - 1
+        with self.storage.request("GET", self.name,
+                                  headers={"Range": f"bytes={self.position}-{end}"}) as response:
+            data = response.read()
+        buffer[:len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+
+@deconstructible
+class S3MediaStorage(Storage):
+    """storage of an s3 compatible object store (aws s3, minio) signed with aws signature v4
+        Objects are addressed path style, {endpoint}/{bucket}/{name}.
+    """
+    read_buffer_size = 1024 * 1024
+
+    def __init__(self, endpoint_url=None, bucket=None, access_key=None, secret_key=None,
+                 region=None, base_url=None):
+        self.endpoint_url = (endpoint_url or settings.S3_ENDPOINT_URL).rstrip("/")
+        self.bucket = bucket or settings.S3_BUCKET
+        self.access_key = access_key or settings.S3_ACCESS_KEY
+        self.secret_key = secret_key or settings.S3_SECRET_KEY
+        self.region = region or settings.S3_REGION
+        media_url = base_url or settings.MEDIA_URL
+        self.base_url = media_url if urlsplit(media_url).netloc else None
+
+    def get_object_path(self, name=""):
+        """returns quoted path of an object, or of the bucket for an empty name"""
+        path = f"/{self.bucket}/{name}" if name else f"/{self.bucket}"
+        return quote(path, safe="/-_.~")
+
+    def get_signing_key(self, date):
+        """returns aws signature v4 key of the date"""
+        key = f"AWS4{self.secret_key}".encode("utf-8")
+        for value in (date, self.region, "s3", "aws4_request"):
+            key = hmac.new(key, value.encode("utf-8"), hashlib.sha256).digest()
+        return key
+
+    def sign(self, method, path, query, headers, now):
+        """returns scope, signed header names and signature of a request
+            Args: method, path (quoted), query (dict), headers (signed headers), now
+        """
+        date = now.strftime("%Y%m%d")
+        scope = f"{date}/{self.region}/s3/aws4_request"
+        canonical_query = get_canonical_query(query)
+        signed_headers = ";".join(sorted(name.lower() for name in headers))
+        canonical_headers = "".join(f"{name.lower()}:{str(value).strip()}\n"
+                                    for name, value in sorted(headers.items(),
+                                                              key=lambda item: item[0].lower()))
+        payload_hash = headers.get("x-amz-content-sha256", UNSIGNED_PAYLOAD)
+        canonical_request = "\n".join((method, path, canonical_query, canonical_headers,
+                                       signed_headers, payload_hash))
+        string_to_sign = "\n".join((
+            "AWS4-HMAC-SHA256",
+            now.strftime("%Y%m%dT%H%M%SZ"),
+            scope,
+            hashlib.sha256(canonical_request.encode("utf-8")).hexdigest(),
+        ))
+        signature = hmac.new(self.get_signing_key(date), string_to_sign.encode("utf-8"),
+                             hashlib.sha256).hexdigest()
+        return scope, signed_headers, signature
+
+    def request(self, method, name="", query=None, headers=None, data=None):
+        """sends a signed request and returns the response of a 2xx status
+            Throttled, failed and unreachable requests are sent again up to S3_MAX_RETRIES
+            times with backoff, which is safe as every request of the storage is idempotent.
+            Raises S3Error of any other status or the last failure, or OSError if the store
+            cannot be reached.
+        """
+        position = data.tell() if hasattr(data, "seek") else None
+        for attempt in range(settings.S3_MAX_RETRIES + 1):
+            is_last_attempt = attempt == settings.S3_MAX_RETRIES
+            if position is not None:
+                data.seek(position)
+            try:
+                response = self.send(method, name, query, headers, data)
+            except HTTPError as e:
+                error = get_s3_error(e)
+                if is_last_attempt or not error.is_retryable:
+                    raise error from None
+            except OSError:
+                # connection errors and timeouts
+                if is_last_attempt:
+                    raise
+            else:
+                if 200 <= response.status < 300:
+                    return response
+                response.close()
+                error = S3Error(response.status)
+                if is_last_attempt or not error.is_retryable:
+                    raise error
+            time.sleep(get_retry_delay(attempt))
+
+    def send(self, method, name="", query=None, headers=None, data=None):
+        """sends a signed request once and returns the response, raising HTTPError on errors"""
+        query = query or {}
+        path = self.get_object_path(name)
+        now = datetime.utcnow()
+        signed_headers = {
+            "host": urlsplit(self.endpoint_url).netloc,
+            "x-amz-content-sha256": UNSIGNED_PAYLOAD,
+            "x-amz-date": now.strftime("%Y%m%dT%H%M%SZ"),
+        }
+        scope, signed_header_names, signature = self.sign(method, path, query,
+                                                          signed_headers, now)
+        request_headers = dict(headers or {}, **signed_headers)
+        request_headers["Authorization"] = (
+            f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+            f"SignedHeaders={signed_header_names}, Signature={signature}"
+        )
+        url = self.endpoint_url + path
+        if query:
+            url += "?" + get_canonical_query(query)
+        return urlopen(Request(url, data=data, headers=request_headers, method=method),
+                       timeout=settings.S3_TIMEOUT_SECONDS)
+
+    def head(self, name):
+        """returns headers of an object or None if it does not exist"""
+        try:
+            with self.request("HEAD", name) as response:
+                return response.headers
+        except S3Error as e:
+            if e.status_code == 404:
+                return None
+            raise
+
+    def _open(self, name, mode="rb"):
+        headers = self.head(name)
+        if headers is None:
+            raise FileNotFoundError(name)
+        reader = S3RangeReader(self, name, int(headers["Content-Length"]))
+        return File(io.BufferedReader(reader, self.read_buffer_size), name=name)
+
+    def _save(self, name, content):
+        content.seek(0)
+        headers = {"Content-Length": str(content.size)}
+        with self.request("PUT", name, headers=headers, data=content):
+            pass
+        return name
+
+    def exists(self, name):
+        return self.head(name) is not None
+
+    def delete(self, name):
+        try:
+            with self.request("DELETE", name):
+                pass
+        except S3Error as e:
+            if e.status_code != 404:
+                raise
+
+    def size(self, name):
+        headers = self.head(name)
+        if headers is None:
+            raise FileNotFoundError(name)
+        return int(headers["Content-Length"])
+
+    def get_modified_time(self, name):
+        headers = self.head(name)
+        if headers is None:
+            raise FileNotFoundError(name)
+        modified_time = parsedate_to_datetime(headers["Last-Modified"])
+        return modified_time if settings.USE_TZ else timezone.make_naive(modified_time)
+
+    def listdir(self, path):
+        prefix = f"{path.strip('/')}/" if path.strip("/") else ""
+        directories, files = [], []
+        query = {"list-type": "2", "prefix": prefix, "delimiter": "/"}
+        while True:
+            with self.request("GET", query=query) as response:
+                root = ElementTree.fromstring(response.read())
+            directories += [element.text[len(prefix):].rstrip("/")
+                            for element in root.iter(f"{S3_NAMESPACE}Prefix")
+                            if element.text and element.text != prefix]
+            files += [element.text[len(prefix):]
+                      for element in root.iter(f"{S3_NAMESPACE}Key")]
+            token = root.findtext(f"{S3_NAMESPACE}NextContinuationToken")
+            if not token:
+                return directories, files
+            query["continuation-token"] = token
+
+    def url(self, name):
+        if self.base_url:
+            return urljoin(self.base_url, quote(name))
+        return self.endpoint_url + self.get_object_path(name)
+
+    def get_upload_url(self, name, size, content_hash, expires_in):
+        """returns presigned url, method and headers of an upload of the file to its path
+            Length and sha256 are signed, so the store rejects any other content.
+        """
+        path = self.get_object_path(name)
+        now = datetime.utcnow()
+        headers = {
+            "host": urlsplit(self.endpoint_url).netloc,
+            "content-length": str(size),
+            "x-amz-checksum-sha256": get_checksum_header(content_hash),
+        }
+        query = {
+            "X-Amz-Algorithm": "AWS4-HMAC-SHA256",
+            "X-Amz-Credential": f"{self.access_key}/{now.strftime('%Y%m%d')}/{self.region}"
+                                f"/s3/aws4_request",
+            "X-Amz-Date": now.strftime("%Y%m%dT%H%M%SZ"),
+            "X-Amz-Expires": str(expires_in),
+            "X-Amz-SignedHeaders": ";".join(sorted(headers)),
+        }
+        _, _, signature = self.sign("PUT", path, query, headers, now)
+        query["X-Amz-Signature"] = signature
+        return {
+            "url": f"{self.endpoint_url}{path}?{get_canonical_query(query)}",
+            "method": "PUT",
+            "headers": {
+                "Content-Length": str(size),
+                "x-amz-checksum-sha256": headers["x-amz-checksum-sha256"],
+            },
+        }
@@ -0,0 +1,182 @@
+import hashlib
+import os
+import re
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+from PIL import Image
+
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException
+
+CONTENT_RANGE_PATTERN = re.compile(r"^bytes (\d+)-(\d+)/(\d+)$")
+# multipart boundaries and text fields sent along with the file
+FORM_OVERHEAD_SIZE = 64 * 1024
+
+
+class RequestEntityTooLarge(APIException):
+    """error of an upload larger than the allowed size"""
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = "Uploaded file is too large"
+    default_code = "too_large"
+
+
+class SizeLimitedUploadHandler(TemporaryFileUploadHandler):
+    """streams uploaded files to temporary files and stops at max_size bytes per file"""
+
+    def __init__(self, request=None, max_size=None):
+        super().__init__(request)
+        self.max_size = max_size or settings.MAX_UPLOAD_SIZE
+        self.received_size = 0
+
+    def get_too_large_error(self):
+        """returns error of an upload above the size cap"""
+        error = {
+            "message": f"Upload must not be larger than {self.max_size} bytes"
+        }
+        return RequestEntityTooLarge(error)
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        """rejects requests whose declared length cannot fit the size cap"""
+        if content_length and content_length > self.max_size + FORM_OVERHEAD_SIZE:
+            raise self.get_too_large_error()
+
+    def new_file(self, *args, **kwargs):
+        """resets the byte count and content hash for every file of the request"""
+        self.received_size = 0
+        self.hasher = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        """writes a chunk to the temporary file while the file is within the size cap"""
+        self.received_size += len(raw_data)
+        if self.received_size > self.max_size:
+            self.file.close()
+            raise self.get_too_large_error()
+        self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        """returns the uploaded file with the sha256 of its content"""
+        file = super().file_complete(file_size)
+        file.content_hash = self.hasher.hexdigest()
+        return file
+
+
+class SizeLimitedUploadMixin:
+    """streams multipart files of the view to disk with a hard size cap"""
+    max_upload_size = None
+
+    def initialize_request(self, request, *args, **kwargs):
+        """replaces default upload handlers before the request body is parsed"""
+        request.upload_handlers = [SizeLimitedUploadHandler(request, self.max_upload_size)]
+        return super().initialize_request(request, *args, **kwargs)
+
+
+def read_image_header(file):
+    """returns format, width and height of an image from its header without decoding pixels"""
+    position = file.tell() if hasattr(file, "tell") else 0
+    try:
+        with Image.open(file) as image:
+            return image.format, image.width, image.height
+    except Exception:
+        raise ValueError("Upload a valid image")
+    finally:
+        file.seek(position)
+
+
+def validate_image_header(file):
+    """raises validation error if the image format or dimensions are not allowed"""
+    try:
+        image_format, width, height = read_image_header(file)
+    except ValueError as e:
+        raise serializers.ValidationError(str(e), code="invalid_image")
+
+    if image_format not in settings.ALLOWED_IMAGE_FORMATS:
+        raise serializers.ValidationError(
+            f"Image format must be one of {', '.join(settings.ALLOWED_IMAGE_FORMATS)}",
+            code="invalid_image"
+        )
+    if width * height > settings.MAX_IMAGE_PIXELS:
+        raise serializers.ValidationError(
+            f"Image must not have more than {settings.MAX_IMAGE_PIXELS} pixels",
+            code="invalid_image"
+        )
+
+
+class ImageHeaderField(serializers.FileField):
+    """image field which validates the image header only, without decoding the image"""
+
+    def to_internal_value(self, data):
+        """returns the uploaded file after checking its format and dimensions"""
+        file = super().to_internal_value(data)
+        validate_image_header(file)
+        return file
+
+
+def get_upload_path(upload_id):
+    """returns path of the partial file of a resumable upload"""
+    return os.path.join(settings.RESUMABLE_UPLOAD_DIR, f"{upload_id}.part")
+
+
+def parse_content_range(value):
+    """returns start, end and total size of a Content-Range header or None"""
+    match = CONTENT_RANGE_PATTERN.match((value or "").strip())
+    if not match:
+        return None
+    start, end, total = (int(group) for group in match.groups())
+    if start > end or end >= total:
+        return None
+    return start, end, total
+
+
+def write_upload_chunk(upload_id, stream, start, length, read_size=64 * 1024):
+    """appends length bytes of the stream to the partial file at start offset
+        Returns count of bytes written. A short chunk is truncated away so it can be resent.
+    """
+    os.makedirs(settings.RESUMABLE_UPLOAD_DIR, exist_ok=True)
+    path = get_upload_path(upload_id)
+    with open(path, "r+b" if os.path.exists(path) else "w+b") as file:
+        file.truncate(start)
+        file.seek(start)
+        written = 0
+        while written < length:
+            data = stream.read(min(read_size, length - written))
+            if not data:
+                break
+            file.write(data)
+            written += len(data)
+        if written != length:
+            file.truncate(start)
+    return written
+
+
+def copy_stream(stream, file, length, read_size=64 * 1024):
+    """copies length bytes of the stream to the file
+        Returns count of bytes copied and sha256 of the copied bytes.
+    """
+    hasher = hashlib.sha256()
+    copied = 0
+    while copied < length:
+        data = stream.read(min(read_size, length - copied))
+        if not data:
+            break
+        hasher.update(data)
+        file.write(data)
+        copied += len(data)
+    return copied, hasher.hexdigest()
+
+
+def open_completed_upload(upload):
+    """returns django file of a completed resumable upload"""
+    return File(open(get_upload_path(upload.id), "rb"), name=upload.filename)
+
+
+def delete_upload_file(upload_id):
+    """deletes the partial file of a resumable upload"""
+    try:
+        os.remove(get_upload_path(upload_id))
+    except FileNotFoundError:
+        pass
@@ -8,4 +8,8 @@ urlpatterns = [
     path("token/", views.get_access_token, name="token"),
     path("activate-user/", views.activate_user, name="activate-user"),
     path("activate-staff/", views.activate_staff, name="activate-staff"),
+    path("uploads/", views.UploadSessionCreateView.as_view(), name="uploads"),
+    path("uploads/<uuid:upload_id>/", views.UploadSessionDetailView.as_view(),
+         name="upload_detail"),
+    path("storage/<str:token>/", views.DirectUploadView.as_view(), name="direct_upload"),
 ]
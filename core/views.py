@@ -1,10 +1,17 @@
 from django.views.decorators.csrf import csrf_protect, ensure_csrf_cookie
 from django.contrib.auth import get_user_model
 from django.conf import settings
-from datetime import datetime
+from django.db import transaction
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.files.temp import NamedTemporaryFile
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from datetime import datetime, timedelta
 
 from rest_framework.decorators import api_view, permission_classes,\
     authentication_classes
+from rest_framework.generics import CreateAPIView, GenericAPIView
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
@@ -13,7 +20,9 @@ import jwt
 
 from account.serializers import UserSerializer
 from core.authentication import generate_access_token, generate_refresh_token
-from core.serializers import AuthTokenSerializer
+from core.serializers import AuthTokenSerializer, UploadSessionSerializer
+from core.models import UploadSession
+from core import uploads
 from account.permissions import IsOwner
 from account.models import Business, UserProfile
 from account.serializers import BusinessSerializer, UserProfileReadOnlySerializer
@@ -167,3 +176,134 @@ def activate_staff(request):
         "message": "Unauthorized to activate staff user."
     }
     return Response(detail, status=status.HTTP_401_UNAUTHORIZED)
+
+
+class UploadSessionCreateView(CreateAPIView):
+    """starts a resumable upload"""
+    serializer_class = UploadSessionSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def create(self, request, *args, **kwargs):
+        """creates an upload session for a file of the given size"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        now = timezone.now()
+        serializer.save(
+            request_user=request.user,
+            created_on=now,
+            expires_on=now + timedelta(hours=settings.UPLOAD_SESSION_TTL_HOURS)
+        )
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class UploadSessionDetailView(GenericAPIView):
+    """returns progress of, appends chunks to and cancels a resumable upload"""
+    serializer_class = UploadSessionSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def get_queryset(self):
+        """returns live upload sessions of the user"""
+        return UploadSession.objects.filter(created_by=self.request.user.id,
+                                            expires_on__gt=timezone.now())
+
+    def get(self, request, *args, **kwargs):
+        """returns the session with count of received bytes to resume from"""
+        upload = get_object_or_404(self.get_queryset(), pk=kwargs["upload_id"])
+        return Response(self.get_serializer(upload).data, status=status.HTTP_200_OK)
+
+    def put(self, request, *args, **kwargs):
+        """writes the raw request body at the offset of its Content-Range header"""
+        content_range = uploads.parse_content_range(request.headers.get("Content-Range"))
+        if content_range is None:
+            error = {
+                "message": "Content-Range header must be bytes <start>-<end>/<size>"
+            }
+            return Response(error, status=status.HTTP_400_BAD_REQUEST)
+
+        start, end, size = content_range
+        length = end - start + 1
+        if length > settings.UPLOAD_CHUNK_MAX_SIZE:
+            error = {
+                "message": f"Chunk must not be larger than {settings.UPLOAD_CHUNK_MAX_SIZE} bytes"
+            }
+            return Response(error, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        with transaction.atomic():
+            # the lock keeps concurrent chunks of one upload from writing at the same offset
+            upload = get_object_or_404(self.get_queryset().select_for_update(),
+                                       pk=kwargs["upload_id"])
+            if size != upload.size or start != upload.received_size:
+                error = {
+                    "message": f"Chunk must start at byte {upload.received_size} of {upload.size}",
+                    "received_size": upload.received_size,
+                }
+                return Response(error, status=status.HTTP_409_CONFLICT)
+
+            written = uploads.write_upload_chunk(upload.id, request.stream, start, length) \
+                if request.stream else 0
+            if written != length:
+                error = {
+                    "message": f"Chunk has {written} of {length} bytes",
+                    "received_size": upload.received_size,
+                }
+                return Response(error, status=status.HTTP_400_BAD_REQUEST)
+
+            upload.received_size = end + 1
+            upload.save(update_fields=["received_size"])
+        return Response(self.get_serializer(upload).data, status=status.HTTP_200_OK)
+
+    def delete(self, request, *args, **kwargs):
+        """cancels the upload and deletes its partial file"""
+        upload = get_object_or_404(self.get_queryset(), pk=kwargs["upload_id"])
+        uploads.delete_upload_file(upload.id)
+        upload.delete()
+        return Response(None, status=status.HTTP_204_NO_CONTENT)
+
+
+class DirectUploadView(GenericAPIView):
+    """receives a file sent straight to its storage path with a signed upload url
+        Serves the filesystem storage, object stores take presigned uploads themselves.
+    """
+    authentication_classes = ()
+    permission_classes = (AllowAny,)
+
+    def put(self, request, *args, **kwargs):
+        """stores the raw request body if its size and sha256 match the signed upload"""
+        storage = default_storage
+        upload = None
+        if hasattr(storage, "load_upload_token"):
+            upload = storage.load_upload_token(kwargs["token"],
+                                               settings.PRESIGNED_UPLOAD_EXPIRES_SECONDS)
+        if upload is None:
+            error = {
+                "message": "Upload url is invalid or expired"
+            }
+            return Response(error, status=status.HTTP_403_FORBIDDEN)
+
+        name, size, content_hash = upload
+        try:
+            content_length = int(request.headers.get("Content-Length") or 0)
+        except ValueError:
+            content_length = 0
+        if content_length != size:
+            error = {
+                "message": f"Content-Length must be {size}"
+            }
+            return Response(error, status=status.HTTP_400_BAD_REQUEST)
+        # the path is addressed by content, a stored file has the same bytes
+        if storage.exists(name):
+            return Response(None, status=status.HTTP_204_NO_CONTENT)
+
+        with NamedTemporaryFile(dir=settings.FILE_UPLOAD_TEMP_DIR) as file:
+            copied, copied_hash = uploads.copy_stream(request.stream, file, size)
+            if copied != size or copied_hash != content_hash:
+                error = {
+                    "message": "Uploaded file does not match its size and sha256"
+                }
+                return Response(error, status=status.HTTP_400_BAD_REQUEST)
+            file.seek(0)
+            saved_name = storage.save(name, File(file, name=name))
+            # another upload of the same content was stored first
+            if saved_name != name:
+                storage.delete(saved_name)
+        return Response(None, status=status.HTTP_201_CREATED)
@@ -1,7 +1,18 @@
 from django.utils import timezone
+from django.contrib.auth import get_user_model
 
 
 def get_current_time():
     """returns current time"""
     now = timezone.now().isoformat()
     return now
+
+
+def get_tenant_user_ids(user):
+    """returns ids of users whose rows belong to the business of the user"""
+    if user.business_id:
+        user_ids = get_user_model().objects\
+            .filter(business_id=user.business_id)\
+            .values_list("id", flat=True)
+        return [str(user_id) for user_id in user_ids]
+    return [str(user.id)]
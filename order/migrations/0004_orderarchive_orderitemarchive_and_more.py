@@ -0,0 +1,77 @@
+# Generated by Django 4.0 on 2026-10-19 13:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0003_alter_order_delivery_date'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderArchive',
+            fields=[
+                ('created_on', models.DateTimeField(blank=True, null=True)),
+                ('updated_on', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.CharField(blank=True, max_length=255, null=True)),
+                ('updated_by', models.CharField(blank=True, max_length=255, null=True)),
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('archived_on', models.DateTimeField()),
+                ('customer_id', models.BigIntegerField(null=True)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=9)),
+                ('net_amount', models.DecimalField(decimal_places=2, default=0, max_digits=9)),
+                ('paid_amount', models.DecimalField(decimal_places=2, default=0, max_digits=9)),
+                ('discount', models.DecimalField(decimal_places=1, default=0, max_digits=4)),
+                ('delivery_date', models.DateTimeField(blank=True, null=True)),
+                ('order_status', models.CharField(max_length=64)),
+                ('comments', models.TextField(blank=True, default='', max_length=1024)),
+                ('is_one_time_delivery', models.BooleanField(default=True)),
+                ('is_deleted', models.BooleanField(default=True)),
+            ],
+            options={
+                'db_table': 't_order_archive',
+                'ordering': ('-archived_on',),
+            },
+        ),
+        migrations.CreateModel(
+            name='OrderItemArchive',
+            fields=[
+                ('created_on', models.DateTimeField(blank=True, null=True)),
+                ('updated_on', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.CharField(blank=True, max_length=255, null=True)),
+                ('updated_by', models.CharField(blank=True, max_length=255, null=True)),
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('archived_on', models.DateTimeField()),
+                ('order_id', models.BigIntegerField(db_index=True)),
+                ('item_type', models.CharField(max_length=255)),
+                ('item_price', models.DecimalField(decimal_places=2, default=0, max_digits=7)),
+                ('quantity', models.IntegerField(default=1)),
+                ('status', models.CharField(max_length=64)),
+                ('delivery_date', models.DateTimeField()),
+                ('comments', models.TextField(blank=True, default='', max_length=512)),
+                ('is_deleted', models.BooleanField(default=True)),
+            ],
+            options={
+                'db_table': 't_order_item_archive',
+                'ordering': ('-archived_on',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['is_deleted', 'created_by'], name='t_order_deleted_creator_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['is_deleted', 'updated_on'], name='t_order_deleted_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(fields=['is_deleted', 'order'], name='t_order_item_deleted_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(fields=['is_deleted', 'updated_on'], name='t_order_item_deleted_upd_idx'),
+        ),
+    ]
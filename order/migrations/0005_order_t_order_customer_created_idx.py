@@ -0,0 +1,17 @@
+# Generated by Django 4.0 on 2026-10-19 13:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0004_orderarchive_orderitemarchive_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer', 'created_on'], name='t_order_customer_created_idx'),
+        ),
+    ]
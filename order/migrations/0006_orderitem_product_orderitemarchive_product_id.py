@@ -0,0 +1,25 @@
+# Generated by Django 4.0 on 2026-10-19 13:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_product_units_reserved'),
+        ('order', '0005_order_t_order_customer_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='product',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='order_items', related_query_name='order_item', to='products.product'),
+        ),
+        migrations.AddField(
+            model_name='orderitemarchive',
+            name='product_id',
+            field=models.BigIntegerField(null=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.0 on 2026-10-19 14:10
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def set_delivered_on(apps, schema_editor):
+    """dates deliveries of delivered items by their last update, as the rollup backfill did"""
+    for model_name in ("OrderItem", "OrderItemArchive"):
+        apps.get_model("order", model_name).objects\
+            .filter(status__iexact="delivered")\
+            .update(delivered_on=F("updated_on"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0006_orderitem_product_orderitemarchive_product_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='delivered_on',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='orderitemarchive',
+            name='delivered_on',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(set_delivered_on, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,7 @@
 from django.db import models
 from django.conf import settings
 
-from core.models import CustomBaseClass
+from core.models import CustomBaseClass, ArchiveBaseClass, SoftDeleteManager
 
 
 class Order(CustomBaseClass):
@@ -18,9 +18,17 @@ class Order(CustomBaseClass):
     is_one_time_delivery = models.BooleanField(default=True)
     is_deleted = models.BooleanField(default=False)
 
+    objects = SoftDeleteManager()
+    all_objects = models.Manager()
+
     class Meta:
         db_table = "t_order"
         ordering = ("-created_on",)
+        indexes = [
+            models.Index(fields=["is_deleted", "created_by"], name="t_order_deleted_creator_idx"),
+            models.Index(fields=["is_deleted", "updated_on"], name="t_order_deleted_updated_idx"),
+            models.Index(fields=["customer", "created_on"], name="t_order_customer_created_idx"),
+        ]
 
     def __str__(self):
         """string representation of order item"""
@@ -32,17 +40,73 @@ class OrderItem(CustomBaseClass):
     order = models.ForeignKey(Order, on_delete=models.CASCADE,
                               related_name="order_items", related_query_name="order_item")
     item_type = models.CharField(max_length=255)
+    product = models.ForeignKey("products.Product", on_delete=models.SET_NULL, null=True,
+                                blank=True, related_name="order_items",
+                                related_query_name="order_item")
     item_price = models.DecimalField(max_digits=7, decimal_places=2, default=0)
     quantity = models.IntegerField(default=1)
     status = models.CharField(max_length=64, default="Not yet started")
     delivery_date = models.DateTimeField()
+    # when the item became delivered, the day it counts in the daily revenue rollup
+    delivered_on = models.DateTimeField(null=True, blank=True)
     comments = models.TextField(max_length=512, default="", blank=True)
     is_deleted = models.BooleanField(default=False)
 
+    objects = SoftDeleteManager()
+    all_objects = models.Manager()
+
     class Meta:
         db_table = "t_order_item"
         ordering = ("-id",)
+        indexes = [
+            models.Index(fields=["is_deleted", "order"], name="t_order_item_deleted_order_idx"),
+            models.Index(fields=["is_deleted", "updated_on"], name="t_order_item_deleted_upd_idx"),
+        ]
 
     def __str__(self):
         """string representation of order item"""
         return f"{self.item_type}"
+
+
+class OrderArchive(ArchiveBaseClass):
+    """Archive of soft deleted orders"""
+    customer_id = models.BigIntegerField(null=True)
+    total_amount = models.DecimalField(max_digits=9, decimal_places=2, default=0)
+    net_amount = models.DecimalField(max_digits=9, decimal_places=2, default=0)
+    paid_amount = models.DecimalField(max_digits=9, decimal_places=2, default=0)
+    discount = models.DecimalField(max_digits=4, decimal_places=1, default=0)
+    delivery_date = models.DateTimeField(null=True, blank=True)
+    order_status = models.CharField(max_length=64)
+    comments = models.TextField(max_length=1024, default="", blank=True)
+    is_one_time_delivery = models.BooleanField(default=True)
+    is_deleted = models.BooleanField(default=True)
+
+    class Meta:
+        db_table = "t_order_archive"
+        ordering = ("-archived_on",)
+
+    def __str__(self):
+        """string representation of archived order"""
+        return f"{self.id}"
+
+
+class OrderItemArchive(ArchiveBaseClass):
+    """Archive of soft deleted order items"""
+    order_id = models.BigIntegerField(db_index=True)
+    item_type = models.CharField(max_length=255)
+    product_id = models.BigIntegerField(null=True)
+    item_price = models.DecimalField(max_digits=7, decimal_places=2, default=0)
+    quantity = models.IntegerField(default=1)
+    status = models.CharField(max_length=64)
+    delivery_date = models.DateTimeField()
+    delivered_on = models.DateTimeField(null=True, blank=True)
+    comments = models.TextField(max_length=512, default="", blank=True)
+    is_deleted = models.BooleanField(default=True)
+
+    class Meta:
+        db_table = "t_order_item_archive"
+        ordering = ("-archived_on",)
+
+    def __str__(self):
+        """string representation of archived order item"""
+        return f"{self.id}"
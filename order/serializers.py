@@ -1,9 +1,17 @@
+from collections import Counter, defaultdict
 from datetime import datetime
 
+from django.db import transaction
+from django.db.models import Max, Q, Sum
+
 from rest_framework import serializers
 
 from order import models
 from helpers import functions as f
+from core.serializers import ValuesReadSerializer
+from payments.balances import post_customer_balance, post_order_balance, move_order_balance
+from payments import revenue
+from products import stock
 
 
 def update_order(user, order):
@@ -13,11 +21,139 @@ def update_order(user, order):
     """
     order.updated_by = user.id
     order.updated_on = f.get_current_time()
-    order.save()
+    order.save(update_fields=["updated_by", "updated_on"])
+
+
+def update_orders(user, order_ids, updated_on):
+    """
+        Updates updated_by, updated_on columns of multiple orders in one query
+        Args: User, list of order ids, updated_on
+    """
+    models.Order.objects.filter(id__in=order_ids).update(updated_by=user.id,
+                                                         updated_on=updated_on)
+
+
+def check_products(user, products):
+    """raises validation error if a product does not belong to the business of the user"""
+    tenant_user_ids = f.get_tenant_user_ids(user)
+    product_ids = sorted({product.id for product in products
+                          if product and str(product.seller_id) not in tenant_user_ids})
+    if product_ids:
+        error = {
+            "message": "Products are not found",
+            "product_ids": product_ids
+        }
+        raise serializers.ValidationError(error, code="validation")
+
+
+def move_stock(reserved_before, reserved_after):
+    """moves stock of products between two reservations, raising validation error if short"""
+    try:
+        stock.move_stock(reserved_before, reserved_after)
+    except stock.InsufficientStock as e:
+        error = {
+            "message": "Products do not have enough units available",
+            "product_ids": e.product_ids
+        }
+        raise serializers.ValidationError(error, code="stock")
+
+
+def get_item_reservation(order_item, order_is_deleted=False):
+    """returns dict of product id to units held by an order item"""
+    if order_item.product_id is None or order_item.is_deleted or order_is_deleted:
+        return {}
+    return {order_item.product_id: order_item.quantity}
+
+
+def get_order_reservation(order):
+    """returns dict of product id to units held by live items of an order"""
+    rows = models.OrderItem.objects\
+        .filter(order=order, product__isnull=False)\
+        .order_by()\
+        .values("product_id")\
+        .annotate(quantity=Sum("quantity"))
+    return {row["product_id"]: row["quantity"] for row in rows}
+
+
+def create_order_items(user, order, items):
+    """creates items of a new order with one stock reservation and one bulk insert"""
+    check_products(user, [item.get("product") for item in items])
+    quantities = Counter()
+    for item in items:
+        if item.get("product"):
+            quantities[item["product"].id] += item.get("quantity", 1)
+    move_stock({}, quantities)
+    order_items = [
+        models.OrderItem(**item, order=order, created_by=user.id, updated_by=user.id,
+                         created_on=order.created_on, updated_on=order.updated_on,
+                         delivered_on=revenue.get_delivered_on(None, item.get("status"), None,
+                                                               order.created_on))
+        for item in items
+    ]
+    models.OrderItem.objects.bulk_create(order_items)
+    delivered = Counter()
+    for order_item in order_items:
+        delivered.update(revenue.get_delivered_days(order_item, order.is_deleted))
+    revenue.move_items_delivered(order.created_by, {}, delivered)
+
+
+def get_order_delivered_days(order):
+    """returns Counter of delivery days of live delivered items of an order"""
+    delivered = Counter()
+    order_items = models.OrderItem.objects\
+        .filter(order=order, delivered_on__isnull=False)\
+        .only("status", "delivered_on", "is_deleted")
+    for order_item in order_items:
+        delivered.update(revenue.get_delivered_days(order_item))
+    return delivered
+
+
+def post_restored_orders(order_ids):
+    """posts orders restored from the archive as live orders again
+        Their live items reserve stock and count as delivered again, and the orders go back
+        into customer balances and daily revenue. Payments of a deleted order stay posted to
+        its paid amount and the revenue, so they are not posted again.
+        Raises stock.InsufficientStock if the items cannot reserve their units.
+    """
+    orders = models.Order.objects\
+        .filter(id__in=order_ids)\
+        .annotate(last_payment_date=Max("payment__payment_date",
+                                        filter=Q(payment__is_deleted=False)))
+    for order in orders:
+        stock.move_stock({}, get_order_reservation(order))
+        revenue.move_items_delivered(order.created_by, {}, get_order_delivered_days(order))
+        post_order_balance(order)
+        post_customer_balance(order.customer_id, order.created_by,
+                              payment_date=order.last_payment_date)
+        revenue.post_order_revenue(order)
+
+
+def post_restored_order_items(order_item_ids):
+    """posts order items restored from the archive as live items again
+        Raises stock.InsufficientStock if the items cannot reserve their units.
+    """
+    reservation = Counter()
+    delivered = defaultdict(Counter)
+    order_items = models.OrderItem.objects\
+        .filter(id__in=order_item_ids)\
+        .select_related("order")
+    for order_item in order_items:
+        reservation.update(get_item_reservation(order_item, order_item.order.is_deleted))
+        delivered[order_item.order.created_by].update(
+            revenue.get_delivered_days(order_item, order_item.order.is_deleted))
+    stock.move_stock({}, reservation)
+    for created_by, delivered_days in delivered.items():
+        revenue.move_items_delivered(created_by, {}, delivered_days)
+
+
+# every order column except paid_amount, which is only changed with atomic updates
+UPDATABLE_ORDER_FIELDS = ("customer", "total_amount", "net_amount", "discount", "delivery_date",
+                          "order_status", "comments", "is_deleted", "is_one_time_delivery",
+                          "updated_on", "updated_by")
 
 
 class OrderSerializer(serializers.ModelSerializer):
-    """serializes order model objects"""
+    """serializes order model objects, items can be created along with a new order"""
     created_by = serializers.CharField(required=False)
     updated_by = serializers.CharField(required=False)
     delivery_date = serializers.CharField(required=False)
@@ -25,7 +161,15 @@ class OrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = models.Order
         fields = "__all__"
-        read_only_fields = ("id", "created_by", "updated_by", "updated_on", "created_on")
+        # paid amount is posted by payments
+        read_only_fields = ("id", "created_by", "updated_by", "updated_on", "created_on",
+                            "paid_amount")
+
+    def get_fields(self):
+        """returns fields with write only order items, created along with a new order"""
+        fields = super().get_fields()
+        fields["order_items"] = OrderItemSerializer(many=True, required=False, write_only=True)
+        return fields
 
     def create(self, validated_data):
         """Creates a new order object in db"""
@@ -35,18 +179,24 @@ class OrderSerializer(serializers.ModelSerializer):
             validated_data.pop("request_user")
         else:
             user = validated_data.pop("request_user")
+        order_items = validated_data.pop("order_items", [])
         validated_data["created_by"] = user.id
         validated_data["updated_by"] = user.id
         validated_data["is_one_time_delivery"] = True
-        order = models.Order.objects.create(**validated_data)
+        with transaction.atomic():
+            order = models.Order.objects.create(**validated_data)
+            if order_items:
+                create_order_items(user, order, order_items)
+            post_order_balance(order)
+            revenue.post_order_revenue(order)
         return order
 
     def update(self, instance, validated_data):
         """updates an order object with validated data"""
+        validated_data.pop("order_items", None)
         instance.customer = validated_data.get("'customer", instance.customer)
         instance.total_amount = validated_data.get("total_amount", instance.total_amount)
         instance.net_amount = validated_data.get("net_amount", instance.net_amount)
-        instance.paid_amount = validated_data.get("paid_amount", instance.paid_amount)
         instance.discount = validated_data.get("discount", instance.discount)
         instance.delivery_date = validated_data.get("delivery_date", instance.delivery_date)
         instance.order_status = validated_data.get("order_status", instance.order_status)
@@ -62,17 +212,39 @@ class OrderSerializer(serializers.ModelSerializer):
         else:
             user = validated_data.pop("request_user")
         instance.updated_by = user.id
-        instance.save()
+        with transaction.atomic():
+            # balance of the customer is moved from the locked row to the saved row
+            posted_order = models.Order.all_objects.select_for_update().get(pk=instance.pk)
+            instance.paid_amount = posted_order.paid_amount
+            # items of a deleted order give their stock back and leave the delivered counts,
+            # a restored order takes both again
+            if posted_order.is_deleted != instance.is_deleted:
+                reservation = get_order_reservation(instance)
+                move_stock({} if posted_order.is_deleted else reservation,
+                           {} if instance.is_deleted else reservation)
+                delivered = get_order_delivered_days(instance)
+                revenue.move_items_delivered(instance.created_by,
+                                             {} if posted_order.is_deleted else delivered,
+                                             {} if instance.is_deleted else delivered)
+            instance.save(update_fields=UPDATABLE_ORDER_FIELDS)
+            move_order_balance(posted_order, instance)
+            revenue.move_order_revenue(posted_order, instance)
         return instance
 
 
+class OrderReadSerializer(ValuesReadSerializer):
+    """fast read only serializer for order lists"""
+    serializer_class = OrderSerializer
+
+
 class OrderItemSerializer(serializers.ModelSerializer):
-    """serializes order item objects"""
+    """serializes order item objects, items of a product reserve its stock"""
     class Meta:
         model = models.OrderItem
         fields = "__all__"
         read_only_fields = ("id", "created_by", "updated_by", "created_on", "updated_on",
-                            "order")
+                            "order", "delivered_on")
+        extra_kwargs = {"quantity": {"min_value": 1}}
 
     def create(self, validated_data):
         """creates a new order item in db"""
@@ -87,8 +259,15 @@ class OrderItemSerializer(serializers.ModelSerializer):
         validated_data["created_by"] = request_user.id
         validated_data["updated_by"] = request_user.id
         validated_data["order"] = order
-        order_item = models.OrderItem.objects.create(**validated_data)
-        update_order(request_user, order)
+        validated_data["delivered_on"] = revenue.get_delivered_on(
+            None, validated_data.get("status"), None, f.get_current_time())
+        check_products(request_user, [validated_data.get("product")])
+        with transaction.atomic():
+            order_item = models.OrderItem.objects.create(**validated_data)
+            move_stock({}, get_item_reservation(order_item, order.is_deleted))
+            update_order(request_user, order)
+            revenue.move_items_delivered(order.created_by, {},
+                                         revenue.get_delivered_days(order_item, order.is_deleted))
 
         return order_item
 
@@ -101,8 +280,11 @@ class OrderItemSerializer(serializers.ModelSerializer):
         else:
             request_user = validated_data.pop("request_user")
 
+        if validated_data.get("product"):
+            check_products(request_user, [validated_data["product"]])
         instance.order = validated_data.get("order", instance.order)
         instance.item_type = validated_data.get("item_type", instance.item_type)
+        instance.product = validated_data.get("product", instance.product)
         instance.item_price = validated_data.get("item_price", instance.item_price)
         instance.quantity = validated_data.get("quantity", instance.quantity)
         instance.status = validated_data.get("status", instance.status)
@@ -111,7 +293,26 @@ class OrderItemSerializer(serializers.ModelSerializer):
         instance.is_deleted = validated_data.get("is_deleted", instance.is_deleted)
         instance.updated_by = request_user.id
         instance.updated_on = validated_data["updated_on"]
-        instance.save()
-        update_order(request_user, order)
+        with transaction.atomic():
+            # stock is moved from the reservation of the locked row to the saved row
+            posted_item = models.OrderItem.all_objects.select_for_update().get(pk=instance.pk)
+            instance.delivered_on = revenue.get_delivered_on(posted_item.status, instance.status,
+                                                             posted_item.delivered_on,
+                                                             instance.updated_on)
+            move_stock(get_item_reservation(posted_item, order.is_deleted),
+                       get_item_reservation(instance, order.is_deleted))
+            instance.save()
+            update_order(request_user, order)
+            # a deleted or undelivered item is reversed on the day it was counted
+            revenue.move_items_delivered(order.created_by,
+                                         revenue.get_delivered_days(posted_item, order.is_deleted),
+                                         revenue.get_delivered_days(instance, order.is_deleted))
 
         return instance
+
+
+class OrderItemStatusSerializer(serializers.Serializer):
+    """serializes bulk order item status transition payload"""
+    item_ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False,
+                                     max_length=500)
+    status = serializers.CharField(max_length=64)
@@ -1,3 +1,242 @@
+import csv
+from datetime import datetime, timedelta
+import io
+import json
+
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework.test import APIClient
+
+from account.models import Business
+from core.export import iterate_rows
+from order.models import Order, OrderItem
+from order.serializers import OrderSerializer
+from payments.models import DailyRevenue
+
+
+class OrderItemsStatusTest(TestCase):
+    """bulk status transitions of order items"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.business = Business.objects.create(name="tailors")
+        cls.tailor = get_user_model().objects.create_user("tailor", "password",
+                                                          business=cls.business)
+        cls.other_tailor = get_user_model().objects.create_user("other", "password")
+        cls.customer = get_user_model().objects.create_user("customer", "password")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.tailor)
+        self.last_update = timezone.now() - timedelta(days=1)
+
+    def create_order(self, creator, item_count):
+        """returns order of the creator with order items"""
+        order = Order.objects.create(customer=self.customer, created_by=creator.id,
+                                     updated_by=creator.id, created_on=self.last_update,
+                                     updated_on=self.last_update)
+        for i in range(item_count):
+            OrderItem.objects.create(order=order, item_type=f"shirt {i}",
+                                     delivery_date=self.last_update, created_by=creator.id,
+                                     updated_by=creator.id, created_on=self.last_update,
+                                     updated_on=self.last_update)
+        return order
+
+    def post(self, item_ids, item_status):
+        return self.client.post(reverse("order_items_status"),
+                                {"item_ids": item_ids, "status": item_status}, format="json")
+
+    def test_moves_items_of_many_orders(self):
+        first_order = self.create_order(self.tailor, 2)
+        second_order = self.create_order(self.tailor, 1)
+        item_ids = list(OrderItem.objects.order_by("id").values_list("id", flat=True))
+
+        response = self.post(item_ids, "Delivered")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(item["id"], item["status"]) for item in response.data],
+                         [(item_id, "Delivered") for item_id in item_ids])
+
+        for order_item in OrderItem.objects.all():
+            self.assertEqual(order_item.status, "Delivered")
+            self.assertIsNotNone(order_item.delivered_on)
+        for order in (first_order, second_order):
+            order.refresh_from_db()
+            self.assertGreater(order.updated_on, self.last_update)
+        revenue = DailyRevenue.objects.get(business=self.business)
+        self.assertEqual(revenue.items_delivered, 3)
+
+    def test_delivered_items_keep_their_delivery_day(self):
+        self.create_order(self.tailor, 2)
+        first_id, second_id = OrderItem.objects.order_by("id").values_list("id", flat=True)
+        self.post([first_id], "Delivered")
+        delivered_on = OrderItem.objects.get(id=first_id).delivered_on
+
+        self.post([first_id, second_id], "delivered")
+        self.assertEqual(OrderItem.objects.get(id=first_id).delivered_on, delivered_on)
+        self.assertEqual(DailyRevenue.objects.get().items_delivered, 2)
+
+        self.post([first_id, second_id], "In progress")
+        self.assertFalse(OrderItem.objects.filter(delivered_on__isnull=False).exists())
+        self.assertEqual(DailyRevenue.objects.get().items_delivered, 0)
+
+    def test_rejects_items_of_other_users(self):
+        self.create_order(self.tailor, 1)
+        self.create_order(self.other_tailor, 1)
+        own_id, other_id = OrderItem.objects.order_by("id").values_list("id", flat=True)
+
+        response = self.post([own_id, other_id], "Delivered")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.data["item_ids"], [other_id])
+        self.assertFalse(OrderItem.objects.filter(status="Delivered").exists())
+
+
+class OrderListFieldsTest(TestCase):
+    """sparse fieldsets of the order list"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tailor = get_user_model().objects.create_user("tailor", "password")
+        cls.customer = get_user_model().objects.create_user("customer", "password")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.tailor)
+        now = timezone.now()
+        for net_amount in ("100.50", "200"):
+            Order.objects.create(customer=self.customer, net_amount=net_amount,
+                                 total_amount=net_amount, delivery_date=now,
+                                 created_by=self.tailor.id, updated_by=self.tailor.id,
+                                 created_on=now, updated_on=now)
+
+    def test_rows_match_the_model_serializer(self):
+        response = self.client.get(reverse("orders"))
+        self.assertEqual(response.status_code, 200)
+        expected = OrderSerializer(Order.objects.all(), many=True).data
+        self.assertEqual(response.data, [dict(order) for order in expected])
+
+    def test_returns_requested_fields(self):
+        response = self.client.get(reverse("orders"), {"fields": "id, net_amount"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([set(order) for order in response.data], [{"id", "net_amount"}] * 2)
+        self.assertEqual(sorted(order["net_amount"] for order in response.data),
+                         ["100.50", "200.00"])
+
+    def test_rejects_unknown_fields(self):
+        response = self.client.get(reverse("orders"), {"fields": "id,password"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["message"], "Invalid fields: password")
+
+
+class OrderConditionalGetTest(TestCase):
+    """304 responses of order lists and details whose validators match"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tailor = get_user_model().objects.create_user("tailor", "password")
+        cls.customer = get_user_model().objects.create_user("customer", "password")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.tailor)
+        last_update = timezone.now() - timedelta(days=1)
+        self.order = Order.objects.create(customer=self.customer, created_by=self.tailor.id,
+                                          updated_by=self.tailor.id, created_on=last_update,
+                                          updated_on=last_update)
+
+    def test_list_is_not_modified_until_an_order_changes(self):
+        response = self.client.get(reverse("orders"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Cache-Control"], "private, no-cache")
+        etag = response["ETag"]
+
+        response = self.client.get(reverse("orders"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+        Order.objects.filter(id=self.order.id).update(updated_on=timezone.now())
+        response = self.client.get(reverse("orders"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_detail_honours_if_modified_since(self):
+        url = reverse("order_details", args=[self.order.id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        last_modified = response["Last-Modified"]
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+        # a matching date does not hide a changed etag
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified,
+                                   HTTP_IF_NONE_MATCH='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_etags_differ_between_fieldsets(self):
+        full = self.client.get(reverse("orders"))
+        sparse = self.client.get(reverse("orders"), {"fields": "id"})
+        self.assertNotEqual(full["ETag"], sparse["ETag"])
+        response = self.client.get(reverse("orders"), {"fields": "id"},
+                                   HTTP_IF_NONE_MATCH=full["ETag"])
+        self.assertEqual(response.status_code, 200)
+
+
+class OrderExportTest(TestCase):
+    """streamed csv and json lines exports of orders and order items"""
+
+    @classmethod
+    def setUpTestData(cls):
+        business = Business.objects.create(name="tailors")
+        cls.tailor = get_user_model().objects.create_user("tailor", "password",
+                                                          business=business)
+        cls.clerk = get_user_model().objects.create_user("clerk", "password",
+                                                         business=business)
+        cls.other_tailor = get_user_model().objects.create_user("other", "password")
+        cls.customer = get_user_model().objects.create_user("customer", "password")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.tailor)
+
+    def create_order(self, creator, created_on):
+        order = Order.objects.create(customer=self.customer, net_amount=100,
+                                     created_by=creator.id, updated_by=creator.id,
+                                     created_on=created_on, updated_on=created_on)
+        OrderItem.objects.create(order=order, item_type="shirt", delivery_date=created_on,
+                                 created_by=creator.id, updated_by=creator.id,
+                                 created_on=created_on, updated_on=created_on)
+        return order
+
+    def get_content(self, response):
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content).decode("utf-8")
+
+    def test_exports_orders_of_the_business(self):
+        first_day = timezone.make_aware(datetime(2026, 10, 1, 11))
+        own_order = self.create_order(self.tailor, first_day)
+        clerk_order = self.create_order(self.clerk, first_day + timedelta(days=1))
+        self.create_order(self.other_tailor, first_day)
+
+        response = self.client.get(reverse("orders_export"))
+        self.assertEqual(response["Content-Type"], "text/csv")
+        rows = list(csv.DictReader(io.StringIO(self.get_content(response))))
+        self.assertEqual([int(row["id"]) for row in rows], [own_order.id, clerk_order.id])
+        self.assertEqual(rows[0]["net_amount"], "100.00")
+
+        response = self.client.get(reverse("order_items_export"),
+                                   {"file_type": "jsonl", "from": "2026-10-02"})
+        rows = [json.loads(line) for line in self.get_content(response).splitlines()]
+        self.assertEqual([row["order_id"] for row in rows], [clerk_order.id])
+
+    def test_pages_through_every_row(self):
+        orders = [self.create_order(self.tailor, timezone.now()) for _ in range(5)]
+        rows = list(iterate_rows(Order.objects.all(), ("net_amount",), chunk_size=2))
+        self.assertEqual(len(rows), len(orders))
 
-# Create your tests here.
+    def test_rejects_invalid_parameters(self):
+        response = self.client.get(reverse("orders_export"), {"file_type": "xlsx"})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse("orders_export"), {"to": "19-10-2026"})
+        self.assertEqual(response.status_code, 400)
@@ -5,6 +5,9 @@ from order import views
 
 urlpatterns = [
     path("", views.OrderListCreateView.as_view(), name="orders"),
+    path("export/", views.OrderExportView.as_view(), name="orders_export"),
+    path("items/export/", views.OrderItemExportView.as_view(), name="order_items_export"),
+    path("items/status/", views.update_order_items_status, name="order_items_status"),
     path("<int:id>/", views.OrderDetailView.as_view(), name="order_details"),
     path("<int:order_id>/items/", views.OrderItemListCreateView.as_view(), name="order_items"),
     path("<int:order_id>/items/<int:order_item_id>/", views.OrderItemDetailView.as_view(),
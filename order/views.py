@@ -1,7 +1,11 @@
-from django.db.models import Q
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Case, DateTimeField, F, Q, Value, When
 from django.shortcuts import get_object_or_404
 
 from rest_framework.generics import ListCreateAPIView, RetrieveUpdateDestroyAPIView
+from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
@@ -9,6 +13,10 @@ from rest_framework import status
 from order.models import Order, OrderItem
 from order import serializers
 from helpers import functions as f
+from core.idempotency import idempotent
+from core import conditional
+from core.export import ExportView
+from payments import revenue
 
 
 class OrderListCreateView(ListCreateAPIView):
@@ -19,15 +27,23 @@ class OrderListCreateView(ListCreateAPIView):
     def get_queryset(self):
         """returns order list based on user type"""
         user = self.request.user
-        orders = Order.objects.filter(Q(created_by=user.id) | Q(updated_by=user.id), Q(is_deleted=False))
+        orders = Order.objects.filter(Q(created_by=user.id) | Q(updated_by=user.id))
         return orders
 
     def list(self, request, *args, **kwargs):
         """returns a list of orders"""
         queryset = self.get_queryset()
-        serializer = self.serializer_class(queryset, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        validators = conditional.get_list_validators(request, queryset)
+        not_modified = conditional.get_not_modified_response(request, *validators)
+        if not_modified:
+            return not_modified
 
+        fields = serializers.OrderReadSerializer.get_requested_fields(request)
+        serializer = serializers.OrderReadSerializer(queryset, fields=fields)
+        response = Response(serializer.data, status=status.HTTP_200_OK)
+        return conditional.add_validators(response, *validators)
+
+    @idempotent
     def create(self, request, *args, **kwargs):
         """Creates a new order in the DB"""
         serializer = self.serializer_class(data=request.data)
@@ -48,16 +64,21 @@ class OrderDetailView(RetrieveUpdateDestroyAPIView):
     def get_queryset(self):
         """returns an order queryset for current user"""
         user = self.request.user
-        orders = Order.objects.filter(Q(created_by=user.id) | Q(updated_by=user.id),
-                                      Q(is_deleted=False))
+        orders = Order.objects.filter(Q(created_by=user.id) | Q(updated_by=user.id))
         return orders
 
     def retrieve(self, request, *args, **kwargs):
         """returns an order"""
         queryset = self.get_queryset()
+        validators = conditional.get_detail_validators(request, queryset, kwargs["id"])
+        not_modified = conditional.get_not_modified_response(request, *validators)
+        if not_modified:
+            return not_modified
+
         order = get_object_or_404(queryset, pk=kwargs["id"])
         serializer = self.serializer_class(order)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        response = Response(serializer.data, status=status.HTTP_200_OK)
+        return conditional.add_validators(response, *validators)
 
     def update(self, request, *args, **kwargs):
         """updates an order in the db"""
@@ -96,19 +117,20 @@ class OrderItemListCreateView(ListCreateAPIView):
         order_id = self.kwargs["order_id"]
         user = self.request.user
         order_items = OrderItem.objects.filter(Q(created_by=user.id) | Q(updated_by=user.id),
-                                               Q(order_id=order_id), Q(is_deleted=False))
+                                               Q(order_id=order_id))
         return order_items
 
     def list(self, request, *args, **kwargs):
         """returns a list of order items specific to the order"""
-        get_object_or_404(Order, pk=kwargs["order_id"], is_deleted=False)
+        get_object_or_404(Order, pk=kwargs["order_id"])
         queryset = self.get_queryset()
         serializer = self.serializer_class(queryset, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @idempotent
     def create(self, request, *args, **kwargs):
         """creates a new order item for the specified order"""
-        order = get_object_or_404(Order, pk=kwargs["order_id"], is_deleted=False)
+        order = get_object_or_404(Order, pk=kwargs["order_id"])
         serializer = self.serializer_class(data=request.data)
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -131,13 +153,14 @@ class OrderItemDetailView(RetrieveUpdateDestroyAPIView):
     def get_queryset(self):
         """returns queryset of order items based on order id"""
         order_id = self.kwargs["order_id"]
+        user = self.request.user
         order_items = OrderItem.objects.filter(Q(created_by=user.id) | Q(updated_by=user.id),
-                                               Q(order_id=order_id), Q(is_deleted=False))
+                                               Q(order_id=order_id))
         return order_items
 
     def retrieve(self, request, *args, **kwargs):
         """retrieves order item with id"""
-        get_object_or_404(Order, pk=kwargs["order_id"], is_deleted=False)
+        get_object_or_404(Order, pk=kwargs["order_id"])
         queryset = self.get_queryset()
         order_item = get_object_or_404(queryset, pk=kwargs["order_item_id"])
         serializer = self.get_serializer(order_item)
@@ -145,7 +168,7 @@ class OrderItemDetailView(RetrieveUpdateDestroyAPIView):
 
     def update(self, request, *args, **kwargs):
         """updates an order item with id"""
-        get_object_or_404(Order, pk=kwargs["order_id"], is_deleted=False)
+        order = get_object_or_404(Order, pk=kwargs["order_id"])
         queryset = self.get_queryset()
         order_item = get_object_or_404(queryset, pk=kwargs["order_item_id"])
         serializer = self.serializer_class(order_item, data=request.data)
@@ -154,13 +177,14 @@ class OrderItemDetailView(RetrieveUpdateDestroyAPIView):
 
         serializer.save(
             request_user=request.user,
+            order=order,
             updated_on=f.get_current_time()
         )
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     def destroy(self, request, *args, **kwargs):
         """marks an order item is_deleted to Y"""
-        get_object_or_404(Order, pk=kwargs["order_id"], is_deleted=False)
+        order = get_object_or_404(Order, pk=kwargs["order_id"])
         queryset = self.get_queryset()
         order_item = get_object_or_404(queryset, pk=kwargs["order_item_id"])
         modified_order_item = self.serializer_class(order_item).data
@@ -171,6 +195,94 @@ class OrderItemDetailView(RetrieveUpdateDestroyAPIView):
 
         serializer.save(
             request_user=request.user,
+            order=order,
             updated_on=f.get_current_time()
         )
         return Response(serializer.data, status.HTTP_200_OK)
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def update_order_items_status(request):
+    """moves a list of order items to the given status with a single update"""
+    serializer = serializers.OrderItemStatusSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    user = request.user
+    item_ids = set(serializer.validated_data["item_ids"])
+    item_status = serializer.validated_data["status"]
+    now = f.get_current_time()
+    with transaction.atomic():
+        # rows are locked so that concurrent transitions count deliveries once
+        order_items = OrderItem.objects\
+            .select_for_update()\
+            .filter(Q(created_by=user.id) | Q(updated_by=user.id),
+                    Q(id__in=item_ids), Q(order__is_deleted=False))
+        owned_items = {}
+        newly_delivered_ids = []
+        delivered_before = defaultdict(Counter)
+        delivered_after = defaultdict(Counter)
+        for item_id, order_id, item_status_before, delivered_on, order_created_by in \
+                order_items.values_list("id", "order_id", "status", "delivered_on",
+                                        "order__created_by"):
+            owned_items[item_id] = order_id
+            order_item = OrderItem(status=item_status_before, delivered_on=delivered_on)
+            delivered_before[order_created_by].update(revenue.get_delivered_days(order_item))
+            order_item.delivered_on = revenue.get_delivered_on(item_status_before, item_status,
+                                                               delivered_on, now)
+            order_item.status = item_status
+            if order_item.delivered_on == now:
+                newly_delivered_ids.append(item_id)
+            delivered_after[order_created_by].update(revenue.get_delivered_days(order_item))
+        missing_ids = item_ids - owned_items.keys()
+        if missing_ids:
+            error = {
+                "message": "Order items are not found",
+                "item_ids": sorted(missing_ids)
+            }
+            return Response(error, status=status.HTTP_404_NOT_FOUND)
+
+        if revenue.is_delivered(item_status):
+            # items which were delivered already keep the day they became delivered
+            delivered_on = Case(When(id__in=newly_delivered_ids,
+                                     then=Value(now, output_field=DateTimeField())),
+                                default=F("delivered_on"))
+        else:
+            delivered_on = None
+        OrderItem.objects.filter(id__in=owned_items.keys()).update(status=item_status,
+                                                                   delivered_on=delivered_on,
+                                                                   updated_by=user.id,
+                                                                   updated_on=now)
+        serializers.update_orders(user, set(owned_items.values()), now)
+        for order_created_by in delivered_before.keys() | delivered_after.keys():
+            revenue.move_items_delivered(order_created_by, delivered_before[order_created_by],
+                                         delivered_after[order_created_by])
+
+    response_data = [
+        {
+            "id": item_id,
+            "order": order_id,
+            "status": item_status,
+            "updated_on": now
+        }
+        for item_id, order_id in sorted(owned_items.items())
+    ]
+    return Response(response_data, status=status.HTTP_200_OK)
+
+
+class OrderExportView(ExportView):
+    """streams orders of the business as csv or json lines"""
+    model = Order
+    columns = ("id", "customer_id", "total_amount", "net_amount", "paid_amount", "discount",
+               "delivery_date", "order_status", "comments", "is_one_time_delivery",
+               "created_on", "updated_on", "created_by", "updated_by")
+
+
+class OrderItemExportView(ExportView):
+    """streams order items of the business as csv or json lines"""
+    model = OrderItem
+    columns = ("id", "order_id", "item_type", "item_price", "quantity", "status",
+               "delivery_date", "comments", "created_on", "updated_on", "created_by",
+               "updated_by")
+    tenant_lookup = "order__"
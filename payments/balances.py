@@ -0,0 +1,66 @@
+from django.contrib.auth import get_user_model
+from django.db.models import DateTimeField, F, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from payments.models import CustomerBalance
+
+
+def get_business_id(user_id):
+    """returns business id of the user with id"""
+    return get_user_model().objects\
+        .filter(id=user_id)\
+        .values_list("business_id", flat=True)\
+        .first()
+
+
+def get_latest_date(column, date):
+    """returns expression of the later of column value and date"""
+    date = Value(date, output_field=DateTimeField())
+    return Greatest(Coalesce(F(column), date), date)
+
+
+def post_customer_balance(customer_id, created_by, billed=0, paid=0, order_date=None,
+                          payment_date=None):
+    """adds billed and paid amounts to the balance of customer with an atomic update
+        Args: customer_id, created_by (id of the user who created the order), billed=0,
+              paid=0, order_date=None, payment_date=None
+    """
+    if customer_id is None or (not billed and not paid and not order_date and not payment_date):
+        return
+
+    business_id = get_business_id(created_by)
+    balance, _ = CustomerBalance.objects.get_or_create(business_key=business_id or 0,
+                                                       customer_id=customer_id,
+                                                       defaults={"business_id": business_id})
+    changes = {
+        "total_billed": F("total_billed") + billed,
+        "total_paid": F("total_paid") + paid,
+        "outstanding": F("outstanding") + billed - paid,
+    }
+    if order_date:
+        changes["last_order_date"] = get_latest_date("last_order_date", order_date)
+    if payment_date:
+        changes["last_payment_date"] = get_latest_date("last_payment_date", payment_date)
+    CustomerBalance.objects.filter(id=balance.id).update(**changes)
+
+
+def post_order_balance(order, sign=1):
+    """adds (sign=1) or reverses (sign=-1) billed and paid amounts of a live order"""
+    if order.is_deleted:
+        return
+    post_customer_balance(order.customer_id, order.created_by, billed=sign * order.net_amount,
+                          paid=sign * order.paid_amount,
+                          order_date=order.created_on if sign > 0 else None)
+
+
+def move_order_balance(old_order, new_order):
+    """moves billed and paid amounts of an updated order between customer balances"""
+    if old_order.customer_id == new_order.customer_id and \
+            old_order.is_deleted == new_order.is_deleted:
+        if not new_order.is_deleted:
+            post_customer_balance(new_order.customer_id, new_order.created_by,
+                                  billed=new_order.net_amount - old_order.net_amount)
+        return
+
+    post_order_balance(old_order, sign=-1)
+    post_order_balance(new_order)
@@ -0,0 +1,121 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from decimal import Decimal
+import heapq
+
+from django.db.models import Q, Sum
+
+from rest_framework.exceptions import ValidationError
+
+from order.models import Order
+from payments.models import Payment
+from helpers import functions as f
+
+ORDER_ENTRY = 0
+PAYMENT_ENTRY = 1
+ENTRY_TYPES = {
+    ORDER_ENTRY: "order",
+    PAYMENT_ENTRY: "payment",
+}
+ENTRY_KINDS = {entry_type: entry_kind for entry_kind, entry_type in ENTRY_TYPES.items()}
+
+
+def encode_cursor(date, entry_kind, entry_id):
+    """returns an opaque cursor of the ledger entry"""
+    value = f"{date.isoformat()}|{entry_kind}|{entry_id}"
+    return urlsafe_b64encode(value.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    """returns date, entry kind and id of the cursor"""
+    try:
+        date, entry_kind, entry_id = urlsafe_b64decode(cursor.encode("ascii"))\
+            .decode("utf-8")\
+            .split("|")
+        return datetime.fromisoformat(date), int(entry_kind), int(entry_id)
+    except ValueError:
+        error = {
+            "message": "Cursor is invalid"
+        }
+        raise ValidationError(error, code="validation")
+
+
+def format_amount(amount):
+    """returns amount as a string with two decimal places"""
+    return f"{amount:.2f}"
+
+
+def get_customer_orders(user, customer_id):
+    """returns orders of the customer which belong to the business of user"""
+    user_ids = f.get_tenant_user_ids(user)
+    return Order.objects.filter(Q(created_by__in=user_ids) | Q(updated_by__in=user_ids),
+                                Q(customer_id=customer_id), Q(created_on__isnull=False))
+
+
+def get_customer_ledger(user, customer_id, cursor=None, limit=50):
+    """returns a page of customer ledger entries with running balance
+        Orders are debits of net_amount and payments are credits, in (date, type, id) order.
+        The opening balance of the page is summed in sql and the running balance is
+        computed in a single ordered pass over the page.
+    """
+    orders = get_customer_orders(user, customer_id)
+    payments = Payment.objects.filter(order__in=orders)
+    opening_balance = Decimal(0)
+    if cursor:
+        date, entry_kind, entry_id = decode_cursor(cursor)
+        if entry_kind == ORDER_ENTRY:
+            orders_before = Q(created_on__lt=date) | Q(created_on=date, id__lte=entry_id)
+            payments_before = Q(payment_date__lt=date)
+        else:
+            orders_before = Q(created_on__lte=date)
+            payments_before = Q(payment_date__lt=date) | Q(payment_date=date, id__lte=entry_id)
+
+        billed = orders.filter(orders_before).aggregate(total=Sum("net_amount"))["total"]
+        paid = payments.filter(payments_before).aggregate(total=Sum("paid_amount"))["total"]
+        opening_balance = (billed or 0) - (paid or 0)
+        orders = orders.exclude(orders_before)
+        payments = payments.exclude(payments_before)
+
+    order_rows = orders\
+        .order_by("created_on", "id")\
+        .values_list("created_on", "id", "id", "net_amount")[:limit + 1]
+    payment_rows = payments\
+        .order_by("payment_date", "id")\
+        .values_list("payment_date", "id", "order_id", "paid_amount")[:limit + 1]
+    rows = heapq.merge(
+        ((date, ORDER_ENTRY, entry_id, order_id, amount)
+         for date, entry_id, order_id, amount in order_rows),
+        ((date, PAYMENT_ENTRY, entry_id, order_id, amount)
+         for date, entry_id, order_id, amount in payment_rows),
+    )
+
+    entries = []
+    balance = opening_balance
+    next_cursor = None
+    for date, entry_kind, entry_id, order_id, amount in rows:
+        if len(entries) == limit:
+            last_entry = entries[-1]
+            next_cursor = encode_cursor(last_entry["date"], ENTRY_KINDS[last_entry["type"]],
+                                        last_entry["id"])
+            break
+
+        debit = amount if entry_kind == ORDER_ENTRY else Decimal(0)
+        credit = amount if entry_kind == PAYMENT_ENTRY else Decimal(0)
+        balance += debit - credit
+        entries.append({
+            "type": ENTRY_TYPES[entry_kind],
+            "id": entry_id,
+            "order": order_id,
+            "date": date,
+            "debit": format_amount(debit),
+            "credit": format_amount(credit),
+            "balance": format_amount(balance),
+        })
+
+    return {
+        "customer": customer_id,
+        "opening_balance": format_amount(opening_balance),
+        "closing_balance": format_amount(balance),
+        "entries": entries,
+        "next_cursor": next_cursor,
+    }
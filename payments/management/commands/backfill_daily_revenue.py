@@ -0,0 +1,112 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from order.models import Order, OrderItem
+from payments.models import DailyRevenue, Payment
+from payments.revenue import DELIVERED_STATUS, get_mode_column
+
+
+class Command(BaseCommand):
+    """recomputes daily revenue rollup from history in date chunks"""
+    help = "Recomputes t_daily_revenue from orders, order items and payments in date chunks"
+
+    def add_arguments(self, parser):
+        """adds command arguments"""
+        parser.add_argument("--from", dest="from_date", help="YYYY-MM-DD, first order by default")
+        parser.add_argument("--to", dest="to_date", help="YYYY-MM-DD, today by default")
+        parser.add_argument("--chunk-days", type=int, default=31)
+
+    def handle(self, *args, **options):
+        """replaces rollup rows of every chunk with recomputed rows"""
+        from_date = self.get_date(options["from_date"]) or self.get_first_date()
+        to_date = self.get_date(options["to_date"]) or timezone.localdate()
+        if from_date is None:
+            self.stdout.write("no orders to backfill")
+            return
+
+        self.business_ids = dict(get_user_model().objects
+                                 .filter(business__isnull=False)
+                                 .values_list("id", "business_id"))
+        chunk_start = from_date
+        while chunk_start <= to_date:
+            chunk_end = min(chunk_start + timedelta(days=options["chunk_days"] - 1), to_date)
+            count = self.backfill_chunk(chunk_start, chunk_end)
+            self.stdout.write(f"{chunk_start} - {chunk_end}: {count} rows")
+            chunk_start = chunk_end + timedelta(days=1)
+
+    @staticmethod
+    def get_date(value):
+        """returns parsed date or None"""
+        if not value:
+            return None
+        date = parse_date(value)
+        if date is None:
+            raise CommandError(f"Invalid date {value}. Expected format is YYYY-MM-DD")
+        return date
+
+    @staticmethod
+    def get_first_date():
+        """returns local date of the first order"""
+        first_created_on = Order.all_objects.aggregate(first=Min("created_on"))["first"]
+        return timezone.localdate(first_created_on) if first_created_on else None
+
+    def get_business_id(self, created_by):
+        """returns business id of the order creator"""
+        try:
+            return self.business_ids.get(int(created_by))
+        except (TypeError, ValueError):
+            return None
+
+    def backfill_chunk(self, start, end):
+        """recomputes rollup rows between start and end dates with grouped queries"""
+        revenues = defaultdict(lambda: defaultdict(Decimal))
+        orders = Order.objects\
+            .filter(created_on__date__range=(start, end))\
+            .annotate(day=TruncDate("created_on"))\
+            .order_by()\
+            .values("day", "created_by")\
+            .annotate(count=Count("id"), billed=Sum("net_amount"))
+        for row in orders:
+            revenue = revenues[(self.get_business_id(row["created_by"]), row["day"])]
+            revenue["orders_created"] += row["count"]
+            revenue["amount_billed"] += row["billed"]
+
+        # live delivered items count on the day they became delivered, as posted by updates
+        order_items = OrderItem.objects\
+            .filter(status__iexact=DELIVERED_STATUS, order__is_deleted=False,
+                    delivered_on__date__range=(start, end))\
+            .annotate(day=TruncDate("delivered_on"))\
+            .order_by()\
+            .values("day", "order__created_by")\
+            .annotate(count=Count("id"))
+        for row in order_items:
+            revenue = revenues[(self.get_business_id(row["order__created_by"]), row["day"])]
+            revenue["items_delivered"] += row["count"]
+
+        payments = Payment.objects\
+            .filter(payment_date__date__range=(start, end))\
+            .annotate(day=TruncDate("payment_date"))\
+            .order_by()\
+            .values("day", "order__created_by", "mode_of_payment")\
+            .annotate(amount=Sum("paid_amount"))
+        for row in payments:
+            revenue = revenues[(self.get_business_id(row["order__created_by"]), row["day"])]
+            revenue["amount_collected"] += row["amount"]
+            revenue[get_mode_column(row["mode_of_payment"])] += row["amount"]
+
+        rows = [DailyRevenue(business_id=business_id, business_key=business_id or 0, date=day,
+                             **values)
+                for (business_id, day), values in revenues.items()]
+        with transaction.atomic():
+            DailyRevenue.objects.filter(date__range=(start, end)).delete()
+            DailyRevenue.objects.bulk_create(rows)
+        return len(rows)
@@ -0,0 +1,106 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Q, Sum
+
+from order.models import Order
+from payments.models import CustomerBalance, Payment
+
+BALANCE_FIELDS = ("total_billed", "total_paid", "outstanding", "last_order_date",
+                  "last_payment_date")
+
+
+class Command(BaseCommand):
+    """recomputes customer balances from orders and payments"""
+    help = "Recomputes t_customer_balance from orders and payments, one business at a time"
+
+    def add_arguments(self, parser):
+        """adds command arguments"""
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        """upserts recomputed balances of every business and of customers of users without one"""
+        business_users = defaultdict(list)
+        for user_id, business_id in get_user_model().objects\
+                .filter(business__isnull=False)\
+                .values_list("id", "business_id"):
+            business_users[business_id].append(str(user_id))
+
+        count = 0
+        for business_id, user_ids in sorted(business_users.items()):
+            count += self.rebuild_balances(business_id, Q(created_by__in=user_ids),
+                                           options["batch_size"])
+        business_user_ids = [user_id for user_ids in business_users.values()
+                             for user_id in user_ids]
+        count += self.rebuild_balances(None, ~Q(created_by__in=business_user_ids),
+                                       options["batch_size"])
+        self.stdout.write(f"rebuilt {count} customer balances")
+
+    @staticmethod
+    def get_balances(creators):
+        """returns dict of customer id to balance fields summed from orders of the creators"""
+        balances = defaultdict(lambda: {
+            "total_billed": Decimal(0),
+            "total_paid": Decimal(0),
+            "last_order_date": None,
+            "last_payment_date": None,
+        })
+        orders = Order.objects\
+            .filter(creators, customer__isnull=False)\
+            .order_by()\
+            .values("customer_id")\
+            .annotate(billed=Sum("net_amount"), paid=Sum("paid_amount"),
+                      last_order_date=Max("created_on"))
+        for row in orders:
+            balance = balances[row["customer_id"]]
+            balance["total_billed"] = row["billed"]
+            balance["total_paid"] = row["paid"]
+            balance["last_order_date"] = row["last_order_date"]
+
+        payments = Payment.objects\
+            .filter(order__in=Order.objects.filter(creators, customer__isnull=False))\
+            .order_by()\
+            .values("order__customer_id")\
+            .annotate(last_payment_date=Max("payment_date"))
+        for row in payments:
+            balances[row["order__customer_id"]]["last_payment_date"] = row["last_payment_date"]
+        for balance in balances.values():
+            balance["outstanding"] = balance["total_billed"] - balance["total_paid"]
+        return balances
+
+    def rebuild_balances(self, business_id, creators, batch_size):
+        """writes recomputed balances of a business over its locked balance rows
+            Order and payment writes update the same rows with F expressions, so sums read
+            after the lock include every committed write, and writes waiting on the lock add
+            to the rebuilt values. Rows of customers without orders are reset, not deleted,
+            as a waiting write still updates them by id. Returns count of balances.
+        """
+        business_key = business_id or 0
+        with transaction.atomic():
+            existing = {balance.customer_id: balance for balance in CustomerBalance.objects
+                        .select_for_update()
+                        .filter(business_key=business_key)}
+            balances = self.get_balances(creators)
+
+            new_balances = []
+            for customer_id, fields in balances.items():
+                balance = existing.get(customer_id)
+                if balance is None:
+                    new_balances.append(CustomerBalance(business_id=business_id,
+                                                        business_key=business_key,
+                                                        customer_id=customer_id, **fields))
+                    continue
+                for field, value in fields.items():
+                    setattr(balance, field, value)
+            for customer_id, balance in existing.items():
+                if customer_id not in balances:
+                    balance.total_billed = balance.total_paid = balance.outstanding = 0
+                    balance.last_order_date = balance.last_payment_date = None
+
+            CustomerBalance.objects.bulk_update(list(existing.values()), BALANCE_FIELDS,
+                                                batch_size=batch_size)
+            CustomerBalance.objects.bulk_create(new_balances, batch_size=batch_size)
+        return len(balances)
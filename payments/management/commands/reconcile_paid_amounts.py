@@ -0,0 +1,65 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import DecimalField, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from order.models import Order
+from payments.models import Payment
+
+AMOUNT_FIELD = DecimalField(max_digits=9, decimal_places=2)
+
+
+def get_payments_total():
+    """returns expression of total live payments of an order for grouped queries"""
+    return Coalesce(Sum("payment__paid_amount", filter=Q(payment__is_deleted=False)),
+                    Value(Decimal(0)), output_field=AMOUNT_FIELD)
+
+
+def get_payments_total_subquery():
+    """returns correlated subquery of total live payments of the outer order"""
+    payments_total = Payment.objects\
+        .filter(order=OuterRef("pk"))\
+        .order_by()\
+        .values("order")\
+        .annotate(total=Sum("paid_amount"))\
+        .values("total")
+    return Coalesce(Subquery(payments_total, output_field=AMOUNT_FIELD), Value(Decimal(0)),
+                    output_field=AMOUNT_FIELD)
+
+
+class Command(BaseCommand):
+    """verifies paid amount of orders against their payments and repairs drift"""
+    help = "Verifies Order.paid_amount against payments with one grouped query and repairs drift"
+
+    def add_arguments(self, parser):
+        """adds command arguments"""
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        """repairs orders whose paid amount differs from their payments in batches"""
+        drifted_orders = Order.all_objects\
+            .order_by()\
+            .annotate(payments_total=get_payments_total())\
+            .exclude(paid_amount=F("payments_total"))\
+            .values_list("id", "paid_amount", "payments_total")
+        drifted_ids = []
+        for order_id, paid_amount, payments_total in drifted_orders:
+            self.stdout.write(f"order {order_id}: paid amount {paid_amount}, "
+                              f"payments {payments_total}")
+            drifted_ids.append(order_id)
+
+        if options["dry_run"]:
+            self.stdout.write(f"{len(drifted_ids)} orders have drifted")
+            return
+
+        batch_size = options["batch_size"]
+        for start in range(0, len(drifted_ids), batch_size):
+            # amounts are recomputed in the update so payments posted meanwhile are kept
+            with transaction.atomic():
+                Order.all_objects\
+                    .filter(id__in=drifted_ids[start:start + batch_size])\
+                    .update(paid_amount=get_payments_total_subquery())
+        self.stdout.write(f"{len(drifted_ids)} orders are repaired")
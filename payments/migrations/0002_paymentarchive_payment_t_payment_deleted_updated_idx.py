@@ -0,0 +1,38 @@
+# Generated by Django 4.0 on 2026-10-19 13:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentArchive',
+            fields=[
+                ('created_on', models.DateTimeField(blank=True, null=True)),
+                ('updated_on', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.CharField(blank=True, max_length=255, null=True)),
+                ('updated_by', models.CharField(blank=True, max_length=255, null=True)),
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('archived_on', models.DateTimeField()),
+                ('order_id', models.BigIntegerField(db_index=True)),
+                ('paid_amount', models.DecimalField(decimal_places=2, default=0, max_digits=9)),
+                ('payment_date', models.DateTimeField()),
+                ('mode_of_payment', models.CharField(max_length=50)),
+                ('comments', models.TextField(blank=True, default='', max_length=200)),
+                ('is_deleted', models.BooleanField(default=True)),
+            ],
+            options={
+                'db_table': 't_payment_archive',
+                'ordering': ('-archived_on',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['is_deleted', 'updated_on'], name='t_payment_deleted_updated_idx'),
+        ),
+    ]
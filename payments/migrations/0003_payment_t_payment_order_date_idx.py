@@ -0,0 +1,17 @@
+# Generated by Django 4.0 on 2026-10-19 13:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0002_paymentarchive_payment_t_payment_deleted_updated_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['order', 'payment_date'], name='t_payment_order_date_idx'),
+        ),
+    ]
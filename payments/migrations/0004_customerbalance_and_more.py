@@ -0,0 +1,44 @@
+# Generated by Django 4.0 on 2026-10-19 13:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0018_rename_updated_date_userbusinessrelation_updated_on'),
+        ('payments', '0003_payment_t_payment_order_date_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_billed', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('total_paid', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('outstanding', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('last_order_date', models.DateTimeField(blank=True, null=True)),
+                ('last_payment_date', models.DateTimeField(blank=True, null=True)),
+                ('business', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='customer_balances', to='account.business')),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balances', to='account.user')),
+            ],
+            options={
+                'db_table': 't_customer_balance',
+                'ordering': ('-outstanding',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='customerbalance',
+            index=models.Index(fields=['business', 'outstanding'], name='t_balance_outstanding_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customerbalance',
+            index=models.Index(fields=['business', 'last_payment_date'], name='t_balance_last_payment_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='customerbalance',
+            constraint=models.UniqueConstraint(fields=('business', 'customer'), name='t_customer_balance_unique'),
+        ),
+    ]
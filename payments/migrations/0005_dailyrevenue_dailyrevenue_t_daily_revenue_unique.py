@@ -0,0 +1,39 @@
+# Generated by Django 4.0 on 2026-10-19 13:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0018_rename_updated_date_userbusinessrelation_updated_on'),
+        ('payments', '0004_customerbalance_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('orders_created', models.IntegerField(default=0)),
+                ('items_delivered', models.IntegerField(default=0)),
+                ('amount_billed', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('amount_collected', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('collected_cash', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('collected_card', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('collected_upi', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('collected_other', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('business', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_revenues', to='account.business')),
+            ],
+            options={
+                'db_table': 't_daily_revenue',
+                'ordering': ('-date',),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailyrevenue',
+            constraint=models.UniqueConstraint(fields=('business', 'date'), name='t_daily_revenue_unique'),
+        ),
+    ]
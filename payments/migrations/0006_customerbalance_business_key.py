@@ -0,0 +1,53 @@
+# Generated by Django 4.0 on 2026-10-19 14:12
+
+from django.db import migrations, models
+from django.db.models import Count, F
+
+
+def set_business_key(apps, schema_editor):
+    """sets business keys and merges balances which repeat a customer without a business"""
+    CustomerBalance = apps.get_model("payments", "CustomerBalance")
+    CustomerBalance.objects.filter(business__isnull=False).update(business_key=F("business_id"))
+    repeated = CustomerBalance.objects\
+        .filter(business__isnull=True)\
+        .values("customer_id")\
+        .annotate(count=Count("id"))\
+        .filter(count__gt=1)
+    for row in repeated:
+        balances = list(CustomerBalance.objects
+                        .filter(business__isnull=True, customer_id=row["customer_id"])
+                        .order_by("id"))
+        kept = balances[0]
+        for balance in balances[1:]:
+            kept.total_billed += balance.total_billed
+            kept.total_paid += balance.total_paid
+            kept.outstanding += balance.outstanding
+            for field in ("last_order_date", "last_payment_date"):
+                setattr(kept, field, max(filter(None, (getattr(kept, field),
+                                                       getattr(balance, field))), default=None))
+        kept.save()
+        CustomerBalance.objects.filter(id__in=[balance.id for balance in balances[1:]]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0005_dailyrevenue_dailyrevenue_t_daily_revenue_unique'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='customerbalance',
+            name='t_customer_balance_unique',
+        ),
+        migrations.AddField(
+            model_name='customerbalance',
+            name='business_key',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(set_business_key, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='customerbalance',
+            constraint=models.UniqueConstraint(fields=('business_key', 'customer'), name='t_customer_balance_unique'),
+        ),
+    ]
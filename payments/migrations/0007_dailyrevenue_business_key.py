@@ -0,0 +1,52 @@
+# Generated by Django 4.0 on 2026-10-19 14:13
+
+from django.db import migrations, models
+from django.db.models import Count, F
+
+SUMMED_FIELDS = ("orders_created", "items_delivered", "amount_billed", "amount_collected",
+                 "collected_cash", "collected_card", "collected_upi", "collected_other")
+
+
+def set_business_key(apps, schema_editor):
+    """sets business keys and merges rollup rows which repeat a day without a business"""
+    DailyRevenue = apps.get_model("payments", "DailyRevenue")
+    DailyRevenue.objects.filter(business__isnull=False).update(business_key=F("business_id"))
+    repeated = DailyRevenue.objects\
+        .filter(business__isnull=True)\
+        .values("date")\
+        .annotate(count=Count("id"))\
+        .filter(count__gt=1)
+    for row in repeated:
+        revenues = list(DailyRevenue.objects
+                        .filter(business__isnull=True, date=row["date"])
+                        .order_by("id"))
+        kept = revenues[0]
+        for revenue in revenues[1:]:
+            for field in SUMMED_FIELDS:
+                setattr(kept, field, getattr(kept, field) + getattr(revenue, field))
+        kept.save()
+        DailyRevenue.objects.filter(id__in=[revenue.id for revenue in revenues[1:]]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0006_customerbalance_business_key'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='dailyrevenue',
+            name='t_daily_revenue_unique',
+        ),
+        migrations.AddField(
+            model_name='dailyrevenue',
+            name='business_key',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(set_business_key, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='dailyrevenue',
+            constraint=models.UniqueConstraint(fields=('business_key', 'date'), name='t_daily_revenue_unique'),
+        ),
+    ]
@@ -1,7 +1,9 @@
 from django.db import models
+from django.conf import settings
 
 from order.models import Order
-from core.models import CustomBaseClass
+from account.models import Business
+from core.models import CustomBaseClass, ArchiveBaseClass, SoftDeleteManager
 
 
 class Payment(CustomBaseClass):
@@ -14,10 +16,96 @@ class Payment(CustomBaseClass):
     comments = models.TextField(max_length=200, default="", blank=True)
     is_deleted = models.BooleanField(default=False)
 
+    objects = SoftDeleteManager()
+    all_objects = models.Manager()
+
     class Meta:
         db_table = "t_payment"
         ordering = ("-payment_date",)
+        indexes = [
+            models.Index(fields=["is_deleted", "updated_on"], name="t_payment_deleted_updated_idx"),
+            models.Index(fields=["order", "payment_date"], name="t_payment_order_date_idx"),
+        ]
 
     def __str__(self):
         """string representation of payment"""
         return f"{self.order} - {self.paid_amount}"
+
+
+class PaymentArchive(ArchiveBaseClass):
+    """Archive of soft deleted payments"""
+    order_id = models.BigIntegerField(db_index=True)
+    paid_amount = models.DecimalField(max_digits=9, decimal_places=2, default=0)
+    payment_date = models.DateTimeField()
+    mode_of_payment = models.CharField(max_length=50)
+    comments = models.TextField(max_length=200, default="", blank=True)
+    is_deleted = models.BooleanField(default=True)
+
+    class Meta:
+        db_table = "t_payment_archive"
+        ordering = ("-archived_on",)
+
+    def __str__(self):
+        """string representation of archived payment"""
+        return f"{self.id}"
+
+
+class CustomerBalance(models.Model):
+    """dues of a customer with a business, maintained incrementally by order and payment writes"""
+    business = models.ForeignKey(Business, on_delete=models.CASCADE, null=True,
+                                 related_name="customer_balances")
+    customer = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+                                 related_name="balances")
+    # business id or 0, unique keys of mysql let rows with a null business repeat
+    business_key = models.BigIntegerField(default=0)
+    total_billed = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_paid = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    outstanding = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    last_order_date = models.DateTimeField(null=True, blank=True)
+    last_payment_date = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "t_customer_balance"
+        ordering = ("-outstanding",)
+        constraints = [
+            models.UniqueConstraint(fields=["business_key", "customer"],
+                                    name="t_customer_balance_unique"),
+        ]
+        indexes = [
+            models.Index(fields=["business", "outstanding"], name="t_balance_outstanding_idx"),
+            models.Index(fields=["business", "last_payment_date"],
+                         name="t_balance_last_payment_idx"),
+        ]
+
+    def __str__(self):
+        """string representation of customer balance"""
+        return f"{self.customer} - {self.outstanding}"
+
+
+class DailyRevenue(models.Model):
+    """revenue of a business per day, maintained incrementally by order and payment writes"""
+    business = models.ForeignKey(Business, on_delete=models.CASCADE, null=True,
+                                 related_name="daily_revenues")
+    # business id or 0, unique keys of mysql let rows with a null business repeat
+    business_key = models.BigIntegerField(default=0)
+    date = models.DateField()
+    orders_created = models.IntegerField(default=0)
+    items_delivered = models.IntegerField(default=0)
+    amount_billed = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    amount_collected = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    collected_cash = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    collected_card = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    collected_upi = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    collected_other = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        db_table = "t_daily_revenue"
+        ordering = ("-date",)
+        constraints = [
+            models.UniqueConstraint(fields=["business_key", "date"],
+                                    name="t_daily_revenue_unique"),
+        ]
+
+    def __str__(self):
+        """string representation of daily revenue"""
+        return f"{self.business_id} - {self.date}"
@@ -0,0 +1,124 @@
+from collections import Counter
+
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from payments.models import DailyRevenue
+from payments.balances import get_business_id
+
+DELIVERED_STATUS = "delivered"
+MODE_COLUMNS = {
+    "cash": "collected_cash",
+    "card": "collected_card",
+    "upi": "collected_upi",
+}
+
+
+def get_mode_column(mode_of_payment):
+    """returns rollup column of the mode of payment"""
+    return MODE_COLUMNS.get((mode_of_payment or "").strip().lower(), "collected_other")
+
+
+def get_local_date(value):
+    """returns local date of a datetime or an iso formatted datetime string"""
+    if isinstance(value, str):
+        value = parse_datetime(value)
+    if value is None:
+        return None
+    return timezone.localdate(value) if timezone.is_aware(value) else value.date()
+
+
+def is_delivered(status):
+    """returns True if order item status is delivered"""
+    return (status or "").strip().lower() == DELIVERED_STATUS
+
+
+def post_daily_revenue(business_id, date, orders=0, items=0, billed=0, collected=0,
+                       mode_of_payment=None):
+    """adds counts and amounts to the revenue of the business on date with an atomic update"""
+    if date is None or not (orders or items or billed or collected):
+        return
+
+    revenue, _ = DailyRevenue.objects.get_or_create(business_key=business_id or 0, date=date,
+                                                    defaults={"business_id": business_id})
+    changes = {
+        "orders_created": F("orders_created") + orders,
+        "items_delivered": F("items_delivered") + items,
+        "amount_billed": F("amount_billed") + billed,
+    }
+    if collected:
+        mode_column = get_mode_column(mode_of_payment)
+        changes["amount_collected"] = F("amount_collected") + collected
+        changes[mode_column] = F(mode_column) + collected
+    DailyRevenue.objects.filter(id=revenue.id).update(**changes)
+
+
+def post_order_revenue(order, sign=1):
+    """adds (sign=1) or reverses (sign=-1) a live order on the day it was created"""
+    if order.is_deleted:
+        return
+    post_daily_revenue(get_business_id(order.created_by), get_local_date(order.created_on),
+                       orders=sign, billed=sign * order.net_amount)
+
+
+def move_order_revenue(old_order, new_order):
+    """moves revenue of an updated order when its amount or deleted flag changes"""
+    if old_order.net_amount == new_order.net_amount and \
+            old_order.is_deleted == new_order.is_deleted:
+        return
+    post_order_revenue(old_order, sign=-1)
+    post_order_revenue(new_order)
+
+
+def post_payment_revenue(payment, sign=1):
+    """adds (sign=1) or reverses (sign=-1) a live payment on its payment day"""
+    if payment.is_deleted:
+        return
+    post_daily_revenue(get_business_id(payment.order.created_by),
+                       get_local_date(payment.payment_date),
+                       collected=sign * payment.paid_amount,
+                       mode_of_payment=payment.mode_of_payment)
+
+
+def move_payment_revenue(old_payment, new_payment):
+    """moves revenue of an updated payment when its amount, day, mode or flags change"""
+    revenue_fields = ("order_id", "paid_amount", "payment_date", "mode_of_payment", "is_deleted")
+    if all(getattr(old_payment, field) == getattr(new_payment, field)
+           for field in revenue_fields):
+        return
+    post_payment_revenue(old_payment, sign=-1)
+    post_payment_revenue(new_payment)
+
+
+def get_delivered_on(old_status, new_status, delivered_on, now):
+    """returns delivered_on of an item moved between statuses
+        It is set when the item becomes delivered and cleared when it stops being delivered.
+    """
+    if not is_delivered(new_status):
+        return None
+    return delivered_on if is_delivered(old_status) and delivered_on else now
+
+
+def get_delivered_days(order_item, order_is_deleted=False):
+    """returns Counter of local delivery day of a live delivered order item
+        A delivered item counts once in the rollup, on the day it became delivered.
+    """
+    if order_item.is_deleted or order_is_deleted or not is_delivered(order_item.status) or \
+            not order_item.delivered_on:
+        return Counter()
+    return Counter({get_local_date(order_item.delivered_on): 1})
+
+
+def move_items_delivered(order_created_by, delivered_before, delivered_after):
+    """posts the difference of two Counters of delivery days to the rollup of the business
+        Deleted and undelivered items are reversed on the day they were counted.
+    """
+    changes = Counter(delivered_after)
+    changes.subtract(delivered_before)
+    changes = {date: count for date, count in changes.items() if count}
+    if not changes:
+        return
+    business_id = get_business_id(order_created_by)
+    for date, count in changes.items():
+        post_daily_revenue(business_id, date, items=count)
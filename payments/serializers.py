@@ -1,7 +1,100 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Value, When
+
 from rest_framework import serializers
 
-from payments.models import Payment
+from order.models import Order
+from payments.models import Payment, CustomerBalance
+from payments.balances import get_business_id, post_customer_balance
+from payments.revenue import post_payment_revenue, move_payment_revenue, get_local_date, \
+    post_daily_revenue
 from helpers import functions as f
+from core.serializers import ValuesReadSerializer
+
+
+def post_paid_amount(order_id, amount, payment_date=None, updated_by=None):
+    """adds amount to paid amount of the order and balance of its customer with atomic updates
+        Args: order_id, amount (negative amount reverses a payment), payment_date=None,
+              updated_by=None (id of the user who posted the payment)
+        updated_on of the order is moved too, so its etag changes with the paid amount.
+    """
+    if not amount:
+        return
+
+    fields = {"paid_amount": F("paid_amount") + amount, "updated_on": f.get_current_time()}
+    if updated_by is not None:
+        fields["updated_by"] = updated_by
+    Order.all_objects.filter(id=order_id).update(**fields)
+    # order row is locked by the update, so its customer cannot change until commit
+    order = Order.all_objects\
+        .filter(id=order_id)\
+        .values("customer_id", "created_by", "is_deleted")\
+        .first()
+    if order and not order["is_deleted"]:
+        post_customer_balance(order["customer_id"], order["created_by"], paid=amount,
+                              payment_date=payment_date)
+
+
+def post_bulk_payments(payments, orders, updated_by, batch_size=1000):
+    """adds amounts of new payments to orders, customer balances and daily revenue
+        in grouped writes
+        Args: payments, orders (dict of order id to values with customer_id and created_by),
+              updated_by (id of the user who posted the payments), batch_size=1000
+    """
+    now = f.get_current_time()
+    order_amounts = defaultdict(Decimal)
+    for payment in payments:
+        order_amounts[payment.order_id] += payment.paid_amount
+    order_ids = sorted(order_amounts)
+    for i in range(0, len(order_ids), batch_size):
+        batch_ids = order_ids[i:i + batch_size]
+        paid_amount = Case(*[When(id=order_id, then=Value(order_amounts[order_id]))
+                             for order_id in batch_ids],
+                           output_field=DecimalField(max_digits=9, decimal_places=2))
+        Order.all_objects.filter(id__in=batch_ids)\
+            .update(paid_amount=F("paid_amount") + paid_amount, updated_on=now,
+                    updated_by=updated_by)
+
+    customer_amounts = defaultdict(Decimal)
+    customer_dates = {}
+    revenues = defaultdict(Decimal)
+    business_ids = {}
+    for payment in payments:
+        order = orders[payment.order_id]
+        customer_key = (order["customer_id"], order["created_by"])
+        customer_amounts[customer_key] += payment.paid_amount
+        customer_dates[customer_key] = max(customer_dates.get(customer_key, payment.payment_date),
+                                           payment.payment_date)
+        if order["created_by"] not in business_ids:
+            business_ids[order["created_by"]] = get_business_id(order["created_by"])
+        revenue_key = (business_ids[order["created_by"]], get_local_date(payment.payment_date),
+                       payment.mode_of_payment)
+        revenues[revenue_key] += payment.paid_amount
+
+    for (customer_id, created_by), amount in customer_amounts.items():
+        post_customer_balance(customer_id, created_by, paid=amount,
+                              payment_date=customer_dates[(customer_id, created_by)])
+    for (business_id, date, mode_of_payment), amount in revenues.items():
+        post_daily_revenue(business_id, date, collected=amount, mode_of_payment=mode_of_payment)
+
+
+def post_restored_payments(payment_ids):
+    """posts payments restored from the archive as live payments again"""
+    payments = Payment.objects\
+        .filter(id__in=payment_ids)\
+        .select_related("order")
+    for payment in payments:
+        post_paid_amount(payment.order_id, payment.paid_amount, payment.payment_date)
+        post_payment_revenue(payment)
+
+
+def get_posted_amount(payment):
+    """returns amount of the payment which is posted to its order"""
+    return 0 if payment.is_deleted else payment.paid_amount
 
 
 class PaymentSerializer(serializers.ModelSerializer):
@@ -21,12 +114,31 @@ class PaymentSerializer(serializers.ModelSerializer):
             validated_data["payment_date"] = f.get_current_time()
         validated_data["created_by"] = request_user.id
         validated_data["updated_by"] = request_user.id
-        payment = Payment.objects.create(**validated_data)
+        with transaction.atomic():
+            payment = Payment.objects.create(**validated_data)
+            post_paid_amount(payment.order_id, get_posted_amount(payment), payment.payment_date,
+                             request_user.id)
+            post_payment_revenue(payment)
         return payment
 
     def update(self, instance, validated_data):
         """updates a payment with validated data"""
         request_user = validated_data.pop("request_user")
+        with transaction.atomic():
+            # changes are applied on the locked row so concurrent updates never post stale amounts
+            posted_payment = Payment.all_objects.select_for_update().get(pk=instance.pk)
+            for field in Payment._meta.concrete_fields:
+                setattr(instance, field.attname, getattr(posted_payment, field.attname))
+            self.update_instance(instance, validated_data, request_user)
+            post_paid_amount(posted_payment.order_id, -get_posted_amount(posted_payment),
+                             updated_by=request_user.id)
+            post_paid_amount(instance.order_id, get_posted_amount(instance),
+                             instance.payment_date, request_user.id)
+            move_payment_revenue(posted_payment, instance)
+        return instance
+
+    def update_instance(self, instance, validated_data, request_user):
+        """updates a payment instance with validated data"""
         instance.order = validated_data.get("order", instance.order)
         instance.paid_amount = validated_data.get("paid_amount", instance.paid_amount)
         instance.payment_date = validated_data.get("payment_date", instance.payment_date)
@@ -36,4 +148,112 @@ class PaymentSerializer(serializers.ModelSerializer):
         instance.updated_by = request_user.id
         instance.updated_on = validated_data["updated_on"]
         instance.save()
-        return instance
+
+
+class PaymentReadSerializer(ValuesReadSerializer):
+    """fast read only serializer for payment lists"""
+    serializer_class = PaymentSerializer
+
+
+class CustomerBalanceSerializer(serializers.ModelSerializer):
+    """serializes customer balance objects"""
+    customer_name = serializers.CharField(source="customer.username", read_only=True)
+
+    class Meta:
+        model = CustomerBalance
+        fields = ("customer", "customer_name", "total_billed", "total_paid", "outstanding",
+                  "last_order_date", "last_payment_date")
+        read_only_fields = fields
+
+
+class RevenueSerializer(serializers.Serializer):
+    """serializes revenue totals of a day, week or month"""
+    total_fields = ("orders_created", "items_delivered", "amount_billed", "amount_collected",
+                    "collected_cash", "collected_card", "collected_upi", "collected_other")
+
+    period = serializers.DateField(read_only=True)
+    orders_created = serializers.IntegerField(source="total_orders_created", read_only=True)
+    items_delivered = serializers.IntegerField(source="total_items_delivered", read_only=True)
+    amount_billed = serializers.DecimalField(max_digits=14, decimal_places=2,
+                                             source="total_amount_billed", read_only=True)
+    amount_collected = serializers.DecimalField(max_digits=14, decimal_places=2,
+                                                source="total_amount_collected", read_only=True)
+    collected_cash = serializers.DecimalField(max_digits=14, decimal_places=2,
+                                              source="total_collected_cash", read_only=True)
+    collected_card = serializers.DecimalField(max_digits=14, decimal_places=2,
+                                              source="total_collected_card", read_only=True)
+    collected_upi = serializers.DecimalField(max_digits=14, decimal_places=2,
+                                             source="total_collected_upi", read_only=True)
+    collected_other = serializers.DecimalField(max_digits=14, decimal_places=2,
+                                               source="total_collected_other", read_only=True)
+
+
+class PaymentAllocationSerializer(serializers.Serializer):
+    """allocates one amount of a customer across open orders as payments"""
+    customer = serializers.PrimaryKeyRelatedField(queryset=get_user_model().objects.all())
+    amount = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=Decimal("0.01"))
+    order_ids = serializers.ListField(child=serializers.IntegerField(), required=False,
+                                      allow_empty=False, max_length=500)
+    payment_date = serializers.DateTimeField(required=False)
+    mode_of_payment = serializers.CharField(max_length=50, required=False, default="cash")
+    comments = serializers.CharField(max_length=200, required=False, allow_blank=True,
+                                     default="")
+
+    def validate_order_ids(self, order_ids):
+        """returns order ids without duplicates in the requested order"""
+        return list(dict.fromkeys(order_ids))
+
+    def get_open_orders(self, request_user, customer, order_ids):
+        """returns locked open orders of the customer, oldest first or in the requested order"""
+        orders = Order.objects\
+            .filter(customer=customer, created_by__in=f.get_tenant_user_ids(request_user),
+                    paid_amount__lt=F("net_amount"))\
+            .annotate(due=F("net_amount") - F("paid_amount"))\
+            .select_for_update()\
+            .order_by("created_on", "id")
+        if order_ids is not None:
+            orders = orders.filter(id__in=order_ids)
+        orders = list(orders.values("id", "customer_id", "created_by", "due"))
+        if order_ids is not None:
+            if len(orders) != len(order_ids):
+                raise serializers.ValidationError({
+                    "order_ids": ["Orders must be open orders of the customer"]
+                })
+            positions = {order_id: position for position, order_id in enumerate(order_ids)}
+            orders.sort(key=lambda order: positions[order["id"]])
+        return orders
+
+    def create(self, validated_data):
+        """creates payments of the amount across open orders in one transaction"""
+        request_user = validated_data.pop("request_user")
+        payment_date = validated_data.get("payment_date") or f.get_current_time()
+        remaining = validated_data["amount"]
+        payments = []
+        with transaction.atomic():
+            orders = self.get_open_orders(request_user, validated_data["customer"],
+                                          validated_data.get("order_ids"))
+            for order in orders:
+                if not remaining:
+                    break
+                paid_amount = min(order["due"], remaining)
+                remaining -= paid_amount
+                payments.append(Payment(
+                    order_id=order["id"],
+                    paid_amount=paid_amount,
+                    payment_date=payment_date,
+                    mode_of_payment=validated_data["mode_of_payment"],
+                    comments=validated_data["comments"],
+                    created_by=request_user.id,
+                    updated_by=request_user.id,
+                    created_on=validated_data["created_on"],
+                    updated_on=validated_data["updated_on"],
+                ))
+            if remaining:
+                raise serializers.ValidationError({
+                    "amount": [f"Amount is more than the dues of the orders by {remaining}"]
+                })
+
+            Payment.objects.bulk_create(payments)
+            post_bulk_payments(payments, {order["id"]: order for order in orders},
+                               request_user.id)
+        return payments
@@ -0,0 +1,230 @@
+import csv
+import io
+import re
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from order.models import Order
+from payments.models import Payment
+from payments.revenue import get_local_date
+from payments.serializers import post_bulk_payments
+from helpers import functions as f
+
+DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d/%m/%y", "%d-%b-%Y", "%d %b %Y")
+LOOKUP_BATCH_SIZE = 1000
+
+
+class StatementLine:
+    """a credit line of a payment statement"""
+
+    def __init__(self, line_number, payment_date, amount, reference, mode_of_payment):
+        self.line_number = line_number
+        self.payment_date = payment_date
+        self.amount = amount
+        self.reference = reference
+        self.mode_of_payment = mode_of_payment
+        self.reference_ids = get_reference_ids(reference)
+
+
+def get_reference_ids(reference):
+    """returns ids of orders referenced with the order prefix, like ORD-123 or ord 123
+        UPI references, phone numbers, dates and amounts in a narration are not order ids.
+    """
+    prefix = re.escape(settings.PAYMENT_REFERENCE_PREFIX)
+    pattern = rf"(?<![a-z0-9]){prefix}[-/# ]?(\d{{1,18}})(?!\d)"
+    return {int(value) for value in re.findall(pattern, reference, flags=re.IGNORECASE)}
+
+
+def parse_statement_date(value):
+    """returns aware datetime of a statement date or None"""
+    value = (value or "").strip()
+    date = parse_datetime(value) if "T" in value or ":" in value else None
+    if date is None:
+        for date_format in DATE_FORMATS:
+            try:
+                date = datetime.strptime(value, date_format)
+                break
+            except ValueError:
+                continue
+    if date is None:
+        return None
+    return date if timezone.is_aware(date) else timezone.make_aware(date)
+
+
+def parse_statement_amount(value):
+    """returns positive decimal amount of a statement line or None"""
+    try:
+        amount = Decimal((value or "").replace(",", "").strip())
+    except InvalidOperation:
+        return None
+    return amount if amount.is_finite() and amount > 0 else None
+
+
+def read_statement(file, mode_of_payment, max_lines):
+    """streams a csv statement and returns parsed lines and unmatched invalid lines
+        Required columns: date, amount. Optional columns: reference, mode.
+    """
+    text_file = io.TextIOWrapper(file, encoding="utf-8-sig", errors="replace", newline="")
+    reader = csv.DictReader(text_file)
+    columns = {(column or "").strip().lower(): column for column in reader.fieldnames or []}
+    if "date" not in columns or "amount" not in columns:
+        text_file.detach()
+        raise ValueError("Statement must have date and amount columns")
+
+    try:
+        lines, unmatched = read_statement_lines(reader, columns, mode_of_payment, max_lines)
+    finally:
+        # detaching keeps the uploaded file open for django to clean up
+        text_file.detach()
+    return lines, unmatched
+
+
+def read_statement_lines(reader, columns, mode_of_payment, max_lines):
+    """returns parsed lines and invalid lines of a statement reader"""
+    lines, unmatched = [], []
+    for line_number, row in enumerate(reader, start=2):
+        if line_number - 1 > max_lines:
+            raise ValueError(f"Statement must not have more than {max_lines} lines")
+        values = {name: (row.get(column) or "").strip() for name, column in columns.items()}
+        payment_date = parse_statement_date(values["date"])
+        amount = parse_statement_amount(values["amount"])
+        if payment_date is None or amount is None:
+            unmatched.append(get_unmatched_line(line_number, values, "Invalid date or amount"))
+            continue
+        lines.append(StatementLine(line_number, payment_date, amount,
+                                   values.get("reference", "")[:200],
+                                   values.get("mode") or mode_of_payment))
+    return lines, unmatched
+
+
+def get_unmatched_line(line_number, values, reason):
+    """returns report entry of a line which is not imported"""
+    return {
+        "line": line_number,
+        "reason": reason,
+        "date": values.get("date"),
+        "amount": values.get("amount"),
+        "reference": values.get("reference"),
+    }
+
+
+def get_candidate_orders(user_ids, lines):
+    """returns locked open orders of the tenant referenced by id or due amount in the lines"""
+    reference_ids = sorted({order_id for line in lines for order_id in line.reference_ids})
+    amounts = sorted({line.amount for line in lines})
+    orders = {}
+    queryset = Order.objects\
+        .filter(created_by__in=user_ids, paid_amount__lt=F("net_amount"))\
+        .annotate(due=F("net_amount") - F("paid_amount"))\
+        .select_for_update()\
+        .order_by()
+    lookups = [Q(id__in=reference_ids[i:i + LOOKUP_BATCH_SIZE])
+               for i in range(0, len(reference_ids), LOOKUP_BATCH_SIZE)]
+    lookups += [Q(due__in=amounts[i:i + LOOKUP_BATCH_SIZE])
+                for i in range(0, len(amounts), LOOKUP_BATCH_SIZE)]
+    for lookup in lookups:
+        for order in queryset.filter(lookup).values("id", "customer_id", "created_by",
+                                                     "created_on", "due"):
+            orders[order["id"]] = order
+    return orders
+
+
+def match_line(line, orders, orders_by_due):
+    """returns the order matched by reference, else by exact due amount and date, or a reason
+        A line which references orders is matched only to them, and only if it is paid on or
+        after the day the order was created and is not more than its due.
+    """
+    # statements usually carry dates only, so orders created on the payment day also match
+    payment_day = get_local_date(line.payment_date)
+    if line.reference_ids:
+        referenced = [orders[order_id] for order_id in line.reference_ids if order_id in orders]
+        if not referenced:
+            return None, "Referenced order is not found or is already paid"
+        if len(referenced) > 1:
+            return None, "Reference matches more than one order"
+        if get_local_date(referenced[0]["created_on"]) > payment_day:
+            return None, "Payment date is before the referenced order was created"
+        if referenced[0]["due"] < line.amount:
+            return None, "Amount is more than the due of the referenced order"
+        return referenced[0], None
+
+    candidates = [order for order in orders_by_due.get(line.amount, [])
+                  if order["due"] == line.amount and
+                  get_local_date(order["created_on"]) <= payment_day]
+    if len(candidates) == 1:
+        return candidates[0], None
+    if candidates:
+        return None, "Amount and date match more than one order"
+    return None, "No open order matches reference, amount and date"
+
+
+def get_existing_payments(order_ids):
+    """returns (order id, amount, payment date) keys of live payments of the orders"""
+    keys = set()
+    order_ids = sorted(order_ids)
+    for i in range(0, len(order_ids), LOOKUP_BATCH_SIZE):
+        keys.update(Payment.objects
+                    .filter(order_id__in=order_ids[i:i + LOOKUP_BATCH_SIZE])
+                    .values_list("order_id", "paid_amount", "payment_date"))
+    return keys
+
+
+def import_statement(user, file, mode_of_payment="upi", max_lines=20000):
+    """imports credit lines of a csv statement as payments of matched open orders
+        Returns a report with count of imported payments and unmatched lines.
+    """
+    lines, unmatched = read_statement(file, mode_of_payment, max_lines)
+    duplicates = 0
+    with transaction.atomic():
+        orders = get_candidate_orders(f.get_tenant_user_ids(user), lines)
+        orders_by_due = defaultdict(list)
+        for order in orders.values():
+            orders_by_due[order["due"]].append(order)
+        existing_payments = get_existing_payments(orders)
+
+        now = f.get_current_time()
+        payments = []
+        for line in sorted(lines, key=lambda line: (line.payment_date, line.line_number)):
+            order, reason = match_line(line, orders, orders_by_due)
+            if order is None:
+                unmatched.append(get_unmatched_line(line.line_number, {
+                    "date": line.payment_date.isoformat(),
+                    "amount": str(line.amount),
+                    "reference": line.reference,
+                }, reason))
+                continue
+
+            payment_key = (order["id"], line.amount, line.payment_date)
+            if payment_key in existing_payments:
+                duplicates += 1
+                continue
+            existing_payments.add(payment_key)
+            # later lines see the reduced due, so one order is never paid twice by a statement
+            order["due"] -= line.amount
+            payments.append(Payment(
+                order_id=order["id"],
+                paid_amount=line.amount,
+                payment_date=line.payment_date,
+                mode_of_payment=line.mode_of_payment[:50],
+                comments=line.reference,
+                created_by=user.id,
+                updated_by=user.id,
+                created_on=now,
+                updated_on=now,
+            ))
+
+        Payment.objects.bulk_create(payments, batch_size=LOOKUP_BATCH_SIZE)
+        post_bulk_payments(payments, orders, user.id)
+
+    return {
+        "imported": len(payments),
+        "duplicates": duplicates,
+        "unmatched": sorted(unmatched, key=lambda line: line["line"]),
+    }
@@ -1,3 +1,468 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+import io
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework.test import APIClient
+
+from account.models import Business
+from order.models import Order
+from payments.models import CustomerBalance, DailyRevenue, Payment
+from payments.serializers import post_bulk_payments
+from payments.statements import get_reference_ids, import_statement
+
+
+class PostBulkPaymentsTest(TestCase):
+    """grouped posting of imported payments to orders, balances and daily revenue"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.business = Business.objects.create(name="tailors")
+        cls.tailor = get_user_model().objects.create_user("tailor", "password",
+                                                          business=cls.business)
+        cls.clerk = get_user_model().objects.create_user("clerk", "password",
+                                                         business=cls.business)
+        cls.customer = get_user_model().objects.create_user("customer", "password")
+        cls.other_customer = get_user_model().objects.create_user("other", "password")
+
+    def create_order(self, customer, net_amount):
+        last_update = timezone.now() - timedelta(days=1)
+        return Order.objects.create(customer=customer, net_amount=net_amount,
+                                    total_amount=net_amount, created_by=self.tailor.id,
+                                    updated_by=self.tailor.id, created_on=last_update,
+                                    updated_on=last_update)
+
+    def get_payment(self, order, amount, payment_date, mode_of_payment="cash"):
+        return Payment(order_id=order.id, paid_amount=Decimal(amount),
+                       payment_date=payment_date, mode_of_payment=mode_of_payment)
+
+    def test_posts_payments(self):
+        first_order = self.create_order(self.customer, 500)
+        second_order = self.create_order(self.customer, 300)
+        other_order = self.create_order(self.other_customer, 200)
+        first_day = timezone.make_aware(datetime(2026, 10, 1, 11))
+        second_day = timezone.make_aware(datetime(2026, 10, 2, 11))
+        payments = [
+            self.get_payment(first_order, "100", first_day),
+            self.get_payment(first_order, "50.50", second_day, "UPI"),
+            self.get_payment(second_order, "300", second_day),
+            self.get_payment(other_order, "20", first_day, "cheque"),
+        ]
+        orders = {order.id: {"customer_id": order.customer_id, "created_by": order.created_by}
+                  for order in (first_order, second_order, other_order)}
+
+        post_bulk_payments(payments, orders, self.clerk.id, batch_size=2)
+
+        first_order.refresh_from_db()
+        self.assertEqual(first_order.paid_amount, Decimal("150.50"))
+        self.assertEqual(first_order.updated_by, str(self.clerk.id))
+        self.assertGreater(first_order.updated_on, timezone.now() - timedelta(minutes=1))
+        second_order.refresh_from_db()
+        self.assertEqual(second_order.paid_amount, Decimal("300"))
+        other_order.refresh_from_db()
+        self.assertEqual(other_order.paid_amount, Decimal("20"))
+
+        balance = CustomerBalance.objects.get(customer=self.customer)
+        self.assertEqual((balance.business, balance.total_paid, balance.outstanding),
+                         (self.business, Decimal("450.50"), Decimal("-450.50")))
+        self.assertEqual(balance.last_payment_date, second_day)
+        balance = CustomerBalance.objects.get(customer=self.other_customer)
+        self.assertEqual(balance.total_paid, Decimal("20"))
+
+        revenues = {revenue.date: revenue for revenue in DailyRevenue.objects.all()}
+        self.assertEqual(set(revenues), {first_day.date(), second_day.date()})
+        first_revenue = revenues[first_day.date()]
+        self.assertEqual((first_revenue.amount_collected, first_revenue.collected_cash,
+                          first_revenue.collected_other),
+                         (Decimal("120"), Decimal("100"), Decimal("20")))
+        second_revenue = revenues[second_day.date()]
+        self.assertEqual((second_revenue.amount_collected, second_revenue.collected_cash,
+                          second_revenue.collected_upi),
+                         (Decimal("350.50"), Decimal("300"), Decimal("50.50")))
+
+    def test_adds_to_existing_amounts(self):
+        order = self.create_order(self.customer, 500)
+        Order.objects.filter(id=order.id).update(paid_amount=100)
+        orders = {order.id: {"customer_id": order.customer_id, "created_by": order.created_by}}
+
+        post_bulk_payments([self.get_payment(order, "50", timezone.now())], orders, self.clerk.id)
+        post_bulk_payments([self.get_payment(order, "25", timezone.now())], orders, self.clerk.id)
+
+        order.refresh_from_db()
+        self.assertEqual(order.paid_amount, Decimal("175"))
+        self.assertEqual(CustomerBalance.objects.get(customer=self.customer).total_paid,
+                         Decimal("75"))
+
+
+class StatementImportTest(TestCase):
+    """matching of bank and upi statement lines to open orders"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.business = Business.objects.create(name="tailors")
+        cls.tailor = get_user_model().objects.create_user("tailor", "password",
+                                                          business=cls.business)
+        cls.customer = get_user_model().objects.create_user("customer", "password")
+
+    def create_order(self, net_amount, created_on):
+        return Order.objects.create(customer=self.customer, net_amount=net_amount,
+                                    total_amount=net_amount, created_by=self.tailor.id,
+                                    updated_by=self.tailor.id, created_on=created_on,
+                                    updated_on=created_on)
+
+    def import_csv(self, text):
+        return import_statement(self.tailor, io.BytesIO(text.encode("utf-8")))
+
+    def get_reasons(self, report):
+        return [(line["line"], line["reason"]) for line in report["unmatched"]]
+
+    def test_reference_ids_need_the_order_prefix(self):
+        self.assertEqual(get_reference_ids("UPI/412345678901/ORD-17/9876543210"), {17})
+        self.assertEqual(get_reference_ids("neft ord 5 and Ord#6, ORD/7"), {5, 6, 7})
+        self.assertEqual(get_reference_ids("UPI/412345678901/9876543210/20261019"), set())
+        self.assertEqual(get_reference_ids("RECORD-8 WORD9"), set())
+
+    def test_matches_referenced_order(self):
+        order = self.create_order(500, timezone.make_aware(datetime(2026, 10, 1)))
+        self.create_order(200, timezone.make_aware(datetime(2026, 10, 1)))
+        report = self.import_csv("date,amount,reference\n"
+                                 f"2026-10-05,200,UPI/412345678901/ORD-{order.id}\n")
+        self.assertEqual(report["imported"], 1)
+        self.assertEqual(Payment.objects.get().order, order)
+
+    def test_unrelated_numbers_are_not_order_ids(self):
+        created_on = timezone.make_aware(datetime(2026, 10, 1))
+        orders = [self.create_order(500, created_on) for _ in range(3)]
+        # every order id and due is somewhere in the narration, none is referenced
+        report = self.import_csv("date,amount,reference\n"
+                                 f"2026-10-05,150,UPI/{orders[0].id}{orders[1].id}/"
+                                 f"{orders[2].id}/500/98450{orders[0].id}\n")
+        self.assertEqual(report["imported"], 0)
+        self.assertEqual(self.get_reasons(report),
+                         [(2, "No open order matches reference, amount and date")])
+        self.assertFalse(Payment.objects.exists())
+
+    def test_referenced_order_must_be_open_and_created_before_payment(self):
+        order = self.create_order(500, timezone.make_aware(datetime(2026, 10, 10)))
+        paid_order = self.create_order(300, timezone.make_aware(datetime(2026, 10, 1)))
+        Order.objects.filter(id=paid_order.id).update(paid_amount=300)
+        report = self.import_csv("date,amount,reference\n"
+                                 f"2026-10-05,500,ORD-{order.id}\n"
+                                 f"2026-10-12,600,ORD-{order.id}\n"
+                                 f"2026-10-12,300,ORD-{paid_order.id}\n"
+                                 f"2026-10-12,500,ORD-{order.id} ORD-{paid_order.id}\n")
+        self.assertEqual(report["imported"], 1)
+        self.assertEqual(self.get_reasons(report), [
+            (2, "Payment date is before the referenced order was created"),
+            (3, "Amount is more than the due of the referenced order"),
+            (4, "Referenced order is not found or is already paid"),
+        ])
+        order.refresh_from_db()
+        self.assertEqual(order.paid_amount, Decimal("500"))
+
+    def test_matches_unreferenced_line_by_due_and_date(self):
+        order = self.create_order(450, timezone.make_aware(datetime(2026, 10, 1)))
+        self.create_order(450, timezone.make_aware(datetime(2026, 10, 20)))
+        # the later order is not due yet on the payment day
+        report = self.import_csv("date,amount,reference\n"
+                                 "2026-10-05,450,NEFT 9876543210\n")
+        self.assertEqual(report["imported"], 1)
+        self.assertEqual(Payment.objects.get().order, order)
+
+
+class RebuildCustomerBalancesTest(TestCase):
+    """recomputation of customer balances from orders and payments"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.business = Business.objects.create(name="tailors")
+        cls.tailor = get_user_model().objects.create_user("tailor", "password",
+                                                          business=cls.business)
+        cls.freelancer = get_user_model().objects.create_user("freelancer", "password")
+        cls.customer = get_user_model().objects.create_user("customer", "password")
+        cls.other_customer = get_user_model().objects.create_user("other", "password")
+
+    def create_order(self, creator, customer, net_amount, paid_amount=0):
+        created_on = timezone.make_aware(datetime(2026, 10, 1))
+        return Order.objects.create(customer=customer, net_amount=net_amount,
+                                    total_amount=net_amount, paid_amount=paid_amount,
+                                    created_by=creator.id, updated_by=creator.id,
+                                    created_on=created_on, updated_on=created_on)
+
+    def test_upserts_balances_of_every_business(self):
+        order = self.create_order(self.tailor, self.customer, 500, paid_amount=200)
+        self.create_order(self.tailor, self.customer, 300)
+        self.create_order(self.freelancer, self.customer, 100)
+        payment_date = timezone.make_aware(datetime(2026, 10, 3))
+        Payment.objects.create(order=order, paid_amount=200, payment_date=payment_date,
+                               mode_of_payment="cash")
+        drifted = CustomerBalance.objects.create(business=self.business,
+                                                 business_key=self.business.id,
+                                                 customer=self.customer, total_billed=10)
+        stale = CustomerBalance.objects.create(business=self.business,
+                                               business_key=self.business.id,
+                                               customer=self.other_customer, total_billed=50,
+                                               outstanding=50)
+
+        call_command("rebuild_customer_balances", stdout=io.StringIO())
+
+        drifted.refresh_from_db()
+        self.assertEqual((drifted.total_billed, drifted.total_paid, drifted.outstanding),
+                         (Decimal("800"), Decimal("200"), Decimal("600")))
+        self.assertEqual(drifted.last_payment_date, payment_date)
+        # rows are kept, so writes waiting on their locks still find them
+        stale.refresh_from_db()
+        self.assertEqual((stale.total_billed, stale.outstanding), (0, 0))
+        own_balance = CustomerBalance.objects.get(business_key=0, customer=self.customer)
+        self.assertEqual((own_balance.business, own_balance.outstanding),
+                         (None, Decimal("100")))
+        self.assertEqual(CustomerBalance.objects.count(), 3)
+
+
+class CustomerLedgerTest(TestCase):
+    """ledger pages of a customer with running balance"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tailor = get_user_model().objects.create_user("tailor", "password")
+        cls.other_tailor = get_user_model().objects.create_user("other", "password")
+        cls.customer = get_user_model().objects.create_user("customer", "password")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.tailor)
+
+    def create_order(self, creator, net_amount, day):
+        created_on = timezone.make_aware(datetime(2026, 10, day, 10))
+        return Order.objects.create(customer=self.customer, net_amount=net_amount,
+                                    created_by=creator.id, updated_by=creator.id,
+                                    created_on=created_on, updated_on=created_on)
+
+    def create_payment(self, order, paid_amount, day):
+        payment_date = timezone.make_aware(datetime(2026, 10, day, 10))
+        return Payment.objects.create(order=order, paid_amount=paid_amount,
+                                      payment_date=payment_date, mode_of_payment="cash")
+
+    def get_ledger(self, **params):
+        response = self.client.get(reverse("customer_ledger", args=[self.customer.id]), params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_pages_keep_the_running_balance(self):
+        first_order = self.create_order(self.tailor, 500, 1)
+        self.create_payment(first_order, 200, 2)
+        second_order = self.create_order(self.tailor, 300, 3)
+        self.create_payment(second_order, 100, 3)
+        self.create_payment(first_order, 50, 4)
+        self.create_order(self.other_tailor, 1000, 2)
+
+        ledger = self.get_ledger()
+        self.assertEqual([(entry["type"], entry["debit"], entry["credit"], entry["balance"])
+                          for entry in ledger["entries"]], [
+            ("order", "500.00", "0.00", "500.00"),
+            ("payment", "0.00", "200.00", "300.00"),
+            ("order", "300.00", "0.00", "600.00"),
+            ("payment", "0.00", "100.00", "500.00"),
+            ("payment", "0.00", "50.00", "450.00"),
+        ])
+        self.assertIsNone(ledger["next_cursor"])
+
+        entries = []
+        page = self.get_ledger(limit=2)
+        opening_balances = [page["opening_balance"]]
+        while page["next_cursor"]:
+            entries += page["entries"]
+            page = self.get_ledger(limit=2, cursor=page["next_cursor"])
+            opening_balances.append(page["opening_balance"])
+        entries += page["entries"]
+        self.assertEqual(entries, ledger["entries"])
+        self.assertEqual(opening_balances, ["0.00", "300.00", "500.00"])
+        self.assertEqual(page["closing_balance"], "450.00")
+
+    def test_rejects_invalid_cursor_and_limit(self):
+        url = reverse("customer_ledger", args=[self.customer.id])
+        self.assertEqual(self.client.get(url, {"cursor": "abc"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"limit": "0"}).status_code, 400)
+
+
+class PaymentPostingTest(TestCase):
+    """paid amounts of orders follow created, updated and deleted payments"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tailor = get_user_model().objects.create_user("tailor", "password")
+        cls.customer = get_user_model().objects.create_user("customer", "password")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.tailor)
+        self.last_update = timezone.now() - timedelta(days=1)
+        self.order = self.create_order()
+        self.other_order = self.create_order()
+
+    def create_order(self):
+        return Order.objects.create(customer=self.customer, net_amount=500, total_amount=500,
+                                    created_by=self.tailor.id, updated_by=self.tailor.id,
+                                    created_on=self.last_update, updated_on=self.last_update)
+
+    def assertPaid(self, order_amount, other_order_amount):
+        self.assertEqual([Order.objects.get(id=order.id).paid_amount
+                          for order in (self.order, self.other_order)],
+                         [Decimal(order_amount), Decimal(other_order_amount)])
+        self.assertEqual(CustomerBalance.objects.get(customer=self.customer).total_paid,
+                         Decimal(order_amount) + Decimal(other_order_amount))
+
+    def test_payment_writes_post_to_orders(self):
+        response = self.client.post(reverse("payments"), {
+            "order": self.order.id,
+            "paid_amount": "200",
+            "mode_of_payment": "cash",
+        }, format="json")
+        self.assertEqual(response.status_code, 200)
+        payment_url = reverse("payment_detail", args=[response.data["id"]])
+        self.assertPaid("200", "0")
+        self.order.refresh_from_db()
+        self.assertGreater(self.order.updated_on, self.last_update)
+
+        self.client.patch(payment_url, {"paid_amount": "150"}, format="json")
+        self.assertPaid("150", "0")
+        self.client.patch(payment_url, {"order": self.other_order.id}, format="json")
+        self.assertPaid("0", "150")
+        response = self.client.delete(payment_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertPaid("0", "0")
+
+    def test_reconcile_repairs_drifted_orders(self):
+        Payment.objects.create(order=self.order, paid_amount=120, payment_date=timezone.now(),
+                               mode_of_payment="cash")
+        Payment.objects.create(order=self.order, paid_amount=80, payment_date=timezone.now(),
+                               is_deleted=True, mode_of_payment="cash")
+        Order.objects.filter(id=self.other_order.id).update(paid_amount=10)
+
+        out = io.StringIO()
+        call_command("reconcile_paid_amounts", dry_run=True, stdout=out)
+        self.assertIn("2 orders have drifted", out.getvalue())
+        self.assertEqual(Order.objects.get(id=self.order.id).paid_amount, 0)
+
+        call_command("reconcile_paid_amounts", stdout=io.StringIO())
+        self.assertEqual([Order.objects.get(id=order.id).paid_amount
+                          for order in (self.order, self.other_order)],
+                         [Decimal("120"), Decimal("0")])
+
+
+class CustomerDuesTest(TestCase):
+    """dues report of a business read from customer balances"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.business = Business.objects.create(name="tailors")
+        cls.admin = get_user_model().objects.create_user("admin", "password",
+                                                         business=cls.business,
+                                                         user_role="business_admin")
+        cls.customers = [get_user_model().objects.create_user(f"customer{i}", "password")
+                         for i in range(4)]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        other_business = Business.objects.create(name="other")
+        for customer, business, outstanding in ((self.customers[0], self.business, 300),
+                                                (self.customers[1], self.business, 900),
+                                                (self.customers[2], self.business, 0),
+                                                (self.customers[3], other_business, 500)):
+            CustomerBalance.objects.create(business=business, business_key=business.id,
+                                           customer=customer, total_billed=outstanding,
+                                           outstanding=outstanding)
+
+    def get_dues(self, **params):
+        response = self.client.get(reverse("customer_dues"), params)
+        self.assertEqual(response.status_code, 200)
+        return [(due["customer_name"], due["outstanding"]) for due in response.data]
+
+    def test_lists_customers_with_dues(self):
+        self.assertEqual(self.get_dues(), [("customer1", "900.00"), ("customer0", "300.00")])
+        self.assertEqual(self.get_dues(ordering="outstanding", limit=1),
+                         [("customer0", "300.00")])
+        self.assertEqual(self.get_dues(min_outstanding="500"), [("customer1", "900.00")])
+
+    def test_rejects_invalid_parameters(self):
+        for params in ({"ordering": "customer"}, {"limit": "x"}, {"min_outstanding": "x"}):
+            response = self.client.get(reverse("customer_dues"), params)
+            self.assertEqual(response.status_code, 400)
+
+    def test_customers_cannot_read_dues(self):
+        self.client.force_authenticate(self.customers[0])
+        response = self.client.get(reverse("customer_dues"))
+        self.assertEqual(response.status_code, 403)
+
+
+class DailyRevenueTest(TestCase):
+    """daily revenue rollup kept by writes, rebuilt by the backfill and read by period"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.business = Business.objects.create(name="tailors")
+        cls.admin = get_user_model().objects.create_user("admin", "password",
+                                                         business=cls.business,
+                                                         user_role="business_admin")
+        cls.customer = get_user_model().objects.create_user("customer", "password")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        response = self.client.post(reverse("orders"), {
+            "customer": self.customer.id,
+            "total_amount": "500",
+            "net_amount": "450",
+            "delivery_date": timezone.now().isoformat(),
+            "order_items": [
+                {"item_type": "shirt", "status": "Delivered",
+                 "delivery_date": timezone.now().isoformat()},
+                {"item_type": "pant", "delivery_date": timezone.now().isoformat()},
+            ],
+        }, format="json")
+        self.assertEqual(response.status_code, 200)
+        order_id = response.data["id"]
+        for amount, mode_of_payment in (("200", "cash"), ("100", "UPI"), ("50", "cheque")):
+            response = self.client.post(reverse("payments"), {
+                "order": order_id,
+                "paid_amount": amount,
+                "mode_of_payment": mode_of_payment,
+            }, format="json")
+            self.assertEqual(response.status_code, 200)
+
+    def get_rows(self):
+        return list(DailyRevenue.objects.values_list(
+            "business_id", "date", "orders_created", "items_delivered", "amount_billed",
+            "amount_collected", "collected_cash", "collected_card", "collected_upi",
+            "collected_other"))
+
+    def test_writes_post_to_the_rollup(self):
+        self.assertEqual(self.get_rows(), [
+            (self.business.id, timezone.localdate(), 1, 1, Decimal("450"), Decimal("350"),
+             Decimal("200"), Decimal("0"), Decimal("100"), Decimal("50")),
+        ])
+
+    def test_backfill_rebuilds_the_same_rows(self):
+        posted = self.get_rows()
+        DailyRevenue.objects.all().delete()
+        call_command("backfill_daily_revenue", stdout=io.StringIO())
+        self.assertEqual(self.get_rows(), posted)
+
+    def test_revenue_is_summed_by_period(self):
+        DailyRevenue.objects.create(business=self.business, business_key=self.business.id,
+                                    date=timezone.localdate() - timedelta(days=40),
+                                    orders_created=2, amount_billed=100)
+        response = self.client.get(reverse("revenue"), {"from": "2000-01-01"})
+        self.assertEqual(response.status_code, 400)
 
-# Create your tests here.
+        from_date = timezone.localdate() - timedelta(days=60)
+        response = self.client.get(reverse("revenue"), {"from": from_date.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(row["orders_created"], row["amount_billed"]) for row in response.data],
+                         [(2, "100.00"), (1, "450.00")])
@@ -4,5 +4,11 @@ from payments import views
 
 urlpatterns = [
     path("", views.PaymentListCreateView.as_view(), name="payments"),
+    path("ledger/<int:customer_id>/", views.CustomerLedgerView.as_view(), name="customer_ledger"),
+    path("dues/", views.CustomerDuesView.as_view(), name="customer_dues"),
+    path("revenue/", views.RevenueView.as_view(), name="revenue"),
+    path("allocate/", views.PaymentAllocationView.as_view(), name="payments_allocate"),
+    path("import/", views.PaymentStatementImportView.as_view(), name="payments_import"),
+    path("export/", views.PaymentExportView.as_view(), name="payments_export"),
     path("<int:payment_id>/", views.PaymentDetailView.as_view(), name="payment_detail"),
 ]
@@ -1,13 +1,29 @@
+import csv
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
 from django.shortcuts import get_object_or_404
+from django.db.models import F, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 
-from rest_framework.generics import ListCreateAPIView, RetrieveUpdateDestroyAPIView
+from rest_framework.generics import ListCreateAPIView, RetrieveUpdateDestroyAPIView, \
+    GenericAPIView, ListAPIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
 
-from payments.models import Payment
-from payments.serializers import PaymentSerializer
+from payments.models import Payment, CustomerBalance, DailyRevenue
+from payments.serializers import PaymentSerializer, PaymentReadSerializer, \
+    CustomerBalanceSerializer, RevenueSerializer, PaymentAllocationSerializer
+from payments.ledger import get_customer_ledger
+from payments.statements import import_statement
 from helpers import functions as f
+from core.idempotency import idempotent
+from core import conditional
+from core.export import ExportView
+from account.permissions import IsBusinessAdminOrStaff
 
 
 class PaymentListCreateView(ListCreateAPIView):
@@ -17,19 +33,27 @@ class PaymentListCreateView(ListCreateAPIView):
 
     def get_queryset(self):
         """returns payment queryset"""
-        return Payment.objects.filter(is_deleted=False).order_by("-updated_on")
+        return Payment.objects.order_by("-updated_on")
 
     def list(self, request, *args, **kwargs):
         """returns list of payments"""
         customer_id = request.query_params.get("customer_id")
         if customer_id:
-            payments = self.get_queryset().filter(user_id=customer_id)
+            payments = self.get_queryset().filter(order__customer_id=customer_id)
         else:
             payments = self.get_queryset()
 
-        serializer = self.get_serializer(payments, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        validators = conditional.get_list_validators(request, payments)
+        not_modified = conditional.get_not_modified_response(request, *validators)
+        if not_modified:
+            return not_modified
+
+        fields = PaymentReadSerializer.get_requested_fields(request)
+        serializer = PaymentReadSerializer(payments, fields=fields)
+        response = Response(serializer.data, status=status.HTTP_200_OK)
+        return conditional.add_validators(response, *validators)
 
+    @idempotent
     def create(self, request, *args, **kwargs):
         """creates a new payment in db"""
         serializer = self.get_serializer(data=request.data)
@@ -51,7 +75,7 @@ class PaymentDetailView(RetrieveUpdateDestroyAPIView):
 
     def get_queryset(self):
         """returns payment queryset"""
-        return Payment.objects.filter(is_deleted=False).order_by("-updated_on")
+        return Payment.objects.order_by("-updated_on")
 
     def retrieve(self, request, *args, **kwargs):
         """returns a payment obj based on id"""
@@ -62,9 +86,15 @@ class PaymentDetailView(RetrieveUpdateDestroyAPIView):
             }
             return Response(error, status=status.HTTP_400_BAD_REQUEST)
 
-        payment = get_object_or_404(self.get_queryset(), pk=payment_id, is_deleted=False)
+        validators = conditional.get_detail_validators(request, self.get_queryset(), payment_id)
+        not_modified = conditional.get_not_modified_response(request, *validators)
+        if not_modified:
+            return not_modified
+
+        payment = get_object_or_404(self.get_queryset(), pk=payment_id)
         serialized_data = self.get_serializer(payment).data
-        return Response(serialized_data, status=status.HTTP_200_OK)
+        response = Response(serialized_data, status=status.HTTP_200_OK)
+        return conditional.add_validators(response, *validators)
 
     def update(self, request, *args, **kwargs):
         """updates a payment obj based on id"""
@@ -75,7 +105,7 @@ class PaymentDetailView(RetrieveUpdateDestroyAPIView):
             }
             return Response(error, status=status.HTTP_400_BAD_REQUEST)
 
-        payment = get_object_or_404(self.get_queryset(), pk=payment_id, is_deleted=False)
+        payment = get_object_or_404(self.get_queryset(), pk=payment_id)
         serializer = self.get_serializer(payment, data=request.data, partial=True)
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -95,13 +125,185 @@ class PaymentDetailView(RetrieveUpdateDestroyAPIView):
             }
             return Response(error, status=status.HTTP_400_BAD_REQUEST)
 
-        payment = get_object_or_404(self.get_queryset(), pk=payment_id, is_deleted=False)
-        modified_data = self.get_serializer(payment).data
-        modified_data["is_deleted"] = True
-        serializer = self.get_serializer(payment, data=modified_data, partial=True)
-        serializer.is_valid()
+        payment = get_object_or_404(self.get_queryset(), pk=payment_id)
+        # only the flag is sent, so payments of deleted orders can still be deleted
+        serializer = self.get_serializer(payment, data={"is_deleted": True}, partial=True)
+        serializer.is_valid(raise_exception=True)
         serializer.save(
             request_user=request.user,
             updated_on=f.get_current_time()
         )
         return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class PaymentExportView(ExportView):
+    """streams payments of the business as csv or json lines"""
+    model = Payment
+    columns = ("id", "order_id", "paid_amount", "payment_date", "mode_of_payment", "comments",
+               "created_on", "updated_on", "created_by", "updated_by")
+    date_field = "payment_date"
+    tenant_lookup = "order__"
+
+
+class CustomerLedgerView(GenericAPIView):
+    """returns ledger of a customer with running balance"""
+    permission_classes = (IsAuthenticated,)
+    max_limit = 200
+
+    def get(self, request, *args, **kwargs):
+        """returns a page of ledger entries after the cursor"""
+        try:
+            limit = min(int(request.query_params.get("limit", 50)), self.max_limit)
+        except ValueError:
+            limit = 0
+        if limit <= 0:
+            error = {
+                "message": f"Limit must be a number between 1 and {self.max_limit}"
+            }
+            return Response(error, status=status.HTTP_400_BAD_REQUEST)
+
+        ledger = get_customer_ledger(request.user, kwargs["customer_id"],
+                                     request.query_params.get("cursor"), limit)
+        return Response(ledger, status=status.HTTP_200_OK)
+
+
+class CustomerDuesView(ListAPIView):
+    """returns customers of the business with outstanding dues"""
+    serializer_class = CustomerBalanceSerializer
+    permission_classes = (IsAuthenticated, IsBusinessAdminOrStaff)
+    ordering_fields = ("outstanding", "-outstanding", "last_payment_date", "-last_payment_date")
+    max_limit = 500
+
+    def get_queryset(self):
+        """returns balances of the business which have dues"""
+        return CustomerBalance.objects.filter(business_id=self.request.user.business_id,
+                                              outstanding__gt=0)
+
+    def list(self, request, *args, **kwargs):
+        """returns dues sorted by ordering param and limited by limit param"""
+        queryset = self.get_queryset()
+        min_outstanding = request.query_params.get("min_outstanding")
+        ordering = request.query_params.get("ordering", "-outstanding")
+        try:
+            limit = min(int(request.query_params.get("limit", 100)), self.max_limit)
+            if min_outstanding:
+                queryset = queryset.filter(outstanding__gte=Decimal(min_outstanding))
+        except (ValueError, InvalidOperation):
+            error = {
+                "message": "Limit or min_outstanding is invalid"
+            }
+            return Response(error, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1:
+            error = {
+                "message": f"Limit must be a number between 1 and {self.max_limit}"
+            }
+            return Response(error, status=status.HTTP_400_BAD_REQUEST)
+
+        if ordering not in self.ordering_fields:
+            error = {
+                "message": f"Ordering must be one of {', '.join(self.ordering_fields)}"
+            }
+            return Response(error, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = queryset.select_related("customer").order_by(ordering, "id")[:limit]
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class RevenueView(ListAPIView):
+    """returns revenue of the business per day, week or month from the daily rollup"""
+    serializer_class = RevenueSerializer
+    permission_classes = (IsAuthenticated, IsBusinessAdminOrStaff)
+    periods = {
+        "day": F("date"),
+        "week": TruncWeek("date"),
+        "month": TruncMonth("date"),
+    }
+    max_days = 3 * 366
+
+    def get_queryset(self):
+        """returns daily revenue rows of the business"""
+        return DailyRevenue.objects.filter(business_id=self.request.user.business_id)
+
+    def list(self, request, *args, **kwargs):
+        """returns revenue totals between from and to dates grouped by period"""
+        period = request.query_params.get("period", "day")
+        if period not in self.periods:
+            error = {
+                "message": f"Period must be one of {', '.join(self.periods)}"
+            }
+            return Response(error, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            to_date = parse_date(request.query_params.get("to", "")) or timezone.localdate()
+            from_date = parse_date(request.query_params.get("from", "")) or \
+                to_date - timedelta(days=30)
+        except ValueError:
+            error = {
+                "message": "From or to date is invalid"
+            }
+            return Response(error, status=status.HTTP_400_BAD_REQUEST)
+
+        if from_date > to_date or (to_date - from_date).days > self.max_days:
+            error = {
+                "message": f"From date must be before to date and within {self.max_days} days"
+            }
+            return Response(error, status=status.HTTP_400_BAD_REQUEST)
+
+        totals = {f"total_{name}": Sum(name) for name in RevenueSerializer.total_fields}
+        queryset = self.get_queryset()\
+            .filter(date__range=(from_date, to_date))\
+            .annotate(period=self.periods[period])\
+            .order_by()\
+            .values("period")\
+            .annotate(**totals)\
+            .order_by("period")
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class PaymentStatementImportView(GenericAPIView):
+    """imports payments from a bank or upi csv statement"""
+    permission_classes = (IsAuthenticated, IsBusinessAdminOrStaff)
+    max_lines = 20000
+
+    def post(self, request, *args, **kwargs):
+        """matches statement lines to open orders and creates payments in one transaction"""
+        statement = request.FILES.get("file")
+        if not statement:
+            error = {
+                "message": "Statement file is missing"
+            }
+            return Response(error, status=status.HTTP_400_BAD_REQUEST)
+
+        mode_of_payment = request.data.get("mode_of_payment") or "upi"
+        try:
+            report = import_statement(request.user, statement.file, mode_of_payment,
+                                      self.max_lines)
+        except (ValueError, csv.Error) as e:
+            error = {
+                "message": str(e)
+            }
+            return Response(error, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report, status=status.HTTP_200_OK)
+
+
+class PaymentAllocationView(GenericAPIView):
+    """allocates one payment of a customer across several open orders"""
+    serializer_class = PaymentAllocationSerializer
+    permission_classes = (IsAuthenticated, IsBusinessAdminOrStaff)
+
+    @idempotent
+    def post(self, request, *args, **kwargs):
+        """creates payments of oldest due orders first or of the requested orders in order"""
+        serializer = self.get_serializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        payments = serializer.save(
+            request_user=request.user,
+            created_on=f.get_current_time(),
+            updated_on=f.get_current_time()
+        )
+        serialized_data = PaymentSerializer(payments, many=True).data
+        return Response(serialized_data, status=status.HTTP_200_OK)
@@ -0,0 +1,297 @@
+import csv
+from decimal import Decimal, InvalidOperation
+import io
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+
+from helpers import functions as f
+from products.models import Product
+from products.search import SEARCH_FIELDS, index_products
+
+# columns written by the export, the import reads the same file back
+EXPORT_COLUMNS = ("id", "product_code", "name", "category", "description", "price", "cost",
+                  "units_on_hand", "units_available", "units_reserved", "is_service",
+                  "is_available", "created_on", "updated_on")
+IMPORT_COLUMNS = ("product_code", "name", "category", "description", "price", "cost",
+                  "units_on_hand", "units_available", "units_reserved", "is_service",
+                  "is_available", "is_deleted")
+# units reserved by orders change between an export and its import, so stock columns
+# are never written as they are, units_available is derived from them under the row lock
+STOCK_COLUMNS = ("units_on_hand", "units_available", "units_reserved")
+TEXT_LENGTHS = {
+    "product_code": 255,
+    "name": 255,
+    "category": 255,
+    "description": 500,
+}
+MAX_PRICE = Decimal("99999999.99")
+CENTS = Decimal("0.01")
+TRUE_VALUES = ("true", "1", "yes")
+FALSE_VALUES = ("false", "0", "no")
+
+
+def parse_decimal(value, name):
+    """returns price of a cell rounded to paise, raising ValueError if it is invalid"""
+    try:
+        amount = Decimal(value.replace(",", "")).quantize(CENTS)
+    except InvalidOperation:
+        raise ValueError(f"{name} must be a number")
+    if amount < 0 or amount > MAX_PRICE:
+        raise ValueError(f"{name} must be between 0 and {MAX_PRICE}")
+    return amount
+
+
+def parse_boolean(value, name):
+    """returns boolean of a true/false cell, raising ValueError if it is invalid"""
+    if value.lower() in TRUE_VALUES:
+        return True
+    if value.lower() in FALSE_VALUES:
+        return False
+    raise ValueError(f"{name} must be true or false")
+
+
+def parse_product_row(values, columns):
+    """returns product field values of a csv row, raising ValueError if a cell is invalid
+        Only columns of the file are returned, empty cells of optional columns are skipped.
+    """
+    fields = {}
+    for name in columns:
+        value = values[name]
+        if name in TEXT_LENGTHS:
+            if len(value) > TEXT_LENGTHS[name]:
+                raise ValueError(f"{name} must not be longer than {TEXT_LENGTHS[name]} characters")
+            if name in ("product_code", "name") and not value:
+                raise ValueError(f"{name} is required")
+            fields[name] = value
+        elif not value:
+            continue
+        elif name in ("price", "cost"):
+            fields[name] = parse_decimal(value, name)
+        elif name in STOCK_COLUMNS:
+            try:
+                fields[name] = int(value)
+            except ValueError:
+                raise ValueError(f"{name} must be a whole number")
+            if fields[name] < 0:
+                raise ValueError(f"{name} must not be negative")
+        else:
+            fields[name] = parse_boolean(value, name)
+    return fields
+
+
+def read_product_rows(reader, columns, max_lines):
+    """yields (line number, product code, fields or error) of every row of a catalog reader
+        Rows after max lines are not read, earlier chunks are already imported by then.
+    """
+    for line_number, row in enumerate(reader, start=2):
+        if line_number - 1 > max_lines:
+            yield line_number, "", f"File must not have more than {max_lines} lines, " \
+                                   f"rows from this line are not imported"
+            return
+        values = {name: (row.get(column) or "").strip() for name, column in columns.items()}
+        try:
+            yield line_number, values["product_code"], parse_product_row(values, columns)
+        except ValueError as e:
+            yield line_number, values["product_code"], str(e)
+
+
+def get_row_error(line_number, product_code, reason):
+    """returns report entry of a row which is not imported"""
+    return {
+        "line": line_number,
+        "product_code": product_code,
+        "reason": reason,
+    }
+
+
+def get_taken_names(names):
+    """returns dict of lower case name to id of the products using the names"""
+    if not names:
+        return {}
+    return {name.lower(): product_id for product_id, name in Product.all_objects
+            .filter(name__in=names)
+            .values_list("id", "name")}
+
+
+def get_stock_fields(product, fields):
+    """pops stock columns of the fields and returns units_available to write, if any
+        Raises ValueError if the row does not fit the units reserved by orders of the
+        locked product.
+    """
+    units_on_hand = fields.pop("units_on_hand", None)
+    units_available = fields.pop("units_available", None)
+    units_reserved = fields.pop("units_reserved", None)
+    reserved = product.units_reserved if product else 0
+    if units_on_hand is not None:
+        if units_on_hand < reserved:
+            raise ValueError(f"units_on_hand must not be less than the {reserved} units "
+                             f"reserved by orders")
+        return units_on_hand - reserved
+    if units_available is not None and units_reserved not in (None, reserved):
+        raise ValueError("units_reserved has changed since the export, export the products "
+                         "again or import units_on_hand")
+    return units_available
+
+
+def import_product_chunk(user, rows, columns, now, seen_codes, seen_names):
+    """creates and updates the products of a chunk of parsed rows in one transaction
+        Existing products are matched by product code and locked, so units_available is
+        derived from the units reserved by orders at the time of the write. Codes and names of imported rows are added
+        to the seen sets. Returns counts of created and updated products and row errors.
+    """
+    errors = []
+    codes = [product_code for _, product_code, fields in rows if isinstance(fields, dict)]
+    with transaction.atomic():
+        existing = {product.product_code: product for product in Product.all_objects
+                    .filter(product_code__in=codes)
+                    .select_for_update()}
+        names = [fields["name"] for _, _, fields in rows
+                 if isinstance(fields, dict) and "name" in fields]
+        taken_names = get_taken_names(names)
+
+        new_products, changed_products = [], []
+        for line_number, product_code, fields in rows:
+            if not isinstance(fields, dict):
+                errors.append(get_row_error(line_number, product_code, fields))
+                continue
+            product = existing.get(product_code)
+            product_id = product.id if product else None
+            name = fields.get("name", "").lower()
+            if product_code in seen_codes:
+                reason = "Product code is repeated in the file"
+            elif product is not None and product.seller_id != user.id:
+                reason = "Product code is used by another seller"
+            elif name and (name in seen_names or taken_names.get(name, product_id) != product_id):
+                reason = "Product name is already used"
+            elif product is None and "name" not in fields:
+                reason = "name is required for a new product"
+            else:
+                reason = None
+                try:
+                    units_available = get_stock_fields(product, fields)
+                except ValueError as e:
+                    reason = str(e)
+            if reason:
+                errors.append(get_row_error(line_number, product_code, reason))
+                continue
+            if units_available is not None:
+                fields["units_available"] = units_available
+
+            seen_codes.add(product_code)
+            if name:
+                seen_names.add(name)
+            if product is None:
+                fields.setdefault("is_available", True)
+                new_products.append(Product(seller=user, created_by=user.id,
+                                            updated_by=user.id, created_on=now,
+                                            updated_on=now, **fields))
+                continue
+            for field, value in fields.items():
+                setattr(product, field, value)
+            product.updated_by = user.id
+            product.updated_on = now
+            changed_products.append(product)
+
+        update_fields = [name for name in columns
+                         if name != "product_code" and name not in STOCK_COLUMNS]
+        if set(columns) & set(STOCK_COLUMNS):
+            update_fields.append("units_available")
+        Product.objects.bulk_create(new_products, batch_size=500)
+        if changed_products:
+            Product.all_objects.bulk_update(changed_products,
+                                            update_fields + ["updated_by", "updated_on"],
+                                            batch_size=500)
+
+        # bulk writes skip the post_save signal, so search tokens are rebuilt here.
+        # mysql does not return ids of bulk inserted rows, the codes identify them
+        indexed = list(Product.all_objects.filter(
+            product_code__in=[product.product_code for product in new_products]))
+        if set(update_fields) & set(SEARCH_FIELDS):
+            indexed += changed_products
+        if indexed:
+            index_products(indexed)
+    return len(new_products), len(changed_products), errors
+
+
+def import_products(user, file, max_lines=20000, chunk_size=500):
+    """streams a csv catalog and creates or updates products of the user by product code
+        Required column: product_code. Optional columns: name (required for new products),
+        category, description, price, cost, units_on_hand, units_available, units_reserved,
+        is_service, is_available, is_deleted. Columns which are not in the file are left
+        unchanged.
+        Stock is imported as units_on_hand, the units in store including those reserved by
+        orders. units_available is only imported with the units_reserved of its export,
+        and rows whose products have reserved other units since are rejected.
+        Every chunk of rows is written with bulk queries in its own transaction.
+        Returns a report with counts of created and updated products and invalid rows.
+    """
+    text_file = io.TextIOWrapper(file, encoding="utf-8-sig", errors="replace", newline="")
+    reader = csv.DictReader(text_file)
+    header = {(column or "").strip().lower(): column for column in reader.fieldnames or []}
+    if "product_code" not in header:
+        text_file.detach()
+        raise ValueError("File must have a product_code column")
+    columns = {name: header[name] for name in IMPORT_COLUMNS if name in header}
+    if "units_on_hand" in columns:
+        columns.pop("units_available", None)
+        columns.pop("units_reserved", None)
+    elif "units_available" in columns and "units_reserved" not in columns:
+        text_file.detach()
+        raise ValueError("File must have a units_reserved column with units_available, "
+                         "or a units_on_hand column instead")
+    elif "units_available" not in columns:
+        columns.pop("units_reserved", None)
+
+    created = updated = 0
+    errors = []
+    seen_codes, seen_names = set(), set()
+    now = f.get_current_time()
+    try:
+        rows = read_product_rows(reader, columns, max_lines)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            chunk_codes, chunk_names = set(seen_codes), set(seen_names)
+            try:
+                chunk_created, chunk_updated, chunk_errors = import_product_chunk(
+                    user, chunk, columns, now, chunk_codes, chunk_names)
+            except IntegrityError:
+                # a name or code taken by a concurrent write rolls back the whole chunk
+                errors += [get_row_error(line_number, product_code,
+                                         fields if isinstance(fields, str)
+                                         else "Product name or code is already used")
+                           for line_number, product_code, fields in chunk]
+                continue
+            seen_codes, seen_names = chunk_codes, chunk_names
+            created += chunk_created
+            updated += chunk_updated
+            errors += chunk_errors
+    finally:
+        # detaching keeps the uploaded file open for django to clean up
+        text_file.detach()
+    return {
+        "created": created,
+        "updated": updated,
+        "errors": errors,
+    }
+
+
+def update_products(queryset, fields, user, now, chunk_size=1000):
+    """sets the fields of every product of the queryset with one update statement
+        Rows are locked while their ids are read, so the search tokens rebuilt after a
+        category change or a soft delete belong to exactly the updated products.
+        Returns count of updated products.
+    """
+    fields = dict(fields, updated_by=user.id, updated_on=now)
+    if not set(fields) & set(SEARCH_FIELDS):
+        return queryset.update(**fields)
+
+    with transaction.atomic():
+        product_ids = list(queryset.select_for_update().order_by().values_list("id", flat=True))
+        count = queryset.update(**fields)
+        for i in range(0, len(product_ids), chunk_size):
+            # bulk updates skip the post_save signal, so search tokens are rebuilt here
+            index_products(list(Product.all_objects.filter(id__in=product_ids[i:i + chunk_size])))
+    return count
@@ -0,0 +1,138 @@
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+import logging
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+
+from PIL import Image, ImageOps
+
+from products.models import ProductDesignImage
+from products.similarity import get_stored_phash
+from core.media import save_blob, release_blob, delete_files
+from core.models import MediaBlob
+
+logger = logging.getLogger(__name__)
+
+# longest side in pixels, largest first so every variant is resized from the previous one
+VARIANT_SIZES = (
+    ("large", 1200),
+    ("medium", 600),
+    ("thumbnail", 200),
+)
+VARIANT_FORMATS = (
+    ("webp", "WEBP", {"quality": 80, "method": 4}),
+    ("jpeg", "JPEG", {"quality": 85, "optimize": True, "progressive": True}),
+)
+
+IMAGE_DIRECTORY = "product-images"
+
+_executor = None
+
+
+def store_image(file):
+    """stores an uploaded image once per content and returns its storage path"""
+    return save_blob(file, IMAGE_DIRECTORY)
+
+
+def release_image(path, variants=None):
+    """releases a stored image and deletes its variants along with the last reference"""
+    release_blob(path, derived_paths=get_variant_paths(variants))
+
+
+def get_variant_path(image_name, size, extension):
+    """returns storage path of a variant stored alongside the original image"""
+    root, _ = os.path.splitext(image_name)
+    return f"{root}_{size}.{extension}"
+
+
+def generate_variants(image_name, storage=default_storage, overwrite=False):
+    """generates resized webp and jpeg variants of a stored image
+        Variant paths follow the content addressed image path, so variants which exist
+        already are kept unless overwrite is set.
+        Returns dict of size to dict of format to storage path.
+    """
+    paths = {size: {extension: get_variant_path(image_name, size, extension)
+                    for extension, _, _ in VARIANT_FORMATS}
+             for size, _ in VARIANT_SIZES}
+    if not overwrite and all(storage.exists(path) for size_paths in paths.values()
+                             for path in size_paths.values()):
+        return paths
+
+    with storage.open(image_name, "rb") as file:
+        image = Image.open(file)
+        # jpeg decoder scales down while decoding, which skips most of the full size decode
+        image.draft("RGB", (VARIANT_SIZES[0][1], VARIANT_SIZES[0][1]))
+        image = ImageOps.exif_transpose(image)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+
+    for size, max_side in VARIANT_SIZES:
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        for extension, image_format, options in VARIANT_FORMATS:
+            content = BytesIO()
+            image.save(content, image_format, **options)
+            path = paths[size][extension]
+            if overwrite and storage.exists(path):
+                storage.delete(path)
+            saved_path = storage.save(path, ContentFile(content.getvalue()))
+            # another worker stored the same variant first, its copy is identical
+            if saved_path != path:
+                storage.delete(saved_path)
+    return paths
+
+
+def get_variant_paths(variants):
+    """returns storage paths of all variants"""
+    return [path for paths in (variants or {}).values() for path in paths.values()]
+
+
+def delete_variants(variants, storage=default_storage):
+    """deletes stored variant files"""
+    delete_files(get_variant_paths(variants), storage)
+
+
+def save_image_variants(image_id):
+    """generates variants and perceptual hash of a product image and stores them on the row"""
+    image = ProductDesignImage.objects.filter(id=image_id).values("image", "variants").first()
+    if image is None or not image["image"]:
+        return
+
+    variants = generate_variants(image["image"])
+    # the thumbnail is small and already upright, its hash is within a few bits of the original
+    phash = get_stored_phash(variants["thumbnail"]["jpeg"])
+    updated = ProductDesignImage.objects\
+        .filter(id=image_id, image=image["image"])\
+        .update(variants=variants, phash=phash, updated_on=timezone.now())
+    # the image was released while its variants were generated
+    if not updated and not MediaBlob.objects.filter(path=image["image"],
+                                                    ref_count__gt=0).exists():
+        delete_variants(variants)
+
+
+def run_image_variants(image_id):
+    """runs variant generation in a worker thread and closes its db connection"""
+    try:
+        save_image_variants(image_id)
+    except Exception:
+        logger.exception("Unable to generate variants of product image %s", image_id)
+    finally:
+        connection.close()
+
+
+def get_executor():
+    """returns the shared worker pool of variant generation"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.IMAGE_VARIANT_WORKERS,
+                                       thread_name_prefix="image-variants")
+    return _executor
+
+
+def schedule_image_variants(image_id):
+    """generates variants in the background once the image row is committed"""
+    transaction.on_commit(lambda: get_executor().submit(run_image_variants, image_id))
@@ -0,0 +1,192 @@
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import zipfile
+
+from django.conf import settings
+from django.core.files import File
+from django.db import IntegrityError, transaction
+
+from core.uploads import read_image_header
+from products.images import schedule_image_variants, store_image
+from products.models import ProductDesignImage
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+IMAGE_CODE_PATTERN = re.compile(r"[^A-Za-z0-9_-]+")
+# rounds of new codes when concurrent uploads take codes between the lookup and the insert
+IMAGE_CODE_ATTEMPTS = 5
+
+_executor = None
+
+
+def get_executor():
+    """returns the shared worker pool of image inspection
+        Hashing and file reads release the gil, so threads use every core without forking
+        the app worker or touching its db connections.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.IMAGE_PROCESS_WORKERS,
+                                       thread_name_prefix="image-ingest")
+    return _executor
+
+
+def inspect_image(path):
+    """returns format, pixel count and sha256 of an image file, or the error
+        Runs in worker threads, so it only touches the file.
+    """
+    try:
+        with open(path, "rb") as file:
+            image_format, width, height = read_image_header(file)
+            hasher = hashlib.sha256()
+            for chunk in iter(lambda: file.read(1024 * 1024), b""):
+                hasher.update(chunk)
+    except (OSError, ValueError) as e:
+        return None, 0, None, str(e)
+    return image_format, width * height, hasher.hexdigest(), None
+
+
+def extract_archive(archive, directory, max_files):
+    """extracts image entries of a zip archive into the directory
+        Returns list of (name, path) and list of skipped entries.
+    """
+    entries, skipped = [], []
+    try:
+        zip_file = zipfile.ZipFile(archive)
+    except zipfile.BadZipFile:
+        return entries, [{"name": archive.name, "reason": "Archive is not a valid zip file"}]
+
+    with zip_file:
+        for info in zip_file.infolist():
+            name = os.path.basename(info.filename)
+            if info.is_dir() or not name or name.startswith(".") or "__MACOSX" in info.filename:
+                continue
+            if not name.lower().endswith(IMAGE_EXTENSIONS):
+                skipped.append({"name": info.filename, "reason": "File is not an image"})
+                continue
+            # declared sizes are checked before extracting so a zip bomb is never inflated
+            if info.file_size > settings.MAX_UPLOAD_SIZE:
+                skipped.append({"name": info.filename, "reason": "Image is too large"})
+                continue
+            if len(entries) >= max_files:
+                skipped.append({"name": info.filename, "reason": "Too many files"})
+                continue
+
+            path = os.path.join(directory, f"{len(entries)}{os.path.splitext(name)[1]}")
+            with zip_file.open(info) as source, open(path, "wb") as target:
+                shutil.copyfileobj(source, target, 1024 * 1024)
+            entries.append((name, path))
+    return entries, skipped
+
+
+def get_image_code_base(name, product):
+    """returns image code of an uploaded file name"""
+    stem = IMAGE_CODE_PATTERN.sub("-", os.path.splitext(name)[0]).strip("-")
+    return (stem or product.product_code)[:45]
+
+
+def get_image_codes(names, product):
+    """returns an unused image code for every name, resolving collisions with set queries
+        Names of one base get distinct suffixes in a round, so only codes taken in the
+        db need another round. A code may still be taken before the insert, which the
+        unique constraint rejects, see create_images.
+    """
+    bases = [get_image_code_base(name, product) for name in names]
+    codes = [None] * len(names)
+    next_suffixes = defaultdict(lambda: 1)
+    assigned = set()
+    pending = list(range(len(names)))
+    while pending:
+        candidates = {}
+        for i in pending:
+            suffix = next_suffixes[bases[i]]
+            next_suffixes[bases[i]] += 1
+            candidates[i] = bases[i] if suffix == 1 else f"{bases[i]}-{suffix}"
+        taken = set(ProductDesignImage.objects
+                    .filter(image_code__in=set(candidates.values()))
+                    .values_list("image_code", flat=True))
+        pending = []
+        for i, code in candidates.items():
+            if code in taken or code in assigned:
+                pending.append(i)
+                continue
+            assigned.add(code)
+            codes[i] = code
+    return codes
+
+
+def create_images(product, request_user, images, now):
+    """inserts design images with unused codes and returns the codes
+        Args: product, request_user, images (list of (file name, storage path)), now
+        The insert is retried with new codes when a concurrent upload took one of them.
+    """
+    for attempt in range(IMAGE_CODE_ATTEMPTS):
+        codes = get_image_codes([name for name, _ in images], product)
+        rows = [ProductDesignImage(product=product, image=image_path, image_code=code,
+                                   created_by=request_user.id, updated_by=request_user.id,
+                                   created_on=now, updated_on=now)
+                for (_, image_path), code in zip(images, codes)]
+        try:
+            with transaction.atomic():
+                ProductDesignImage.objects.bulk_create(rows, batch_size=200)
+            return codes
+        except IntegrityError:
+            if attempt == IMAGE_CODE_ATTEMPTS - 1:
+                raise
+
+
+def ingest_images(product, request_user, files, archives, now):
+    """validates images in worker threads and stores them as design images of the product
+        Args: product, request_user, files (uploaded images), archives (uploaded zip files), now
+        Returns list of created images and list of skipped files with reasons.
+    """
+    max_files = settings.MAX_BULK_UPLOAD_FILES
+    with tempfile.TemporaryDirectory(dir=settings.FILE_UPLOAD_TEMP_DIR) as directory:
+        entries, skipped = [], []
+        for file in files:
+            if len(entries) >= max_files:
+                skipped.append({"name": file.name, "reason": "Too many files"})
+                continue
+            entries.append((file.name, file.temporary_file_path()))
+        for archive in archives:
+            archive_entries, archive_skipped = extract_archive(
+                archive, directory, max_files - len(entries))
+            entries += archive_entries
+            skipped += archive_skipped
+
+        if not entries:
+            return [], skipped
+
+        results = list(get_executor().map(inspect_image, [path for _, path in entries]))
+
+        images = []
+        for (name, path), (image_format, pixels, content_hash, error) in zip(entries, results):
+            if error:
+                skipped.append({"name": name, "reason": error})
+            elif image_format not in settings.ALLOWED_IMAGE_FORMATS:
+                skipped.append({"name": name, "reason": "Image format is not allowed"})
+            elif pixels > settings.MAX_IMAGE_PIXELS:
+                skipped.append({"name": name, "reason": "Image has too many pixels"})
+            else:
+                images.append((name, path, content_hash))
+
+        with transaction.atomic():
+            stored = []
+            for name, path, content_hash in images:
+                with open(path, "rb") as source:
+                    file = File(source, name=name)
+                    file.content_hash = content_hash
+                    stored.append((name, store_image(file)))
+            codes = create_images(product, request_user, stored, now)
+
+    # mysql does not return ids of bulk inserted rows, the new codes identify them
+    created = list(ProductDesignImage.objects
+                   .filter(product=product, image_code__in=codes)
+                   .order_by("id"))
+    for image in created:
+        schedule_image_variants(image.id)
+    return created, skipped
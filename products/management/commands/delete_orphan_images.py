@@ -0,0 +1,100 @@
+from datetime import timedelta
+import os
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from core.export import iterate_rows
+from core.models import MediaBlob
+from products.images import IMAGE_DIRECTORY, get_variant_paths
+from products.models import Product, ProductDesignImage, ProductArchive, \
+    ProductDesignImageArchive
+
+
+def walk_files(storage, directory):
+    """yields paths of all files under the directory of the storage"""
+    directories, files = storage.listdir(directory)
+    for name in files:
+        yield os.path.join(directory, name)
+    for name in directories:
+        yield from walk_files(storage, os.path.join(directory, name))
+
+
+def get_batches(paths, batch_size):
+    """yields lists of batch_size paths"""
+    batch = []
+    for path in paths:
+        batch.append(path)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Command(BaseCommand):
+    """deletes product image files which no product or design image refers to"""
+    help = "Deletes orphaned files under product-images, use --dry-run to only list them"
+
+    def add_arguments(self, parser):
+        """adds command arguments"""
+        parser.add_argument("--dry-run", action="store_true")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--keep-deleted-days", type=int, default=30,
+                            help="keep files of products soft deleted within these days")
+        parser.add_argument("--min-age-hours", type=int, default=24,
+                            help="skip files younger than this, their rows may not be committed")
+
+    def get_referenced_paths(self, keep_deleted_days):
+        """returns set of paths referenced by live, recently deleted and archived products
+            Archived rows keep their files, as they can be restored.
+        """
+        cutoff = timezone.now() - timedelta(days=keep_deleted_days)
+        kept_products = Q(is_deleted=False) | Q(updated_on__gte=cutoff)
+        products = Product.all_objects.filter(kept_products).exclude(image="")
+        images = ProductDesignImage.objects.filter(
+            Q(product__is_deleted=False) | Q(product__updated_on__gte=cutoff)
+        )
+        paths = set()
+        for image, in iterate_rows(products.exclude(image__isnull=True), ("image",)):
+            paths.add(image)
+        for image, in iterate_rows(ProductArchive.objects.exclude(image__isnull=True)
+                                   .exclude(image=""), ("image",)):
+            paths.add(image)
+        for queryset in (images, ProductDesignImageArchive.objects.all()):
+            for image, variants in iterate_rows(queryset, ("image", "variants")):
+                paths.add(image)
+                paths.update(get_variant_paths(variants))
+        return paths
+
+    def handle(self, *args, **options):
+        """deletes unreferenced files older than min age in batches"""
+        storage = default_storage
+        referenced_paths = self.get_referenced_paths(options["keep_deleted_days"])
+        min_modified_time = timezone.now() - timedelta(hours=options["min_age_hours"])
+        checked = deleted = 0
+        if not storage.exists(IMAGE_DIRECTORY):
+            self.stdout.write("no product images to check")
+            return
+
+        files = walk_files(storage, IMAGE_DIRECTORY)
+        for batch in get_batches(files, options["batch_size"]):
+            checked += len(batch)
+            orphans = [path for path in batch if path not in referenced_paths and
+                       storage.get_modified_time(path) < min_modified_time]
+            if not orphans:
+                continue
+
+            deleted += len(orphans)
+            if options["dry_run"]:
+                for path in orphans:
+                    self.stdout.write(path)
+                continue
+            MediaBlob.objects.filter(path__in=orphans).delete()
+            for path in orphans:
+                storage.delete(path)
+
+        action = "would delete" if options["dry_run"] else "deleted"
+        self.stdout.write(f"checked {checked} files, {action} {deleted} orphaned files")
@@ -0,0 +1,63 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import os
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from products.models import ProductDesignImage
+from products.similarity import get_stored_phash
+
+
+def get_hash(image_id, image_name, variants):
+    """returns id, image name and perceptual hash of an image, or the error, in a worker process
+        The jpeg thumbnail is hashed when the image has one, it is much smaller to read.
+    """
+    thumbnail = (variants or {}).get("thumbnail", {}).get("jpeg")
+    try:
+        return image_id, image_name, get_stored_phash(thumbnail or image_name), None
+    except Exception as e:
+        return image_id, image_name, None, str(e)
+
+
+class Command(BaseCommand):
+    """computes perceptual hashes of product images across worker processes"""
+    help = "Computes perceptual hashes of product images for similar design search"
+
+    def add_arguments(self, parser):
+        """adds command arguments"""
+        parser.add_argument("--all", action="store_true",
+                            help="recompute hashes of images which already have them")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        """computes hashes in worker processes and saves them in this process"""
+        queryset = ProductDesignImage.objects.order_by("id").exclude(image="")
+        if not options["all"]:
+            queryset = queryset.filter(phash__isnull=True)
+
+        hashed = failed = 0
+        last_id = 0
+        while True:
+            images = list(queryset.filter(id__gt=last_id)
+                          .values_list("id", "image", "variants")[:options["batch_size"]])
+            if not images:
+                break
+            last_id = images[-1][0]
+            # forked workers must not share the db connection of this process
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=options["workers"]) as executor:
+                futures = [executor.submit(get_hash, image_id, image_name, variants)
+                           for image_id, image_name, variants in images]
+                for future in as_completed(futures):
+                    image_id, image_name, phash, error = future.result()
+                    if error:
+                        failed += 1
+                        self.stderr.write(f"image {image_id}: {error}")
+                        continue
+                    hashed += ProductDesignImage.objects\
+                        .filter(id=image_id, image=image_name)\
+                        .update(phash=phash, updated_on=timezone.now())
+
+        self.stdout.write(f"hashed {hashed} images, {failed} failed")
@@ -0,0 +1,61 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import os
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from products.images import generate_variants
+from products.models import ProductDesignImage
+
+
+def get_variants(image_id, image_name, overwrite):
+    """returns id, image name and variants of an image, or the error, in a worker process"""
+    try:
+        return image_id, image_name, generate_variants(image_name, overwrite=overwrite), None
+    except Exception as e:
+        return image_id, image_name, None, str(e)
+
+
+class Command(BaseCommand):
+    """generates resized variants of product images across worker processes"""
+    help = "Generates thumbnail, medium and large webp/jpeg variants of product images"
+
+    def add_arguments(self, parser):
+        """adds command arguments"""
+        parser.add_argument("--all", action="store_true",
+                            help="regenerate variants of images which already have them")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        """generates variants in worker processes and saves their paths in this process"""
+        queryset = ProductDesignImage.objects.order_by("id").exclude(image="")
+        if not options["all"]:
+            queryset = queryset.filter(variants={})
+
+        generated = failed = 0
+        last_id = 0
+        while True:
+            images = list(queryset.filter(id__gt=last_id)
+                          .values_list("id", "image")[:options["batch_size"]])
+            if not images:
+                break
+            last_id = images[-1][0]
+            # forked workers must not share the db connection of this process
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=options["workers"]) as executor:
+                futures = [executor.submit(get_variants, image_id, image_name,
+                                           options["all"])
+                           for image_id, image_name in images]
+                for future in as_completed(futures):
+                    image_id, image_name, variants, error = future.result()
+                    if error:
+                        failed += 1
+                        self.stderr.write(f"image {image_id}: {error}")
+                        continue
+                    updated = ProductDesignImage.objects\
+                        .filter(id=image_id, image=image_name)\
+                        .update(variants=variants)
+                    generated += updated
+
+        self.stdout.write(f"generated variants of {generated} images, {failed} failed")
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from products.models import Product
+from products.search import index_products
+
+
+class Command(BaseCommand):
+    """rebuilds search tokens of all products"""
+    help = "Rebuilds the product search token table, saved products are indexed by signals"
+
+    def add_arguments(self, parser):
+        """adds command arguments"""
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        """indexes products in batches of batch size"""
+        queryset = Product.all_objects.order_by("id")\
+            .only("id", "seller_id", "product_code", "name", "category", "description",
+                  "is_deleted")
+        indexed = 0
+        last_id = 0
+        while True:
+            products = list(queryset.filter(id__gt=last_id)[:options["batch_size"]])
+            if not products:
+                break
+            last_id = products[-1].id
+            index_products(products)
+            indexed += len(products)
+
+        self.stdout.write(f"indexed {indexed} products")
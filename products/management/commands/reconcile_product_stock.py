@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from helpers import functions as f
+from order.models import OrderItem
+from products.models import Product
+
+
+def get_reserved_units_subquery():
+    """returns correlated subquery of units held by live order items of the outer product"""
+    reserved_units = OrderItem.objects\
+        .filter(product=OuterRef("pk"), order__is_deleted=False)\
+        .order_by()\
+        .values("product")\
+        .annotate(total=Sum("quantity"))\
+        .values("total")
+    return Coalesce(Subquery(reserved_units, output_field=IntegerField()), Value(0),
+                    output_field=IntegerField())
+
+
+class Command(BaseCommand):
+    """verifies reserved units of products against their live order items and repairs drift"""
+    help = "Verifies Product.units_reserved against live order items and repairs drift"
+
+    def add_arguments(self, parser):
+        """adds command arguments"""
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        """moves the drift of reserved units back to available units in batches"""
+        drifted_products = Product.all_objects\
+            .filter(is_service=False)\
+            .order_by()\
+            .annotate(items_reserved=get_reserved_units_subquery())\
+            .exclude(units_reserved=F("items_reserved"))\
+            .values_list("id", "units_available", "units_reserved", "items_reserved")
+        drifted_ids = []
+        for product_id, units_available, units_reserved, items_reserved in drifted_products:
+            self.stdout.write(f"product {product_id}: reserved {units_reserved}, "
+                              f"order items {items_reserved}, available {units_available}")
+            drifted_ids.append(product_id)
+
+        if options["dry_run"]:
+            self.stdout.write(f"{len(drifted_ids)} products have drifted")
+            return
+
+        batch_size = options["batch_size"]
+        for start in range(0, len(drifted_ids), batch_size):
+            # units are recomputed in the update so reservations made meanwhile are kept,
+            # available units are set first as mysql assigns columns left to right
+            with transaction.atomic():
+                Product.all_objects\
+                    .filter(id__in=drifted_ids[start:start + batch_size])\
+                    .update(units_available=F("units_available") + F("units_reserved") -
+                            get_reserved_units_subquery(),
+                            units_reserved=get_reserved_units_subquery(),
+                            updated_on=f.get_current_time())
+        self.stdout.write(f"{len(drifted_ids)} products are repaired")
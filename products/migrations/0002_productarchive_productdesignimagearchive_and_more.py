@@ -0,0 +1,67 @@
+# Generated by Django 4.0 on 2026-10-19 13:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductArchive',
+            fields=[
+                ('created_on', models.DateTimeField(blank=True, null=True)),
+                ('updated_on', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.CharField(blank=True, max_length=255, null=True)),
+                ('updated_by', models.CharField(blank=True, max_length=255, null=True)),
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('archived_on', models.DateTimeField()),
+                ('seller_id', models.BigIntegerField(null=True)),
+                ('name', models.CharField(max_length=255)),
+                ('description', models.TextField(blank=True, default='', max_length=500)),
+                ('image', models.CharField(max_length=100, null=True)),
+                ('category', models.CharField(default='', max_length=255)),
+                ('units_available', models.IntegerField(default=1)),
+                ('price', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('cost', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('product_code', models.CharField(max_length=255)),
+                ('is_service', models.BooleanField(default=False)),
+                ('is_deleted', models.BooleanField(default=True)),
+                ('is_available', models.BooleanField(default=True)),
+            ],
+            options={
+                'db_table': 't_product_archive',
+                'ordering': ('-archived_on',),
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductDesignImageArchive',
+            fields=[
+                ('created_on', models.DateTimeField(blank=True, null=True)),
+                ('updated_on', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.CharField(blank=True, max_length=255, null=True)),
+                ('updated_by', models.CharField(blank=True, max_length=255, null=True)),
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('archived_on', models.DateTimeField()),
+                ('product_id', models.BigIntegerField(db_index=True)),
+                ('image', models.CharField(max_length=100)),
+                ('image_code', models.CharField(blank=True, default='', max_length=50)),
+                ('is_main_image', models.BooleanField(default=False)),
+            ],
+            options={
+                'db_table': 't_product_design_image_archive',
+                'ordering': ('-archived_on',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_deleted', 'seller'], name='t_product_deleted_seller_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_deleted', 'updated_on'], name='t_product_deleted_updated_idx'),
+        ),
+    ]
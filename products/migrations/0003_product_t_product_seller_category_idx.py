@@ -0,0 +1,17 @@
+# Generated by Django 4.0 on 2026-10-19 13:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_productarchive_productdesignimagearchive_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['seller', 'is_deleted', 'category', 'price'], name='t_product_seller_category_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.0 on 2026-10-19 13:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_product_t_product_seller_category_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productdesignimage',
+            index=models.Index(fields=['product', 'is_main_image', 'id'], name='t_product_image_main_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.0 on 2026-10-19 13:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_productdesignimage_t_product_image_main_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productdesignimage',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='productdesignimagearchive',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
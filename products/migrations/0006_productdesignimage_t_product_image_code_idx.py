@@ -0,0 +1,17 @@
+# Generated by Django 4.0 on 2026-10-19 13:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_productdesignimage_variants_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productdesignimage',
+            index=models.Index(fields=['image_code'], name='t_product_image_code_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.0 on 2026-10-19 13:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_productdesignimage_t_product_image_code_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productdesignimage',
+            name='phash',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='productdesignimagearchive',
+            name='phash',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.0 on 2026-10-19 13:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_productdesignimage_phash_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seller_id', models.BigIntegerField(null=True)),
+                ('token', models.CharField(max_length=64)),
+                ('weight', models.SmallIntegerField(default=1)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='products.product')),
+            ],
+            options={
+                'db_table': 't_product_search_token',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='productsearchtoken',
+            index=models.Index(fields=['seller_id', 'token'], name='t_product_token_seller_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.0 on 2026-10-19 13:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_productsearchtoken_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='units_reserved',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.0 on 2026-10-19 14:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_product_units_reserved'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productarchive',
+            name='units_reserved',
+            field=models.IntegerField(default=0),
+        ),
+    ]
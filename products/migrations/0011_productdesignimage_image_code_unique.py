@@ -0,0 +1,51 @@
+# Generated by Django 4.0 on 2026-10-19 14:26
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def get_free_code(ProductDesignImage, code, image_id):
+    """returns code with the image id appended, which no other image uses"""
+    suffix = f"-{image_id}"
+    while True:
+        candidate = f"{code[:50 - len(suffix)]}{suffix}"
+        if not ProductDesignImage.objects.filter(image_code=candidate).exists():
+            return candidate
+        suffix = f"{suffix}-{image_id}"
+
+
+def set_unique_image_codes(apps, schema_editor):
+    """gives images without a code and images which repeat a code a code of their own"""
+    ProductDesignImage = apps.get_model("products", "ProductDesignImage")
+    for image in ProductDesignImage.objects.filter(image_code="").select_related("product"):
+        image.image_code = get_free_code(ProductDesignImage, image.product.product_code, image.id)
+        image.save(update_fields=["image_code"])
+
+    repeated = ProductDesignImage.objects\
+        .values("image_code")\
+        .annotate(count=Count("id"))\
+        .filter(count__gt=1)
+    for row in repeated:
+        images = ProductDesignImage.objects.filter(image_code=row["image_code"]).order_by("id")
+        for image in list(images)[1:]:
+            image.image_code = get_free_code(ProductDesignImage, image.image_code, image.id)
+            image.save(update_fields=["image_code"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_productarchive_units_reserved'),
+    ]
+
+    operations = [
+        migrations.RunPython(set_unique_image_codes, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='productdesignimage',
+            name='t_product_image_code_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='productdesignimage',
+            constraint=models.UniqueConstraint(fields=('image_code',), name='t_product_image_code_unique'),
+        ),
+    ]
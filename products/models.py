@@ -4,7 +4,7 @@ from django.conf import settings
 import uuid
 import os
 
-from core.models import CustomBaseClass
+from core.models import CustomBaseClass, ArchiveBaseClass, SoftDeleteManager
 
 
 def image_file_path(instance, filename):
@@ -23,6 +23,8 @@ class Product(CustomBaseClass):
     image = models.ImageField(upload_to=image_file_path, null=True)
     category = models.CharField(max_length=255, default="")
     units_available = models.IntegerField(default=1)
+    # units held by live order items, moved out of units_available when reserved
+    units_reserved = models.IntegerField(default=0)
     price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     cost = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     product_code = models.CharField(max_length=255, unique=True)
@@ -30,9 +32,18 @@ class Product(CustomBaseClass):
     is_deleted = models.BooleanField(default=False)
     is_available = models.BooleanField(default=True)
 
+    objects = SoftDeleteManager()
+    all_objects = models.Manager()
+
     class Meta:
         db_table = "t_product"
         ordering = ("-updated_on",)
+        indexes = [
+            models.Index(fields=["is_deleted", "seller"], name="t_product_deleted_seller_idx"),
+            models.Index(fields=["is_deleted", "updated_on"], name="t_product_deleted_updated_idx"),
+            models.Index(fields=["seller", "is_deleted", "category", "price"],
+                         name="t_product_seller_category_idx"),
+        ]
 
     def __str__(self):
         """returns string representation of product"""
@@ -50,11 +61,82 @@ class ProductDesignImage(CustomBaseClass):
     image = models.ImageField(upload_to=image_file_path)
     image_code = models.CharField(max_length=50, default="", blank=True)
     is_main_image = models.BooleanField(default=False)
+    variants = models.JSONField(default=dict, blank=True)
+    # 64 bit perceptual hash of the image, stored signed
+    phash = models.BigIntegerField(null=True, blank=True)
 
     class Meta:
         db_table = "t_product_design_image"
         ordering = ("-updated_on",)
+        indexes = [
+            models.Index(fields=["product", "is_main_image", "id"], name="t_product_image_main_idx"),
+        ]
+        # codes are assigned right after the insert, so concurrent uploads retry on a conflict
+        constraints = [
+            models.UniqueConstraint(fields=["image_code"], name="t_product_image_code_unique"),
+        ]
 
     def __str__(self):
         """returns string representation of the model"""
         return f"{self.image.name}"
+
+
+class ProductSearchToken(models.Model):
+    """word of a searchable product field, kept in sync with the product by signals"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="search_tokens")
+    seller_id = models.BigIntegerField(null=True)
+    token = models.CharField(max_length=64)
+    weight = models.SmallIntegerField(default=1)
+
+    class Meta:
+        db_table = "t_product_search_token"
+        indexes = [
+            models.Index(fields=["seller_id", "token"], name="t_product_token_seller_idx"),
+        ]
+
+    def __str__(self):
+        """returns string representation of search token"""
+        return f"{self.token} - {self.product_id}"
+
+
+class ProductArchive(ArchiveBaseClass):
+    """Archive of soft deleted products"""
+    seller_id = models.BigIntegerField(null=True)
+    name = models.CharField(max_length=255)
+    description = models.TextField(max_length=500, default="", blank=True)
+    image = models.CharField(max_length=100, null=True)
+    category = models.CharField(max_length=255, default="")
+    units_available = models.IntegerField(default=1)
+    units_reserved = models.IntegerField(default=0)
+    price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    cost = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    product_code = models.CharField(max_length=255)
+    is_service = models.BooleanField(default=False)
+    is_deleted = models.BooleanField(default=True)
+    is_available = models.BooleanField(default=True)
+
+    class Meta:
+        db_table = "t_product_archive"
+        ordering = ("-archived_on",)
+
+    def __str__(self):
+        """returns string representation of archived product"""
+        return f"{self.name}"
+
+
+class ProductDesignImageArchive(ArchiveBaseClass):
+    """Archive of images which belong to archived products"""
+    product_id = models.BigIntegerField(db_index=True)
+    image = models.CharField(max_length=100)
+    image_code = models.CharField(max_length=50, default="", blank=True)
+    is_main_image = models.BooleanField(default=False)
+    variants = models.JSONField(default=dict, blank=True)
+    phash = models.BigIntegerField(null=True, blank=True)
+
+    class Meta:
+        db_table = "t_product_design_image_archive"
+        ordering = ("-archived_on",)
+
+    def __str__(self):
+        """returns string representation of archived image"""
+        return f"{self.image}"
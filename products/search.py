@@ -0,0 +1,100 @@
+import re
+
+from django.db import transaction
+from django.db.models import Case, F, Max, Q, When
+
+from products.models import ProductSearchToken
+
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+MAX_TOKEN_LENGTH = 64
+MAX_QUERY_TERMS = 5
+# matches in codes rank above names, names above categories and descriptions
+FIELD_WEIGHTS = (
+    ("product_code", 8),
+    ("name", 4),
+    ("category", 2),
+    ("description", 1),
+)
+SEARCH_FIELDS = ("product_code", "name", "category", "description", "seller_id", "is_deleted")
+
+
+def get_tokens(text):
+    """returns lower case words of the text"""
+    return [token[:MAX_TOKEN_LENGTH] for token in TOKEN_PATTERN.findall((text or "").lower())]
+
+
+def get_product_tokens(product):
+    """returns dict of token to weight of a product
+        Codes are also indexed without separators, so SH-001 is found by typing sh00.
+    """
+    weights = {}
+    for field, weight in FIELD_WEIGHTS:
+        tokens = get_tokens(getattr(product, field))
+        if field == "product_code" and len(tokens) > 1:
+            tokens.append("".join(tokens)[:MAX_TOKEN_LENGTH])
+        for token in tokens:
+            weights[token] = max(weights.get(token, 0), weight)
+    return weights
+
+
+def index_products(products):
+    """replaces search tokens of the products, deleted products have none"""
+    rows = [
+        ProductSearchToken(product_id=product.id, seller_id=product.seller_id,
+                           token=token, weight=weight)
+        for product in products if not product.is_deleted
+        for token, weight in get_product_tokens(product).items()
+    ]
+    with transaction.atomic():
+        ProductSearchToken.objects.filter(product_id__in=[product.id for product in products])\
+            .delete()
+        ProductSearchToken.objects.bulk_create(rows, batch_size=1000)
+
+
+def get_prefix_filter(term):
+    """returns filter of tokens starting with the term
+        Ascii terms become a range, [sil, sim) for sil, which every backend reads from the
+        token index.
+    """
+    last = term[-1]
+    if last.isascii() and last.isalnum():
+        return Q(token__gte=term, token__lt=term[:-1] + chr(ord(last) + 1))
+    return Q(token__istartswith=term)
+
+
+def search_products(seller, query, limit):
+    """returns ids of products of the seller whose words start with every term of the query
+        A term scores the weight of its best matching field, doubled for a whole word match.
+        Products are ranked by the sum of their term scores in one grouped query, limited
+        to the products matching the longest and usually rarest term.
+    """
+    terms = list(dict.fromkeys(get_tokens(query)))[:MAX_QUERY_TERMS]
+    if not terms:
+        return []
+
+    tokens = ProductSearchToken.objects.filter(seller_id=seller.id)
+    term_filter = Q()
+    term_scores = {}
+    for i, term in enumerate(terms):
+        prefix_filter = get_prefix_filter(term)
+        term_filter |= prefix_filter
+        term_scores[f"term_{i}"] = Max(Case(
+            When(token=term, then=F("weight") * 2),
+            When(prefix_filter, then=F("weight")),
+            default=0,
+        ))
+
+    if len(terms) > 1:
+        rarest_term = max(terms, key=len)
+        tokens = tokens.filter(product_id__in=tokens.filter(get_prefix_filter(rarest_term))
+                               .values("product_id"))
+
+    score = sum((F(name) for name in term_scores), start=0)
+    rows = tokens\
+        .filter(term_filter)\
+        .values("product_id")\
+        .annotate(**term_scores)\
+        .filter(**{f"{name}__gt": 0 for name in term_scores})\
+        .annotate(score=score)\
+        .order_by("-score", "product_id")[:limit]
+    return [row["product_id"] for row in rows]
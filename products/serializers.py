@@ -1,19 +1,94 @@
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
 from rest_framework import serializers
+from rest_framework.validators import UniqueValidator
 
 from products.models import Product, ProductDesignImage
+from products.images import IMAGE_DIRECTORY, schedule_image_variants, store_image, \
+    release_image
+from products.ingest import IMAGE_EXTENSIONS
+from products.similarity import get_file_phash
+from core.serializers import ValuesReadSerializer
+from core.models import MediaBlob, UploadSession
+from core.media import add_blob_reference, get_blob_path
+from core.uploads import ImageHeaderField, validate_image_header
+from core import uploads
+
+IMAGE_UPLOAD_SALT = "products.image-upload"
+
+
+def get_absolute_image_url(image_path, request=None):
+    """returns absolute url of a stored image path or None"""
+    if not image_path:
+        return None
+    image_url = ProductDesignImage.image.field.storage.url(image_path)
+    if request:
+        return request.build_absolute_uri(image_url)
+    return image_url
+
+
+def raise_image_code_exists(image_code):
+    """raises validation error of an image code taken by a concurrent upload"""
+    error = {
+        "message": f"Product with code ({image_code}) exists"
+    }
+    raise serializers.ValidationError(error, code="validation")
 
 
 class ProductImageSerializer(serializers.ModelSerializer):
     """serializes a product image model obj"""
     image_url = serializers.SerializerMethodField(read_only=True)
+    image_urls = serializers.SerializerMethodField(read_only=True)
+    image = ImageHeaderField(write_only=True, required=False)
+    upload_id = serializers.UUIDField(write_only=True, required=False)
 
     class Meta:
         model = ProductDesignImage
-        fields = ("id", "image_url", "image", "image_code")
+        fields = ("id", "image_url", "image_urls", "image", "upload_id", "image_code")
         read_only_fields = ("id",)
-        extra_kwargs = {
-            "image": {"write_only": True}
-        }
+
+    def validate_upload_id(self, upload_id):
+        """returns completed resumable upload of the request user"""
+        request = self.context.get("request")
+        upload = UploadSession.objects.filter(
+            id=upload_id,
+            created_by=request.user.id if request else None,
+            expires_on__gt=timezone.now()
+        ).first()
+        if upload is None or not upload.is_complete:
+            raise serializers.ValidationError("Upload is not found or not complete")
+        return upload
+
+    def validate(self, attrs):
+        """replaces a completed resumable upload with its file"""
+        upload = attrs.pop("upload_id", None)
+        if upload is not None:
+            if "image" in attrs:
+                raise serializers.ValidationError({"image": ["Send either image or upload_id"]})
+            image = uploads.open_completed_upload(upload)
+            try:
+                validate_image_header(image)
+            except serializers.ValidationError as e:
+                image.close()
+                raise serializers.ValidationError({"upload_id": e.detail})
+            attrs["image"] = image
+            self.completed_upload = (upload, image)
+        elif self.instance is None and "image" not in attrs:
+            raise serializers.ValidationError({"image": ["Send image or upload_id"]})
+        return attrs
+
+    def complete_upload(self):
+        """deletes the resumable upload which is saved as the image"""
+        if getattr(self, "completed_upload", None) is None:
+            return
+        upload, image = self.completed_upload
+        image.close()
+        uploads.delete_upload_file(upload.id)
+        upload.delete()
 
     def get_image_url(self, instance):
         """returns absolute url of image"""
@@ -23,6 +98,15 @@ class ProductImageSerializer(serializers.ModelSerializer):
             return request.build_absolute_uri(image_url)
         return None
 
+    def get_image_urls(self, instance):
+        """returns absolute urls of generated variants by size and format"""
+        request = self.context.get("request")
+        return {
+            size: {extension: get_absolute_image_url(path, request)
+                   for extension, path in paths.items()}
+            for size, paths in (instance.variants or {}).items()
+        }
+
     def create(self, validated_data):
         """creates a new image details obj in DB"""
         image_code = validated_data.get("image_code")
@@ -43,11 +127,18 @@ class ProductImageSerializer(serializers.ModelSerializer):
 
         validated_data["created_by"] = request_user.id
         validated_data["updated_by"] = request_user.id
-        product_image = ProductDesignImage.objects.create(**validated_data)
-        if len(product_image.image_code) == 0:
-            product = validated_data["product"]
-            product_image.image_code = f"{product.product_code}-{product_image.id}"
-            product_image.save()
+        try:
+            with transaction.atomic():
+                validated_data["image"] = store_image(validated_data["image"])
+                product_image = ProductDesignImage.objects.create(**validated_data)
+                if len(product_image.image_code) == 0:
+                    product = validated_data["product"]
+                    product_image.image_code = f"{product.product_code}-{product_image.id}"
+                    product_image.save()
+        except IntegrityError:
+            raise_image_code_exists(image_code)
+        self.complete_upload()
+        schedule_image_variants(product_image.id)
         return product_image
 
     def update(self, instance, validated_data):
@@ -69,33 +160,211 @@ class ProductImageSerializer(serializers.ModelSerializer):
             request_user = validated_data.pop("request_user")
 
         instance.product = validated_data.get("product_id", instance.product)
-        instance.image = validated_data.get("image", instance.image)
         instance.image_code = validated_data.get("image_code", instance.image_code)
         instance.is_main_image = validated_data.get("is_main_image", instance.is_main_image)
         instance.updated_on = validated_data["updated_on"]
         instance.updated_by = request_user.id
-        instance.save()
+        try:
+            with transaction.atomic():
+                old_image = None
+                if "image" in validated_data:
+                    old_image = (instance.image.name, instance.variants)
+                    instance.image = store_image(validated_data["image"])
+                    instance.variants = {}
+                    instance.phash = None
+                instance.save()
+                if old_image:
+                    release_image(*old_image)
+        except IntegrityError:
+            raise_image_code_exists(image_code)
+        self.complete_upload()
+        if old_image:
+            schedule_image_variants(instance.id)
         return instance
 
 
+class ProductImagePresignSerializer(serializers.Serializer):
+    """validates a direct upload of a product image and signs its storage path"""
+    filename = serializers.CharField(max_length=255)
+    size = serializers.IntegerField(min_value=1)
+    content_hash = serializers.RegexField(r"^[0-9a-fA-F]{64}$",
+                                          error_messages={"invalid": "Send sha256 in hex"})
+
+    def validate_filename(self, filename):
+        """returns filename if it has an image extension"""
+        if not filename.lower().endswith(IMAGE_EXTENSIONS):
+            raise serializers.ValidationError(
+                f"Filename must end with one of {', '.join(IMAGE_EXTENSIONS)}")
+        return filename
+
+    def validate_size(self, size):
+        """returns size if it is within the upload size cap"""
+        if size > settings.MAX_UPLOAD_SIZE:
+            raise serializers.ValidationError(
+                f"Size must not be larger than {settings.MAX_UPLOAD_SIZE} bytes")
+        return size
+
+    def get_upload(self, product, request_user):
+        """returns completion token and upload instructions of the file
+            The file is uploaded to its content addressed path, stored content is not sent again.
+        """
+        content_hash = self.validated_data["content_hash"].lower()
+        size = self.validated_data["size"]
+        storage = default_storage
+        path = MediaBlob.objects.filter(content_hash=content_hash)\
+            .values_list("path", flat=True).first()
+        if path is None:
+            path = get_blob_path(IMAGE_DIRECTORY, content_hash, self.validated_data["filename"])
+        upload_required = not storage.exists(path)
+        token = signing.dumps({
+            "product": product.id,
+            "user": request_user.id,
+            "path": path,
+            "size": size,
+            "hash": content_hash,
+        }, salt=IMAGE_UPLOAD_SALT)
+        upload = None
+        if upload_required:
+            upload = storage.get_upload_url(path, size, content_hash,
+                                            settings.PRESIGNED_UPLOAD_EXPIRES_SECONDS)
+            request = self.context.get("request")
+            if request:
+                upload["url"] = request.build_absolute_uri(upload["url"])
+        return {
+            "token": token,
+            "upload_required": upload_required,
+            "upload": upload,
+            "expires_in": settings.PRESIGNED_UPLOAD_EXPIRES_SECONDS,
+        }
+
+
+class ProductImageCompleteSerializer(serializers.Serializer):
+    """registers a product image uploaded straight to storage"""
+    token = serializers.CharField()
+    image_code = serializers.CharField(max_length=50, required=False, allow_blank=True)
+
+    def validate_token(self, token):
+        """returns the signed upload of the token"""
+        try:
+            # completion may come in after a slow upload which started just before expiry
+            return signing.loads(token, salt=IMAGE_UPLOAD_SALT,
+                                 max_age=2 * settings.PRESIGNED_UPLOAD_EXPIRES_SECONDS)
+        except signing.BadSignature:
+            raise serializers.ValidationError("Upload token is invalid or expired")
+
+    def validate_image_code(self, image_code):
+        """returns image code if no image uses it"""
+        if image_code and ProductDesignImage.objects.filter(image_code=image_code).exists():
+            raise serializers.ValidationError(f"Product with code ({image_code}) exists")
+        return image_code
+
+    def validate(self, attrs):
+        """checks the uploaded file against the size and image rules of the signed upload"""
+        upload = attrs["token"]
+        product = self.context["product"]
+        request_user = self.context["request"].user
+        if upload["product"] != product.id or upload["user"] != request_user.id:
+            raise serializers.ValidationError({"token": ["Upload token is not of this product"]})
+
+        storage = default_storage
+        if not storage.exists(upload["path"]) or storage.size(upload["path"]) != upload["size"]:
+            raise serializers.ValidationError({"token": ["Upload is not found or not complete"]})
+        # only the image header is read, the pixels stay in storage
+        with storage.open(upload["path"], "rb") as image:
+            try:
+                validate_image_header(image)
+            except serializers.ValidationError as e:
+                raise serializers.ValidationError({"token": e.detail})
+        return attrs
+
+    def create(self, validated_data):
+        """creates the image row with a reference to the uploaded file"""
+        upload = validated_data["token"]
+        product = validated_data["product"]
+        request_user = validated_data["request_user"]
+        try:
+            with transaction.atomic():
+                blob = add_blob_reference(upload["hash"], upload["path"], upload["size"])
+                # the blob row is locked now, a released file deleted since validation is gone
+                if not default_storage.exists(blob.path):
+                    raise serializers.ValidationError(
+                        {"token": ["Upload is not found or not complete"]})
+                product_image = ProductDesignImage.objects.create(
+                    product=product,
+                    image=blob.path,
+                    image_code=validated_data.get("image_code") or "",
+                    created_by=request_user.id,
+                    updated_by=request_user.id,
+                    created_on=validated_data["created_on"],
+                    updated_on=validated_data["updated_on"],
+                )
+                if len(product_image.image_code) == 0:
+                    product_image.image_code = f"{product.product_code}-{product_image.id}"
+                    product_image.save(update_fields=["image_code"])
+        except IntegrityError:
+            raise_image_code_exists(validated_data.get("image_code"))
+        schedule_image_variants(product_image.id)
+        return product_image
+
+
+class SimilarImageSearchSerializer(serializers.Serializer):
+    """validates a similar design search by an uploaded photo or a stored image"""
+    image = ImageHeaderField(required=False)
+    image_id = serializers.IntegerField(required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=20)
+    max_distance = serializers.IntegerField(min_value=0, max_value=64, default=12)
+
+    def validate(self, attrs):
+        """returns attrs with perceptual hash of the searched image"""
+        if ("image" in attrs) == ("image_id" in attrs):
+            raise serializers.ValidationError({"image": ["Send either image or image_id"]})
+
+        if "image" in attrs:
+            attrs["phash"] = get_file_phash(attrs["image"])
+            return attrs
+
+        request = self.context.get("request")
+        phash = ProductDesignImage.objects\
+            .filter(id=attrs["image_id"], product__seller=request.user if request else None)\
+            .values_list("phash", flat=True).first()
+        if phash is None:
+            raise serializers.ValidationError({"image_id": ["Image is not found or not hashed yet"]})
+        attrs["phash"] = phash
+        return attrs
+
+
+# every product column except the stock columns, which are changed with atomic updates
+UPDATABLE_PRODUCT_FIELDS = ("seller", "name", "description", "image", "category", "price", "cost",
+                            "product_code", "is_service", "is_deleted", "is_available",
+                            "updated_on", "updated_by")
+
+
 class ProductSerializer(serializers.ModelSerializer):
     """serializes product objects"""
     created_on = serializers.DateTimeField(required=False)
     updated_on = serializers.DateTimeField(required=False)
+    image = ImageHeaderField(required=False, allow_null=True)
     image_url = serializers.SerializerMethodField(read_only=True)
+    main_image_url = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
         model = Product
         fields = "__all__"
-        read_only_fields = ("id", "created_by", "updated_by")
+        read_only_fields = ("id", "created_by", "updated_by", "units_reserved")
+        # the default manager hides deleted products, which still hold their name and code
+        extra_kwargs = {
+            "name": {"validators": [UniqueValidator(queryset=Product.all_objects.all())]},
+            "product_code": {"validators": [UniqueValidator(queryset=Product.all_objects.all())]},
+        }
 
     def get_image_url(self, instance):
         """returns complete url of product image"""
-        request = self.context.get("request")
-        if instance.image:
-            image_url = instance.image.url
-            return request.build_absolute_uri(image_url)
-        return None
+        return get_absolute_image_url(instance.image.name, self.context.get("request"))
+
+    def get_main_image_url(self, instance):
+        """returns complete url of the main image annotated on the product"""
+        return get_absolute_image_url(getattr(instance, "main_image", None),
+                                      self.context.get("request"))
 
     def create(self, validated_data):
         """creates a new product with validated data"""
@@ -109,7 +378,10 @@ class ProductSerializer(serializers.ModelSerializer):
         validated_data["created_by"] = request_user.id
         validated_data["updated_by"] = request_user.id
         validated_data["is_available"] = True
-        product = Product.objects.create(**validated_data)
+        with transaction.atomic():
+            if validated_data.get("image"):
+                validated_data["image"] = store_image(validated_data["image"])
+            product = Product.objects.create(**validated_data)
         return product
 
     def update(self, instance, validated_data):
@@ -123,7 +395,6 @@ class ProductSerializer(serializers.ModelSerializer):
         instance.seller = validated_data.get("seller", instance.seller)
         instance.name = validated_data.get("name", instance.name)
         instance.description = validated_data.get("description", instance.description)
-        instance.image = validated_data.get("image", instance.image)
         instance.price = validated_data.get("price", instance.price)
         instance.cost = validated_data.get("cost", instance.cost)
         instance.product_code = validated_data.get("product_code", instance.product_code)
@@ -131,8 +402,68 @@ class ProductSerializer(serializers.ModelSerializer):
         instance.is_deleted = validated_data.get("is_deleted", instance.is_deleted)
         instance.is_available = validated_data.get("is_available", instance.is_available)
         instance.category = validated_data.get("category", instance.category)
-        instance.units_available = validated_data.get("units_available", instance.units_available)
         instance.updated_on = validated_data["updated_on"]
         instance.updated_by = request_user.id
-        instance.save()
+        update_fields = list(UPDATABLE_PRODUCT_FIELDS)
+        # stock is written only when it is corrected by hand, so reservations made since
+        # the product was read are kept
+        units_available = validated_data.get("units_available", instance.units_available)
+        if units_available != instance.units_available:
+            instance.units_available = units_available
+            update_fields.append("units_available")
+        with transaction.atomic():
+            old_image = None
+            if "image" in validated_data:
+                old_image = instance.image.name
+                image = validated_data["image"]
+                instance.image = store_image(image) if image else None
+            instance.save(update_fields=update_fields)
+            if old_image:
+                release_image(old_image)
         return instance
+
+
+class ProductReadSerializer(ValuesReadSerializer):
+    """fast read only serializer for product lists, description is sent only on request"""
+    serializer_class = ProductSerializer
+    default_fields = ("id", "created_on", "updated_on", "image_url", "created_by", "updated_by",
+                      "name", "image", "category", "units_available", "price", "cost",
+                      "product_code", "is_service", "is_deleted", "is_available", "seller",
+                      "main_image_url")
+    method_field_sources = {
+        "image_url": ("image",),
+        "main_image_url": ("main_image",),
+    }
+
+    def get_image_url(self, row):
+        """returns complete url of product image"""
+        return get_absolute_image_url(row["image"], self.context.get("request"))
+
+    def get_main_image_url(self, row):
+        """returns complete url of the main image annotated on the row"""
+        return get_absolute_image_url(row["main_image"], self.context.get("request"))
+
+
+class ProductBulkUpdateSerializer(serializers.Serializer):
+    """validates fields set on many products picked by ids or by list filters"""
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False,
+                                allow_empty=False, max_length=1000)
+    filter = serializers.DictField(child=serializers.CharField(allow_blank=True),
+                                   required=False)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0,
+                                     required=False)
+    is_available = serializers.BooleanField(required=False)
+    category = serializers.CharField(max_length=255, allow_blank=True, required=False)
+    is_deleted = serializers.BooleanField(required=False)
+
+    update_fields = ("price", "is_available", "category", "is_deleted")
+
+    def validate(self, attrs):
+        """returns attrs with the fields to set, one of ids and filter must be sent"""
+        if ("ids" in attrs) == ("filter" in attrs):
+            raise serializers.ValidationError({"ids": ["Send either ids or filter"]})
+        attrs["fields"] = {name: attrs[name] for name in self.update_fields if name in attrs}
+        if not attrs["fields"]:
+            raise serializers.ValidationError(
+                {"fields": [f"Send at least one of {', '.join(self.update_fields)}"]})
+        return attrs
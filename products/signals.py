@@ -0,0 +1,15 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from products.models import Product
+from products.search import SEARCH_FIELDS, index_products
+
+
+@receiver(post_save, sender=Product)
+def update_search_tokens(sender, instance, update_fields=None, raw=False, **kwargs):
+    """reindexes a saved product unless only fields outside the search index were saved"""
+    if raw:
+        return
+    if update_fields is not None and not set(update_fields) & set(SEARCH_FIELDS + ("seller",)):
+        return
+    index_products([instance])
@@ -0,0 +1,121 @@
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import Count, Max
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from products.models import ProductDesignImage
+
+HASH_SIDE = 8
+# pHash takes the low frequencies of the dct of a 32x32 grayscale copy
+DCT_SIDE = 32
+BYTE_BIT_COUNTS = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_dct_matrix(size):
+    """returns orthonormal dct-ii matrix of the size"""
+    frequencies = np.arange(size)[:, None]
+    positions = np.arange(size)[None, :]
+    matrix = np.cos(np.pi * (2 * positions + 1) * frequencies / (2 * size)) * math.sqrt(2 / size)
+    matrix[0] /= math.sqrt(2)
+    return matrix
+
+
+DCT_MATRIX = get_dct_matrix(DCT_SIDE)
+
+
+def get_phash(image):
+    """returns 64 bit perceptual hash of a PIL image as a signed int
+        Bits are set where a low frequency dct coefficient is above their median.
+    """
+    image = ImageOps.exif_transpose(image).convert("L").resize((DCT_SIDE, DCT_SIDE),
+                                                              Image.LANCZOS)
+    pixels = np.asarray(image, dtype=np.float64)
+    coefficients = (DCT_MATRIX @ pixels @ DCT_MATRIX.T)[:HASH_SIDE, :HASH_SIDE].flatten()
+    # the dc coefficient is the mean brightness and is left out of the median
+    bits = coefficients > np.median(coefficients[1:])
+    return int(np.packbits(bits).view(">i8")[0])
+
+
+def get_file_phash(file):
+    """returns perceptual hash of an image file"""
+    with Image.open(file) as image:
+        # jpeg decoder scales down while decoding, the hash needs 32x32 pixels
+        image.draft("L", (DCT_SIDE * 2, DCT_SIDE * 2))
+        return get_phash(image)
+
+
+def get_stored_phash(image_name, storage=default_storage):
+    """returns perceptual hash of a stored image"""
+    with storage.open(image_name, "rb") as file:
+        return get_file_phash(file)
+
+
+def count_bits(values):
+    """returns count of set bits of every uint64 value"""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    return BYTE_BIT_COUNTS[values.view(np.uint8)].reshape(-1, 8).sum(axis=1, dtype=np.uint8)
+
+
+class ImageHashIndex:
+    """packed array of image hashes searched by hamming distance with a vectorized popcount"""
+
+    def __init__(self, ids, hashes):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.hashes = np.asarray(hashes, dtype=np.int64).view(np.uint64)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def search(self, image_hash, max_distance, limit):
+        """returns list of (id, distance) within max distance of the hash, closest first"""
+        if not len(self.ids):
+            return []
+        query = np.array([image_hash], dtype=np.int64).view(np.uint64)
+        distances = count_bits(self.hashes ^ query)
+        matches = np.flatnonzero(distances <= max_distance)
+        if len(matches) > limit:
+            matches = matches[np.argpartition(distances[matches], limit - 1)[:limit]]
+        matches = matches[np.lexsort((self.ids[matches], distances[matches]))]
+        return [(int(self.ids[i]), int(distances[i])) for i in matches]
+
+
+def get_hashed_images(seller):
+    """returns hashed images of live products of the seller"""
+    return ProductDesignImage.objects.filter(product__seller=seller,
+                                             product__is_deleted=False,
+                                             phash__isnull=False)
+
+
+def get_hash_index(seller):
+    """returns the image hash index of the seller, cached in this process
+        The cached index is checked against count and max(updated_on) of the images at
+        most every IMAGE_HASH_INDEX_CHECK_SECONDS, and rebuilt when they change.
+    """
+    cached = _indexes.get(seller.id)
+    now = time.monotonic()
+    if cached and now - cached["checked_on"] < settings.IMAGE_HASH_INDEX_CHECK_SECONDS:
+        return cached["index"]
+
+    queryset = get_hashed_images(seller)
+    validators = queryset.order_by().aggregate(count=Count("id"),
+                                               last_updated_on=Max("updated_on"))
+    signature = (validators["count"], validators["last_updated_on"])
+    if cached and cached["signature"] == signature:
+        cached["checked_on"] = now
+        return cached["index"]
+
+    rows = list(queryset.order_by().values_list("id", "phash"))
+    index = ImageHashIndex([row[0] for row in rows], [row[1] for row in rows])
+    with _indexes_lock:
+        _indexes[seller.id] = {"index": index, "signature": signature, "checked_on": now}
+    return index
@@ -0,0 +1,91 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from helpers import functions as f
+from products.models import Product
+
+
+class InsufficientStock(Exception):
+    """raised when products do not have the units to reserve"""
+
+    def __init__(self, product_ids):
+        self.product_ids = sorted(product_ids)
+        super().__init__(f"Not enough units of products {self.product_ids}")
+
+
+def get_quantity(quantities):
+    """returns expression of the quantity of the product of each row"""
+    return Case(
+        *[When(id=product_id, then=Value(quantity))
+          for product_id, quantity in quantities.items()],
+        default=Value(0),
+        output_field=IntegerField()
+    )
+
+
+def reserve_stock(quantities):
+    """reserves units of products with one conditional update, without locking rows first
+        Args: quantities (dict of product id to units)
+        Services have no stock and are skipped. Raises InsufficientStock if any product
+        has fewer units available, in which case no product is reserved.
+    """
+    quantities = {product_id: quantity for product_id, quantity in quantities.items()
+                  if product_id and quantity > 0}
+    if not quantities:
+        return
+
+    stocked_ids = set(Product.all_objects
+                      .filter(id__in=quantities, is_service=False)
+                      .values_list("id", flat=True))
+    quantities = {product_id: quantity for product_id, quantity in quantities.items()
+                  if product_id in stocked_ids}
+    if not quantities:
+        return
+
+    quantity = get_quantity(quantities)
+    try:
+        with transaction.atomic():
+            # the units check and the decrement are one statement, so concurrent orders
+            # cannot both take the last units. updated_on moves the etags of the products
+            reserved = Product.all_objects\
+                .filter(id__in=quantities, is_service=False, units_available__gte=quantity)\
+                .update(units_available=F("units_available") - quantity,
+                        units_reserved=F("units_reserved") + quantity,
+                        updated_on=f.get_current_time())
+            if reserved != len(quantities):
+                raise InsufficientStock([])
+    except InsufficientStock:
+        short_ids = Product.all_objects\
+            .filter(id__in=quantities, units_available__lt=quantity)\
+            .values_list("id", flat=True)
+        raise InsufficientStock(short_ids)
+
+
+def release_stock(quantities):
+    """returns reserved units of products to stock with one update
+        Args: quantities (dict of product id to units)
+    """
+    quantities = {product_id: quantity for product_id, quantity in quantities.items()
+                  if product_id and quantity > 0}
+    if not quantities:
+        return
+
+    quantity = get_quantity(quantities)
+    Product.all_objects\
+        .filter(id__in=quantities, is_service=False)\
+        .update(units_available=F("units_available") + quantity,
+                units_reserved=F("units_reserved") - quantity,
+                updated_on=f.get_current_time())
+
+
+def move_stock(reserved_before, reserved_after):
+    """reserves and releases the difference of two reservations
+        Args: reserved_before, reserved_after (dicts of product id to units)
+        New units are reserved first, so nothing is released if they are short.
+    """
+    changes = Counter(reserved_after)
+    changes.subtract(reserved_before)
+    reserve_stock({product_id: change for product_id, change in changes.items() if change > 0})
+    release_stock({product_id: -change for product_id, change in changes.items() if change < 0})
@@ -1,3 +1,608 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+import zipfile
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+import numpy as np
+from PIL import Image
+
+from rest_framework.test import APIClient
+
+from core.models import MediaBlob
+from products.catalog import import_products
+from products.images import VARIANT_SIZES, generate_variants, run_image_variants, \
+    save_image_variants, store_image
+from products.ingest import create_images, get_image_codes
+from products.models import Product, ProductDesignImage, ProductDesignImageArchive
+from products.similarity import ImageHashIndex, get_phash
+from products.stock import InsufficientStock, move_stock, release_stock, reserve_stock
+
+
+def create_product(seller, product_code, **fields):
+    """returns a new product of the seller updated a day ago"""
+    last_update = timezone.now() - timedelta(days=1)
+    fields.setdefault("name", product_code)
+    return Product.objects.create(seller=seller, product_code=product_code,
+                                  created_on=last_update, updated_on=last_update, **fields)
+
+
+class StockTest(TestCase):
+    """reservation of product units by order items"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = get_user_model().objects.create_user("seller", "password")
+
+    def setUp(self):
+        self.shirt = create_product(self.seller, "shirt", units_available=5)
+        self.pant = create_product(self.seller, "pant", units_available=2)
+        self.stitching = create_product(self.seller, "stitching", units_available=0,
+                                        is_service=True)
+
+    def assertUnits(self, product, units_available, units_reserved):
+        product.refresh_from_db()
+        self.assertEqual((product.units_available, product.units_reserved),
+                         (units_available, units_reserved))
+
+    def test_reserve_stock(self):
+        last_update = self.shirt.updated_on
+        reserve_stock({self.shirt.id: 3, self.pant.id: 2})
+        self.assertUnits(self.shirt, 2, 3)
+        self.assertUnits(self.pant, 0, 2)
+        self.assertGreater(self.shirt.updated_on, last_update)
+
+    def test_reserve_stock_skips_services(self):
+        reserve_stock({self.stitching.id: 4, None: 1})
+        self.assertUnits(self.stitching, 0, 0)
+
+    def test_reserve_stock_reserves_nothing_if_a_product_is_short(self):
+        with self.assertRaises(InsufficientStock) as error:
+            reserve_stock({self.shirt.id: 1, self.pant.id: 3})
+        self.assertEqual(error.exception.product_ids, [self.pant.id])
+        self.assertUnits(self.shirt, 5, 0)
+        self.assertUnits(self.pant, 2, 0)
+
+    def test_release_stock(self):
+        reserve_stock({self.shirt.id: 3})
+        release_stock({self.shirt.id: 2, self.stitching.id: 1})
+        self.assertUnits(self.shirt, 4, 1)
+        self.assertUnits(self.stitching, 0, 0)
+
+    def test_move_stock(self):
+        reserve_stock({self.shirt.id: 3})
+        move_stock({self.shirt.id: 3}, {self.shirt.id: 1, self.pant.id: 2})
+        self.assertUnits(self.shirt, 4, 1)
+        self.assertUnits(self.pant, 0, 2)
+
+    def test_move_stock_releases_nothing_if_new_units_are_short(self):
+        reserve_stock({self.shirt.id: 3})
+        with self.assertRaises(InsufficientStock):
+            move_stock({self.shirt.id: 3}, {self.pant.id: 4})
+        self.assertUnits(self.shirt, 2, 3)
+        self.assertUnits(self.pant, 2, 0)
+
+
+class ImportProductsTest(TestCase):
+    """csv import of the catalog of a seller"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = get_user_model().objects.create_user("seller", "password")
+        cls.other_seller = get_user_model().objects.create_user("other", "password")
+
+    def import_csv(self, text, **kwargs):
+        return import_products(self.seller, io.BytesIO(text.encode("utf-8")), **kwargs)
+
+    def test_creates_and_updates_products(self):
+        shirt = create_product(self.seller, "shirt", units_available=5, price=100)
+        reserve_stock({shirt.id: 2})
+
+        report = self.import_csv("product_code,name,price,units_on_hand\n"
+                                 "shirt,Shirt,120.50,7\n"
+                                 "kurta,Kurta,300,4\n")
+        self.assertEqual(report, {"created": 1, "updated": 1, "errors": []})
+
+        shirt.refresh_from_db()
+        self.assertEqual((shirt.name, shirt.price), ("Shirt", Decimal("120.50")))
+        self.assertEqual((shirt.units_available, shirt.units_reserved), (5, 2))
+        kurta = Product.objects.get(product_code="kurta")
+        self.assertEqual((kurta.seller, kurta.units_available, kurta.is_available),
+                         (self.seller, 4, True))
+
+    def test_keeps_columns_which_are_not_in_the_file(self):
+        shirt = create_product(self.seller, "shirt", price=100, category="men")
+        report = self.import_csv("product_code,units_on_hand\nshirt,9\n")
+        self.assertEqual(report["updated"], 1)
+        shirt.refresh_from_db()
+        self.assertEqual((shirt.price, shirt.category, shirt.units_available),
+                         (Decimal("100"), "men", 9))
+
+    def test_exported_stock_keeps_units_reserved_since_the_export(self):
+        shirt = create_product(self.seller, "shirt", units_available=5)
+        self.client = APIClient()
+        self.client.force_authenticate(self.seller)
+        response = self.client.get(reverse("product_export"))
+        exported = b"".join(response.streaming_content).decode("utf-8")
+        reserve_stock({shirt.id: 2})
+
+        report = self.import_csv(exported)
+        self.assertEqual((report["updated"], report["errors"]), (1, []))
+        shirt.refresh_from_db()
+        self.assertEqual((shirt.units_available, shirt.units_reserved), (3, 2))
+
+    def test_rejects_stock_which_does_not_fit_reserved_units(self):
+        shirt = create_product(self.seller, "shirt", units_available=5)
+        reserve_stock({shirt.id: 3})
+        report = self.import_csv("product_code,units_available,units_reserved\n"
+                                 "shirt,9,0\n")
+        report["errors"] += self.import_csv("product_code,units_on_hand\nshirt,2\n")["errors"]
+        self.assertEqual([error["reason"] for error in report["errors"]], [
+            "units_reserved has changed since the export, export the products again or "
+            "import units_on_hand",
+            "units_on_hand must not be less than the 3 units reserved by orders",
+        ])
+        shirt.refresh_from_db()
+        self.assertEqual((shirt.units_available, shirt.units_reserved), (2, 3))
+
+        report = self.import_csv("product_code,units_available,units_reserved\n"
+                                 "shirt,9,3\n")
+        self.assertEqual(report["updated"], 1)
+        shirt.refresh_from_db()
+        self.assertEqual((shirt.units_available, shirt.units_reserved), (9, 3))
+
+    def test_requires_units_reserved_with_units_available(self):
+        with self.assertRaises(ValueError):
+            self.import_csv("product_code,units_available\nshirt,9\n")
+
+    def test_reports_invalid_rows(self):
+        create_product(self.other_seller, "sherwani")
+        create_product(self.seller, "shirt")
+        report = self.import_csv("product_code,name,price\n"
+                                 "kurta,Kurta,abc\n"
+                                 "sherwani,Sherwani,10\n"
+                                 "pant,shirt,10\n"
+                                 "dhoti,,10\n"
+                                 "vest,Vest,10\n"
+                                 "vest,Vest 2,10\n")
+        self.assertEqual((report["created"], report["updated"]), (1, 0))
+        self.assertEqual([(error["line"], error["reason"]) for error in report["errors"]], [
+            (2, "price must be a number"),
+            (3, "Product code is used by another seller"),
+            (4, "Product name is already used"),
+            (5, "name is required"),
+            (7, "Product code is repeated in the file"),
+        ])
+        self.assertFalse(Product.objects.filter(product_code__in=["kurta", "pant"]).exists())
+
+    def test_stops_after_max_lines(self):
+        report = self.import_csv("product_code,name\na,A\nb,B\nc,C\n", max_lines=2,
+                                 chunk_size=1)
+        self.assertEqual(report["created"], 2)
+        self.assertEqual([error["line"] for error in report["errors"]], [4])
+
+    def test_requires_product_code_column(self):
+        with self.assertRaises(ValueError):
+            self.import_csv("name,price\nShirt,10\n")
+
+
+class ProductUniqueFieldsTest(TestCase):
+    """names and codes of deleted products are still taken"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = get_user_model().objects.create_user("seller", "password")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.seller)
+
+    def test_recreating_deleted_product_is_rejected(self):
+        data = {"name": "Shirt", "product_code": "SH-1", "category": "men", "price": "100",
+                "seller": self.seller.id}
+        response = self.client.post(reverse("products"), data, format="multipart")
+        self.assertEqual(response.status_code, 200)
+        product_id = response.data["id"]
+        response = self.client.delete(reverse("product_detail", args=[product_id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(Product.all_objects.get(id=product_id).is_deleted)
+
+        response = self.client.post(reverse("products"), data, format="multipart")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data), {"name", "product_code"})
+
+    def test_product_keeps_its_own_name_on_update(self):
+        product = create_product(self.seller, "shirt")
+        response = self.client.patch(reverse("product_detail", args=[product.id]),
+                                     {"name": "shirt", "price": "120"}, format="multipart")
+        self.assertEqual(response.status_code, 200)
+
+
+def use_temp_media_root(test):
+    """stores media files of the test in a temporary directory removed after it"""
+    media_root = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, media_root)
+    settings_override = override_settings(MEDIA_ROOT=media_root)
+    settings_override.enable()
+    test.addCleanup(settings_override.disable)
+
+
+def get_png(color):
+    """returns bytes of a small png image"""
+    content = io.BytesIO()
+    Image.new("RGB", (8, 8), color).save(content, "PNG")
+    return content.getvalue()
+
+
+class IngestImagesTest(TestCase):
+    """bulk upload of design images as files and zip archives"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = get_user_model().objects.create_user("seller", "password")
+
+    def setUp(self):
+        use_temp_media_root(self)
+        self.product = create_product(self.seller, "shirt")
+        self.client = APIClient()
+        self.client.force_authenticate(self.seller)
+
+    def test_stores_files_and_archive_entries(self):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w") as zip_file:
+            zip_file.writestr("designs/front.png", get_png("blue"))
+            zip_file.writestr("designs/notes.txt", "not an image")
+            zip_file.writestr("designs/broken.png", b"not a png")
+        response = self.client.post(reverse("product_image_bulk", args=[self.product.id]), {
+            "images": [SimpleUploadedFile("front.png", get_png("red"))],
+            "archive": [SimpleUploadedFile("designs.zip", archive.getvalue())],
+        }, format="multipart")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([image["image_code"] for image in response.data["created"]],
+                         ["front", "front-2"])
+        self.assertEqual(sorted(file["name"] for file in response.data["skipped"]),
+                         ["broken.png", "designs/notes.txt"])
+        self.assertEqual(ProductDesignImage.objects.filter(product=self.product).count(), 2)
+
+    def test_codes_taken_before_the_insert_are_assigned_again(self):
+        ProductDesignImage.objects.create(product=self.product, image="product-images/a.png",
+                                          image_code="front")
+        images = [("front.png", "product-images/b.png")]
+        # the first lookup misses the code taken meanwhile by a concurrent upload
+        with mock.patch("products.ingest.get_image_codes",
+                        side_effect=[["front"], get_image_codes(["front.png"], self.product)]):
+            codes = create_images(self.product, self.seller, images, timezone.now())
+        self.assertEqual(codes, ["front-2"])
+        self.assertTrue(ProductDesignImage.objects.filter(image_code="front-2").exists())
+
+    def test_insert_gives_up_after_repeated_conflicts(self):
+        ProductDesignImage.objects.create(product=self.product, image="product-images/a.png",
+                                          image_code="front")
+        with mock.patch("products.ingest.get_image_codes", return_value=["front"]):
+            with self.assertRaises(IntegrityError):
+                create_images(self.product, self.seller, [("front.png", "product-images/b.png")],
+                              timezone.now())
+
+
+class ProductListFilterTest(TestCase):
+    """server side filters and category facets of the product list"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = get_user_model().objects.create_user("seller", "password")
+        cls.other_seller = get_user_model().objects.create_user("other", "password")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.seller)
+        create_product(self.seller, "Shirt", category="men", price=500)
+        create_product(self.seller, "Shawl", category="women", price=900)
+        create_product(self.seller, "Kurta", category="men", price=1500, is_available=False)
+        create_product(self.other_seller, "Sherwani", category="men", price=500)
+
+    def get_names(self, **params):
+        response = self.client.get(reverse("products"), params)
+        self.assertEqual(response.status_code, 200)
+        return sorted(product["name"] for product in response.data)
+
+    def test_filters_products(self):
+        self.assertEqual(self.get_names(), ["Kurta", "Shawl", "Shirt"])
+        self.assertEqual(self.get_names(category="men, kids"), ["Kurta", "Shirt"])
+        self.assertEqual(self.get_names(is_available="false"), ["Kurta"])
+        self.assertEqual(self.get_names(min_price="600", max_price="1000"), ["Shawl"])
+        self.assertEqual(self.get_names(search="sh"), ["Shawl", "Shirt"])
+
+    def test_rejects_invalid_filters(self):
+        for params in ({"is_service": "maybe"}, {"min_price": "cheap"}):
+            response = self.client.get(reverse("products"), params)
+            self.assertEqual(response.status_code, 400)
+
+    def test_facets_follow_product_writes(self):
+        response = self.client.get(reverse("product_facets"))
+        self.assertEqual([dict(facet) for facet in response.data], [
+            {"category": "men", "count": 2, "available_count": 1},
+            {"category": "women", "count": 1, "available_count": 1},
+        ])
+        Product.objects.filter(name="Kurta").update(is_available=True,
+                                                    updated_on=timezone.now())
+        response = self.client.get(reverse("product_facets"))
+        self.assertEqual(response.data[0]["available_count"], 2)
+
+
+class ProductMainImageTest(TestCase):
+    """main images of product lists read with the product rows"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = get_user_model().objects.create_user("seller", "password")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.seller)
+
+    def create_image(self, product, name, is_main_image=False):
+        return ProductDesignImage.objects.create(product=product, image=f"product-images/{name}",
+                                                 image_code=name, is_main_image=is_main_image)
+
+    def get_main_images(self):
+        response = self.client.get(reverse("products"))
+        self.assertEqual(response.status_code, 200)
+        return {product["name"]: product["main_image_url"] for product in response.data}
+
+    def test_main_image_falls_back_to_latest_image(self):
+        shirt = create_product(self.seller, "shirt")
+        self.create_image(shirt, "front.png", is_main_image=True)
+        self.create_image(shirt, "back.png")
+        pant = create_product(self.seller, "pant")
+        self.create_image(pant, "side.png")
+        self.create_image(pant, "top.png")
+        create_product(self.seller, "vest")
+
+        main_images = self.get_main_images()
+        self.assertTrue(main_images["shirt"].endswith("product-images/front.png"))
+        self.assertTrue(main_images["pant"].endswith("product-images/top.png"))
+        self.assertIsNone(main_images["vest"])
+
+        response = self.client.get(reverse("product_detail", args=[shirt.id]))
+        self.assertTrue(response.data["main_image_url"].endswith("product-images/front.png"))
+        self.assertEqual(len(response.data["images"]), 2)
+
+    def test_queries_do_not_grow_with_products(self):
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                self.get_main_images()
+            return len(queries)
+
+        for i in range(2):
+            self.create_image(create_product(self.seller, f"shirt-{i}"), f"shirt-{i}.png")
+        query_count = count_queries()
+        for i in range(2, 6):
+            self.create_image(create_product(self.seller, f"shirt-{i}"), f"shirt-{i}.png")
+        self.assertEqual(count_queries(), query_count)
+
+
+class ImageVariantsTest(TestCase):
+    """resized webp and jpeg variants of stored product images"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = get_user_model().objects.create_user("seller", "password")
+
+    def setUp(self):
+        use_temp_media_root(self)
+        content = io.BytesIO()
+        Image.new("RGB", (1600, 800), "green").save(content, "JPEG")
+        self.path = store_image(SimpleUploadedFile("design.jpg", content.getvalue()))
+        product = create_product(self.seller, "shirt")
+        self.image = ProductDesignImage.objects.create(product=product, image=self.path,
+                                                       image_code="design")
+
+    def test_variants_are_stored_on_the_row(self):
+        save_image_variants(self.image.id)
+
+        self.image.refresh_from_db()
+        self.assertEqual(set(self.image.variants), {"large", "medium", "thumbnail"})
+        self.assertIsNotNone(self.image.phash)
+        for size, max_side in VARIANT_SIZES:
+            for extension, path in self.image.variants[size].items():
+                with default_storage.open(path) as file:
+                    variant = Image.open(file)
+                    self.assertEqual((variant.format.lower(), variant.size),
+                                     (extension, (max_side, max_side // 2)))
+
+    def test_existing_variants_are_kept(self):
+        paths = generate_variants(self.path)
+        thumbnail = paths["thumbnail"]["webp"]
+        modified_time = default_storage.get_modified_time(thumbnail)
+        self.assertEqual(generate_variants(self.path), paths)
+        self.assertEqual(default_storage.get_modified_time(thumbnail), modified_time)
+
+    def test_upload_schedules_variants_after_commit(self):
+        client = APIClient()
+        client.force_authenticate(self.seller)
+        executor = mock.Mock()
+        with mock.patch("products.images.get_executor", return_value=executor):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = client.post(reverse("product_image", args=[self.image.product_id]), {
+                    "image": SimpleUploadedFile("front.png", get_png("red")),
+                    "image_code": "front",
+                }, format="multipart")
+        self.assertEqual(response.status_code, 200)
+        executor.submit.assert_called_once_with(run_image_variants, response.data["id"])
+
+
+class DeleteOrphanImagesTest(TestCase):
+    """cleanup of stored image files which no row refers to"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = get_user_model().objects.create_user("seller", "password")
+
+    def setUp(self):
+        use_temp_media_root(self)
+
+    def store_file(self, name, age=timedelta(days=2)):
+        path = default_storage.save(f"product-images/ab/{name}", ContentFile(b"image"))
+        modified_time = (timezone.now() - age).timestamp()
+        os.utime(default_storage.path(path), (modified_time, modified_time))
+        return path
+
+    def test_deletes_only_unreferenced_old_files(self):
+        shirt = create_product(self.seller, "shirt")
+        variants = {"thumbnail": {"webp": self.store_file("live_thumbnail.webp")}}
+        ProductDesignImage.objects.create(product=shirt, image=self.store_file("live.png"),
+                                          image_code="live", variants=variants)
+        deleted_product = create_product(self.seller, "pant", is_deleted=True)
+        ProductDesignImage.objects.create(product=deleted_product, image_code="deleted",
+                                          image=self.store_file("deleted.png"))
+        ProductDesignImageArchive.objects.create(id=100, product_id=100,
+                                                 image=self.store_file("archived.png"),
+                                                 archived_on=timezone.now())
+        orphan = self.store_file("orphan.png")
+        MediaBlob.objects.create(content_hash="0" * 64, path=orphan, ref_count=0)
+        self.store_file("young.png", age=timedelta(minutes=5))
+
+        out = io.StringIO()
+        call_command("delete_orphan_images", dry_run=True, stdout=out)
+        self.assertIn("would delete 1 orphaned files", out.getvalue())
+        self.assertTrue(default_storage.exists(orphan))
+
+        call_command("delete_orphan_images", stdout=io.StringIO())
+        self.assertEqual(sorted(default_storage.listdir("product-images/ab")[1]),
+                         ["archived.png", "deleted.png", "live.png", "live_thumbnail.webp",
+                          "young.png"])
+        self.assertFalse(MediaBlob.objects.exists())
+
+        # files of products deleted before the keep window are orphans too
+        Product.all_objects.filter(id=deleted_product.id)\
+            .update(updated_on=timezone.now() - timedelta(days=40))
+        call_command("delete_orphan_images", stdout=io.StringIO())
+        self.assertFalse(default_storage.exists("product-images/ab/deleted.png"))
+
+
+def get_design(seed, side=64):
+    """returns grayscale image of smooth random shapes drawn from the seed"""
+    pixels = np.random.default_rng(seed).integers(0, 256, (8, 8), dtype=np.uint8)
+    return Image.fromarray(pixels, "L").resize((side, side), Image.BICUBIC)
+
+
+class SimilarImagesTest(TestCase):
+    """similar design search by hamming distance of perceptual hashes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = get_user_model().objects.create_user("seller", "password")
+        cls.other_seller = get_user_model().objects.create_user("other", "password")
+
+    def setUp(self):
+        indexes = mock.patch.dict("products.similarity._indexes", clear=True)
+        indexes.start()
+        self.addCleanup(indexes.stop)
+        self.client = APIClient()
+        self.client.force_authenticate(self.seller)
+
+    def create_image(self, product, image_code, phash):
+        return ProductDesignImage.objects.create(product=product, image_code=image_code,
+                                                 image=f"product-images/{image_code}.png",
+                                                 phash=phash)
+
+    def get_distance(self, first_hash, second_hash):
+        return bin((first_hash ^ second_hash) & (2 ** 64 - 1)).count("1")
+
+    def test_similar_images_have_close_hashes(self):
+        design = get_phash(get_design(1))
+        # a larger and darker copy of the same design
+        copy = get_phash(get_design(1, side=256).point(lambda value: value * 0.8))
+        self.assertLessEqual(self.get_distance(design, copy), 4)
+        for seed in (2, 3):
+            self.assertGreater(self.get_distance(design, get_phash(get_design(seed))), 16)
+
+    def test_index_returns_closest_hashes_first(self):
+        index = ImageHashIndex([1, 2, 3, 4], [0b1111, -1, 0b1, 0b11])
+        self.assertEqual(index.search(0, max_distance=4, limit=10), [(3, 1), (4, 2), (1, 4)])
+        self.assertEqual(index.search(0, max_distance=64, limit=2), [(3, 1), (4, 2)])
+        self.assertEqual(index.search(-1, max_distance=0, limit=10), [(2, 0)])
+        self.assertEqual(ImageHashIndex([], []).search(0, 10, 10), [])
+
+    def test_searches_images_of_live_products_of_the_seller(self):
+        shirt = create_product(self.seller, "shirt")
+        searched = self.create_image(shirt, "front", 0b0)
+        close = self.create_image(shirt, "back", 0b11)
+        self.create_image(shirt, "far", -1)
+        self.create_image(create_product(self.seller, "pant", is_deleted=True), "pant", 0b1)
+        self.create_image(create_product(self.other_seller, "kurta"), "kurta", 0b1)
+
+        response = self.client.post(reverse("similar_images"), {"image_id": searched.id},
+                                    format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(image["id"], image["distance"]) for image in response.data],
+                         [(searched.id, 0), (close.id, 2)])
+
+        response = self.client.post(reverse("similar_images"), {
+            "image": SimpleUploadedFile("photo.png", get_png("red")),
+            "image_id": searched.id,
+        }, format="multipart")
+        self.assertEqual(response.status_code, 400)
+
+
+class ProductSearchTest(TestCase):
+    """prefix search of product words ranked by the matched fields"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = get_user_model().objects.create_user("seller", "password")
+        cls.other_seller = get_user_model().objects.create_user("other", "password")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.seller)
+        self.silk_shirt = create_product(self.seller, "SH-001", name="Silk shirt",
+                                         category="men")
+        self.shawl = create_product(self.seller, "WM-7", name="Shawl", category="women",
+                                    description="silk border")
+        self.kurta = create_product(self.seller, "silk-kurta", name="Kurta")
+        create_product(self.seller, "SH-002", name="Silk sherwani", is_deleted=True)
+        create_product(self.other_seller, "SH-003", name="Silk scarf")
+
+    def search(self, query, **params):
+        response = self.client.get(reverse("product_search"), {"q": query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [product["id"] for product in response.data]
+
+    def test_ranks_codes_above_names_and_descriptions(self):
+        self.assertEqual(self.search("sil"), [self.kurta.id, self.silk_shirt.id, self.shawl.id])
+        self.assertEqual(self.search("sil", limit=1), [self.kurta.id])
+
+    def test_every_term_is_matched_as_a_prefix(self):
+        self.assertEqual(self.search("silk sh"), [self.silk_shirt.id, self.shawl.id])
+        self.assertEqual(self.search("sh00"), [self.silk_shirt.id])
+        self.assertEqual(self.search("women bord"), [self.shawl.id])
+        self.assertEqual(self.search("scarf"), [])
+
+    def test_index_follows_product_writes(self):
+        Product.objects.filter(id=self.kurta.id).update(name="Cotton kurta")
+        call_command("rebuild_product_search", stdout=io.StringIO())
+        self.assertEqual(self.search("cott"), [self.kurta.id])
+
+        self.kurta.is_deleted = True
+        self.kurta.save()
+        self.assertEqual(self.search("cott"), [])
+
+    def test_rejects_invalid_limit(self):
+        response = self.client.get(reverse("product_search"), {"q": "silk", "limit": "x"})
+        self.assertEqual(response.status_code, 400)
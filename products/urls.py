@@ -5,7 +5,19 @@ from products import views
 
 urlpatterns = [
     path("", views.ProductListCreateView.as_view(), name="products"),
+    path("facets/", views.ProductFacetsView.as_view(), name="product_facets"),
+    path("export/", views.ProductExportView.as_view(), name="product_export"),
+    path("import/", views.ProductImportView.as_view(), name="product_import"),
+    path("bulk/", views.ProductBulkUpdateView.as_view(), name="product_bulk_update"),
+    path("search/", views.ProductSearchView.as_view(), name="product_search"),
+    path("images/similar/", views.SimilarImageSearchView.as_view(), name="similar_images"),
     path("<int:id>/", views.ProductDetailView().as_view(), name="product_detail"),
     path("<int:id>/uploads/", views.ProductImageView.as_view(), name="product_image"),
+    path("<int:id>/uploads/bulk/", views.ProductImageBulkCreateView.as_view(),
+         name="product_image_bulk"),
+    path("<int:id>/uploads/presign/", views.ProductImagePresignView.as_view(),
+         name="product_image_presign"),
+    path("<int:id>/uploads/complete/", views.ProductImageCompleteView.as_view(),
+         name="product_image_complete"),
     path("<int:id>/uploads/<int:image_id>/", views.ProductImageDetailView.as_view(), name="image_detail"),
 ]
@@ -1,39 +1,101 @@
+import csv
+from decimal import Decimal, InvalidOperation
+
+from django.core.cache import cache
+from django.conf import settings
+from django.db import transaction
 from django.shortcuts import get_object_or_404
+from django.db.models import Count, F, Max, OuterRef, Prefetch, Q, Subquery
 
-from rest_framework.generics import ListCreateAPIView, RetrieveUpdateDestroyAPIView
+from rest_framework.generics import ListCreateAPIView, RetrieveUpdateDestroyAPIView, \
+    GenericAPIView
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.parsers import MultiPartParser
+from rest_framework.parsers import JSONParser, MultiPartParser
 
 from products import serializers
 from products.models import Product, ProductDesignImage
+from products.images import release_image
+from products.ingest import ingest_images
+from products.similarity import get_hash_index
+from products.search import search_products
+from products.catalog import EXPORT_COLUMNS, import_products, update_products
 from helpers import functions as f
 from core.permissions import IsProductSeller
+from core import conditional
+from core.export import ExportView
+from core.uploads import SizeLimitedUploadMixin
 
 
-def get_product_images(product_id, main_image=False):
-    """returns product main image or list of images
-        args: product_id, main_image (default=False)
-    """
-    queryset = ProductDesignImage.objects\
-        .filter(product_id=product_id)\
+def get_main_image_path():
+    """returns subquery of the main image path of a product, falling back to the latest image"""
+    images = ProductDesignImage.objects\
+        .filter(product=OuterRef("pk"))\
+        .order_by("-is_main_image", "-id")\
+        .values("image")[:1]
+    return Subquery(images)
+
+
+def get_images_prefetch():
+    """returns prefetch of all images of products, latest first"""
+    images = ProductDesignImage.objects\
         .order_by("-id")\
-        .only("image")
-    if main_image:
-        img = queryset.filter(is_main_image=True)
-        if img:
-            return img
-        else:
-            try:
-                return queryset[:1]
-            except:
-                return None
-    else:
-        return queryset
+        .only("id", "product_id", "image", "image_code", "variants")
+    return Prefetch("product_images", queryset=images)
+
 
+def get_boolean_param(query_params, name):
+    """returns boolean value of a true/false query param or None if it is not sent"""
+    value = query_params.get(name)
+    if value is None or value == "":
+        return None
+    if value.lower() in ("true", "1"):
+        return True
+    if value.lower() in ("false", "0"):
+        return False
+    raise ValueError(f"{name} must be true or false")
 
-class ProductListCreateView(ListCreateAPIView):
+
+def get_price_param(query_params, name):
+    """returns decimal value of a price query param or None if it is not sent"""
+    value = query_params.get(name)
+    if not value:
+        return None
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise ValueError(f"{name} must be a number")
+
+
+def filter_products(queryset, query_params):
+    """returns products filtered by category, flags, price range and name prefix
+        Query params: category (comma separated), is_available, is_service, min_price,
+                      max_price, search (name prefix)
+    """
+    categories = [category.strip() for category in query_params.get("category", "").split(",")
+                  if category.strip()]
+    if categories:
+        queryset = queryset.filter(category__in=categories)
+    for name in ("is_available", "is_service"):
+        value = get_boolean_param(query_params, name)
+        if value is not None:
+            queryset = queryset.filter(**{name: value})
+    min_price = get_price_param(query_params, "min_price")
+    if min_price is not None:
+        queryset = queryset.filter(price__gte=min_price)
+    max_price = get_price_param(query_params, "max_price")
+    if max_price is not None:
+        queryset = queryset.filter(price__lte=max_price)
+    search = query_params.get("search", "").strip()
+    if search:
+        # prefix match keeps LIKE 'name%' on the name index
+        queryset = queryset.filter(name__istartswith=search)
+    return queryset
+
+
+class ProductListCreateView(SizeLimitedUploadMixin, ListCreateAPIView):
     """list and create view of product"""
     serializer_class = serializers.ProductSerializer
     permission_classes = (IsAuthenticated,)
@@ -41,14 +103,36 @@ class ProductListCreateView(ListCreateAPIView):
 
     def get_queryset(self):
         """returns queryset of products"""
-        return Product.objects.filter(seller=self.request.user,
-                                      is_deleted=False).order_by("-id")
+        return Product.objects.filter(seller=self.request.user).order_by("-id")
 
     def list(self, request, *args, **kwargs):
-        """returns list of products"""
-        queryset = self.get_queryset()
-        products = self.serializer_class(queryset, many=True).data
-        return Response(products, status=status.HTTP_200_OK)
+        """returns list of products filtered by query params"""
+        try:
+            queryset = filter_products(self.get_queryset(), request.query_params)
+        except ValueError as e:
+            error = {
+                "message": str(e)
+            }
+            return Response(error, status=status.HTTP_400_BAD_REQUEST)
+
+        # main images are part of the rows, so they are part of the etag too
+        validators = conditional.get_list_validators(
+            request,
+            queryset,
+            ProductDesignImage.objects.filter(product__in=queryset)
+        )
+        not_modified = conditional.get_not_modified_response(request, *validators)
+        if not_modified:
+            return not_modified
+
+        fields = serializers.ProductReadSerializer.get_requested_fields(request)
+        products = serializers.ProductReadSerializer(
+            queryset.annotate(main_image=get_main_image_path()),
+            fields=fields,
+            context={"request": request}
+        ).data
+        response = Response(products, status=status.HTTP_200_OK)
+        return conditional.add_validators(response, *validators)
 
     def create(self, request, *args, **kwargs):
         """creates a new product in the db"""
@@ -63,7 +147,148 @@ class ProductListCreateView(ListCreateAPIView):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
-class ProductDetailView(RetrieveUpdateDestroyAPIView):
+class ProductFacetsView(GenericAPIView):
+    """returns product counts of the seller per category"""
+    permission_classes = (IsAuthenticated,)
+
+    def get_queryset(self):
+        """returns queryset of products"""
+        return Product.objects.filter(seller=self.request.user)
+
+    def get(self, request, *args, **kwargs):
+        """returns category facets computed in one group by and cached per seller"""
+        queryset = self.get_queryset()
+        validators = conditional.get_list_validators(request, queryset)
+        not_modified = conditional.get_not_modified_response(request, *validators)
+        if not_modified:
+            return not_modified
+
+        # etag changes with every product write of the seller, so cached facets are never stale
+        cache_key = f"product_facets:{request.user.id}:{validators[0]}"
+        facets = cache.get(cache_key)
+        if facets is None:
+            facets = list(queryset
+                          .order_by("category")
+                          .values("category")
+                          .annotate(count=Count("id"),
+                                    available_count=Count("id", filter=Q(is_available=True))))
+            cache.set(cache_key, facets, settings.PRODUCT_FACETS_CACHE_SECONDS)
+        response = Response(facets, status=status.HTTP_200_OK)
+        return conditional.add_validators(response, *validators)
+
+
+class ProductSearchView(GenericAPIView):
+    """returns products matching typed words of their code, name, category or description"""
+    permission_classes = (IsAuthenticated,)
+    default_fields = ("id", "name", "product_code", "category", "price", "units_available",
+                      "is_available")
+
+    def get(self, request, *args, **kwargs):
+        """returns up to limit products ranked by match, every word is matched as a prefix"""
+        try:
+            limit = min(int(request.query_params.get("limit", 10)), 50)
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            error = {
+                "message": "limit must be a number between 1 and 50"
+            }
+            return Response(error, status=status.HTTP_400_BAD_REQUEST)
+
+        product_ids = search_products(request.user, request.query_params.get("q", ""), limit)
+        if not product_ids:
+            return Response([], status=status.HTTP_200_OK)
+
+        fields = serializers.ProductReadSerializer.get_requested_fields(request) or \
+            self.default_fields
+        rows = Product.objects.filter(id__in=product_ids, seller=request.user)
+        if "main_image_url" in fields:
+            rows = rows.annotate(main_image=get_main_image_path())
+        products = serializers.ProductReadSerializer(
+            rows,
+            fields=fields,
+            context={"request": request}
+        ).data
+        # rows come back in table order, the ranking is the order of the ids
+        rank = {product_id: i for i, product_id in enumerate(product_ids)}
+        products.sort(key=lambda product: rank[product["id"]])
+        return Response(products, status=status.HTTP_200_OK)
+
+
+class ProductExportView(ExportView):
+    """streams products of the seller as csv or json lines
+        Query params: the list filters of products besides file_type, from and to
+    """
+    model = Product
+    columns = EXPORT_COLUMNS
+
+    def get_queryset(self):
+        """returns products of the seller filtered by query params"""
+        try:
+            products = filter_products(Product.objects.filter(seller=self.request.user),
+                                       self.request.query_params)
+        except ValueError as e:
+            error = {
+                "message": str(e)
+            }
+            raise ValidationError(error, code="validation")
+        return products.annotate(units_on_hand=F("units_available") + F("units_reserved"))
+
+
+class ProductImportView(SizeLimitedUploadMixin, GenericAPIView):
+    """creates and updates products from a csv catalog"""
+    permission_classes = (IsAuthenticated,)
+    parser_classes = (MultiPartParser,)
+    max_lines = 20000
+
+    def post(self, request, *args, **kwargs):
+        """imports catalog rows in chunks and reports rows which are not imported"""
+        catalog = request.FILES.get("file")
+        if not catalog:
+            error = {
+                "message": "Catalog file is missing"
+            }
+            return Response(error, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            report = import_products(request.user, catalog.file, self.max_lines)
+        except (ValueError, csv.Error) as e:
+            error = {
+                "message": str(e)
+            }
+            return Response(error, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report, status=status.HTTP_200_OK)
+
+
+class ProductBulkUpdateView(GenericAPIView):
+    """sets price, availability, category or is_deleted of many products at once"""
+    serializer_class = serializers.ProductBulkUpdateSerializer
+    permission_classes = (IsAuthenticated,)
+    parser_classes = (JSONParser,)
+
+    def patch(self, request, *args, **kwargs):
+        """updates products picked by ids, or by list filters, with one update statement"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        if "ids" in data:
+            # deleted products are picked by id too, so they can be restored
+            queryset = Product.all_objects.filter(seller=request.user, id__in=data["ids"])
+        else:
+            try:
+                queryset = filter_products(Product.objects.filter(seller=request.user),
+                                           data["filter"])
+            except ValueError as e:
+                error = {
+                    "message": str(e)
+                }
+                return Response(error, status=status.HTTP_400_BAD_REQUEST)
+
+        count = update_products(queryset, data["fields"], request.user, f.get_current_time())
+        return Response({"updated": count}, status=status.HTTP_200_OK)
+
+
+class ProductDetailView(SizeLimitedUploadMixin, RetrieveUpdateDestroyAPIView):
     """Get, update and delete product view"""
     serializer_class = serializers.ProductSerializer
     permission_classes = (IsAuthenticated, IsProductSeller)
@@ -71,20 +296,36 @@ class ProductDetailView(RetrieveUpdateDestroyAPIView):
 
     def get_queryset(self):
         """returns product queryset"""
-        return Product.objects.filter(seller=self.request.user, is_deleted=False)
+        return Product.objects.filter(seller=self.request.user)
 
     def retrieve(self, request, *args, **kwargs):
         """returns a single product object"""
         queryset = self.get_queryset()
+        # product images are part of the response, so they are part of the etag too
+        validators = conditional.get_detail_validators(
+            request,
+            queryset.annotate(images_updated_on=Max("product_image__updated_on"),
+                              images_count=Count("product_image")),
+            kwargs["id"],
+            "images_updated_on",
+            "images_count"
+        )
+        not_modified = conditional.get_not_modified_response(request, *validators)
+        if not_modified:
+            return not_modified
+
+        queryset = queryset\
+            .annotate(main_image=get_main_image_path())\
+            .prefetch_related(get_images_prefetch())
         product = get_object_or_404(queryset, pk=kwargs["id"])
-        response_data = self.serializer_class(product).data
-        images = get_product_images(kwargs["id"])
+        response_data = self.serializer_class(product, context={"request": request}).data
         response_data["images"] = serializers.ProductImageSerializer(
-            images,
+            product.product_images.all(),
             many=True,
             context={"request": request}
         ).data
-        return Response(response_data, status=status.HTTP_200_OK)
+        response = Response(response_data, status=status.HTTP_200_OK)
+        return conditional.add_validators(response, *validators)
 
     def update(self, request, *args, **kwargs):
         """updates a product obj"""
@@ -96,10 +337,13 @@ class ProductDetailView(RetrieveUpdateDestroyAPIView):
             request_user=request.user,
             updated_on=f.get_current_time()
         )
-        response_data = serializer.data
-        images = get_product_images(kwargs["id"])
+        product = queryset\
+            .annotate(main_image=get_main_image_path())\
+            .prefetch_related(get_images_prefetch())\
+            .get(pk=product.pk)
+        response_data = self.serializer_class(product, context={"request": request}).data
         response_data["images"] = serializers.ProductImageSerializer(
-            images,
+            product.product_images.all(),
             many=True,
             context={"request": request}
         ).data
@@ -120,7 +364,7 @@ class ProductDetailView(RetrieveUpdateDestroyAPIView):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
-class ProductImageView(ListCreateAPIView):
+class ProductImageView(SizeLimitedUploadMixin, ListCreateAPIView):
     """returns a list or creates a product image"""
     queryset = ProductDesignImage.objects.all()
     serializer_class = serializers.ProductImageSerializer
@@ -134,7 +378,7 @@ class ProductImageView(ListCreateAPIView):
 
     def list(self, request, *args, **kwargs):
         """returns a list of product images"""
-        get_object_or_404(Product, pk=kwargs["id"], seller=request.user, is_deleted=False)
+        get_object_or_404(Product, pk=kwargs["id"], seller=request.user)
         serializer = serializers.ProductImageSerializer(
             self.get_queryset(),
             many=True,
@@ -146,8 +390,7 @@ class ProductImageView(ListCreateAPIView):
         """creates a new product image in server"""
         product = get_object_or_404(Product,
                                     pk=kwargs["id"],
-                                    seller=request.user,
-                                    is_deleted=False)
+                                    seller=request.user)
         serializer = self.serializer_class(data=request.data, context={"request": request})
         serializer.is_valid(raise_exception=True)
         now = f.get_current_time()
@@ -160,7 +403,110 @@ class ProductImageView(ListCreateAPIView):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
-class ProductImageDetailView(RetrieveUpdateDestroyAPIView):
+class ProductImageBulkCreateView(SizeLimitedUploadMixin, GenericAPIView):
+    """creates many product images from image files and zip archives in one request"""
+    permission_classes = (IsAuthenticated,)
+    parser_classes = (MultiPartParser,)
+    max_upload_size = settings.MAX_BULK_UPLOAD_SIZE
+
+    def post(self, request, *args, **kwargs):
+        """stores valid images of files and archives, returns created and skipped files"""
+        product = get_object_or_404(Product, pk=kwargs["id"], seller=request.user)
+        files = request.FILES.getlist("images")
+        archives = request.FILES.getlist("archive")
+        if not files and not archives:
+            error = {
+                "message": "Send image files as images or a zip file as archive"
+            }
+            return Response(error, status=status.HTTP_400_BAD_REQUEST)
+
+        oversized = [file.name for file in files if file.size > settings.MAX_UPLOAD_SIZE]
+        if oversized:
+            error = {
+                "message": f"Images must not be larger than {settings.MAX_UPLOAD_SIZE} bytes: "
+                           f"{', '.join(oversized)}"
+            }
+            return Response(error, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        created, skipped = ingest_images(product, request.user, files, archives,
+                                         f.get_current_time())
+        response_data = {
+            "created": serializers.ProductImageSerializer(
+                created,
+                many=True,
+                context={"request": request}
+            ).data,
+            "skipped": skipped,
+        }
+        return Response(response_data, status=status.HTTP_200_OK)
+
+
+class ProductImagePresignView(GenericAPIView):
+    """returns a signed url to upload a product image straight to storage"""
+    serializer_class = serializers.ProductImagePresignSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def post(self, request, *args, **kwargs):
+        """returns upload url, method and headers with the token which completes the upload"""
+        product = get_object_or_404(Product, pk=kwargs["id"], seller=request.user)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(serializer.get_upload(product, request.user), status=status.HTTP_200_OK)
+
+
+class ProductImageCompleteView(GenericAPIView):
+    """registers a product image once its file is uploaded to storage"""
+    serializer_class = serializers.ProductImageCompleteSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def post(self, request, *args, **kwargs):
+        """creates the product image of a completed direct upload"""
+        product = get_object_or_404(Product, pk=kwargs["id"], seller=request.user)
+        serializer = self.serializer_class(data=request.data,
+                                           context={"request": request, "product": product})
+        serializer.is_valid(raise_exception=True)
+        now = f.get_current_time()
+        product_image = serializer.save(
+            product=product,
+            request_user=request.user,
+            created_on=now,
+            updated_on=now
+        )
+        response_data = serializers.ProductImageSerializer(
+            product_image,
+            context={"request": request}
+        ).data
+        return Response(response_data, status=status.HTTP_201_CREATED)
+
+
+class SimilarImageSearchView(SizeLimitedUploadMixin, GenericAPIView):
+    """returns design images of the seller which look like a photo or a stored image"""
+    serializer_class = serializers.SimilarImageSearchSerializer
+    permission_classes = (IsAuthenticated,)
+    parser_classes = (MultiPartParser, JSONParser)
+
+    def post(self, request, *args, **kwargs):
+        """returns images within max_distance bits of the image hash, closest first"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        matches = get_hash_index(request.user).search(data["phash"], data["max_distance"],
+                                                      data["limit"])
+        images = ProductDesignImage.objects.in_bulk([image_id for image_id, _ in matches])
+        response_data = []
+        for image_id, distance in matches:
+            image = images.get(image_id)
+            if image is None:
+                continue
+            image_data = serializers.ProductImageSerializer(image,
+                                                            context={"request": request}).data
+            image_data["product_id"] = image.product_id
+            image_data["distance"] = distance
+            response_data.append(image_data)
+        return Response(response_data, status=status.HTTP_200_OK)
+
+
+class ProductImageDetailView(SizeLimitedUploadMixin, RetrieveUpdateDestroyAPIView):
     """product image detail view to retrieve, update and destroy"""
     queryset = ProductDesignImage.objects.all()
     serializer_class = serializers.ProductImageSerializer
@@ -174,7 +520,7 @@ class ProductImageDetailView(RetrieveUpdateDestroyAPIView):
 
     def retrieve(self, request, *args, **kwargs):
         """returns a product image with specified id"""
-        get_object_or_404(Product, pk=kwargs["id"], is_deleted=False)
+        get_object_or_404(Product, pk=kwargs["id"])
         queryset = self.get_queryset()
         product_image = queryset.filter(pk=kwargs["image_id"]).first()
         if product_image:
@@ -188,7 +534,7 @@ class ProductImageDetailView(RetrieveUpdateDestroyAPIView):
 
     def update(self, request, *args, **kwargs):
         """updates a product image obj"""
-        get_object_or_404(Product, pk=kwargs["id"], is_deleted=False)
+        get_object_or_404(Product, pk=kwargs["id"])
         queryset = self.get_queryset()
         product_image = queryset.filter(pk=kwargs["image_id"]).first()
         if not product_image:
@@ -207,7 +553,7 @@ class ProductImageDetailView(RetrieveUpdateDestroyAPIView):
 
     def destroy(self, request, *args, **kwargs):
         """deletes a product image object in the db"""
-        get_object_or_404(Product, pk=kwargs["id"], is_deleted=False)
+        get_object_or_404(Product, pk=kwargs["id"])
         queryset = self.get_queryset()
         product_image = queryset.filter(pk=kwargs["image_id"]).first()
         if not product_image:
@@ -216,6 +562,7 @@ class ProductImageDetailView(RetrieveUpdateDestroyAPIView):
             }
             return Response(error, status=status.HTTP_404_NOT_FOUND)
 
-        product_image.image.delete()
-        product_image.delete()
+        with transaction.atomic():
+            product_image.delete()
+            release_image(product_image.image.name, product_image.variants)
         return Response(None, status=status.HTTP_204_NO_CONTENT)
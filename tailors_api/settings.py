@@ -2,6 +2,7 @@ import os
 from pathlib import Path
 from os import getenv
 from decouple import config
+from corsheaders.defaults import default_headers
 import dj_database_url
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -149,6 +150,30 @@ STATICFILES_DIRS = (
     getenv("STATICFILES_DIRS", 'static/'),
 )
 
+# filesystem keeps media under MEDIA_ROOT, s3 keeps it in an s3 compatible bucket (aws, minio)
+MEDIA_STORAGE = getenv("MEDIA_STORAGE", "filesystem")
+DEFAULT_FILE_STORAGE = "core.storage.S3MediaStorage" if MEDIA_STORAGE == "s3" \
+    else "core.storage.MediaFileSystemStorage"
+S3_ENDPOINT_URL = getenv("S3_ENDPOINT_URL", "http://localhost:9000")
+S3_BUCKET = getenv("S3_BUCKET", "tailors-media")
+S3_ACCESS_KEY = getenv("S3_ACCESS_KEY", "")
+S3_SECRET_KEY = getenv("S3_SECRET_KEY", "")
+S3_REGION = getenv("S3_REGION", "us-east-1")
+S3_TIMEOUT_SECONDS = int(getenv("S3_TIMEOUT_SECONDS", 30))
+# retries of throttled (429, SlowDown), failed (5xx) and unreachable requests, the backoff
+# doubles from the base seconds
+S3_MAX_RETRIES = int(getenv("S3_MAX_RETRIES", 3))
+S3_RETRY_BASE_SECONDS = float(getenv("S3_RETRY_BASE_SECONDS", 0.2))
+PRESIGNED_UPLOAD_EXPIRES_SECONDS = int(getenv("PRESIGNED_UPLOAD_EXPIRES_SECONDS", 15 * 60))
+
+# django streams media files itself, x-accel-redirect (nginx) and x-sendfile (apache)
+# hand the file to the web server so app workers only check it and set headers
+MEDIA_SERVE_MODE = getenv("MEDIA_SERVE_MODE", "django")
+# internal nginx location aliased to MEDIA_ROOT
+MEDIA_ACCEL_REDIRECT_LOCATION = getenv("MEDIA_ACCEL_REDIRECT_LOCATION", "/protected-media/")
+# cache lifetime of media files without a content hash in their name
+MEDIA_CACHE_SECONDS = int(getenv("MEDIA_CACHE_SECONDS", 60 * 60))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.0/ref/settings/#default-auto-field
 
@@ -156,8 +181,38 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'account.User'
 
+IDEMPOTENCY_KEY_TTL_HOURS = int(getenv("IDEMPOTENCY_KEY_TTL_HOURS", 24))
+# a retry takes over a pending key only after this timeout, so it must stay far longer than
+# any request can run: the gunicorn --timeout of the Procfile (30s) and the proxy timeouts.
+# Until then retries of a running or crashed request get 409
+IDEMPOTENCY_PENDING_TIMEOUT_SECONDS = int(getenv("IDEMPOTENCY_PENDING_TIMEOUT_SECONDS", 900))
+
+# statement narrations reference orders as ORD-123, other numbers in them are not order ids
+PAYMENT_REFERENCE_PREFIX = getenv("PAYMENT_REFERENCE_PREFIX", "ORD")
+
+PRODUCT_FACETS_CACHE_SECONDS = int(getenv("PRODUCT_FACETS_CACHE_SECONDS", 300))
+
+IMAGE_VARIANT_WORKERS = int(getenv("IMAGE_VARIANT_WORKERS", 2))
+IMAGE_HASH_INDEX_CHECK_SECONDS = int(getenv("IMAGE_HASH_INDEX_CHECK_SECONDS", 10))
+MEDIA_DELETE_WORKERS = int(getenv("MEDIA_DELETE_WORKERS", 1))
+
+MAX_UPLOAD_SIZE = int(getenv("MAX_UPLOAD_SIZE", 15 * 1024 * 1024))
+MAX_IMAGE_PIXELS = int(getenv("MAX_IMAGE_PIXELS", 50_000_000))
+ALLOWED_IMAGE_FORMATS = ("JPEG", "PNG", "WEBP")
+MAX_BULK_UPLOAD_SIZE = int(getenv("MAX_BULK_UPLOAD_SIZE", 500 * 1024 * 1024))
+MAX_BULK_UPLOAD_FILES = int(getenv("MAX_BULK_UPLOAD_FILES", 500))
+IMAGE_PROCESS_WORKERS = int(getenv("IMAGE_PROCESS_WORKERS", os.cpu_count() or 1))
+UPLOAD_CHUNK_MAX_SIZE = int(getenv("UPLOAD_CHUNK_MAX_SIZE", 5 * 1024 * 1024))
+UPLOAD_SESSION_TTL_HOURS = int(getenv("UPLOAD_SESSION_TTL_HOURS", 24))
+# partial files of resumable uploads, must be shared by all app servers
+RESUMABLE_UPLOAD_DIR = getenv("RESUMABLE_UPLOAD_DIR", "resources/uploads/partial/")
+
 CORS_ALLOW_CREDENTIALS = True
 CORS_ORIGIN_ALLOW_ALL = True
+CORS_ALLOW_HEADERS = list(default_headers) + [
+    "idempotency-key",
+    "content-range",
+]
 
 db_from_env = dj_database_url.config(conn_max_age=500)
 DATABASES['default'].update(db_from_env)
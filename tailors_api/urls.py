@@ -13,11 +13,16 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+from urllib.parse import urlsplit
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from core.serving import serve_media
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/core/", include("core.urls")),
@@ -27,5 +32,10 @@ urlpatterns = [
     path("api/orders/", include("order.urls")),
 ]
 
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# media of an external host (cdn or object storage) is not served by the app
+if not urlsplit(settings.MEDIA_URL).netloc:
+    urlpatterns += [
+        re_path(rf"^{re.escape(settings.MEDIA_URL.lstrip('/'))}(?P<path>.+)$", serve_media,
+                name="media"),
+    ]
 urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)